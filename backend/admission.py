@@ -0,0 +1,271 @@
+"""
+Admission checks for uploaded PDFs, run before any expensive work.
+
+Rejections are cheap and happen in order of cost:
+
+1. UploadLimitMiddleware counts the request body while it streams in, and
+   answers 413 as soon as it passes MAX_REQUEST_BODY_MB (or at once, when
+   Content-Length already says so). The rest of the body is never spooled.
+2. Each uploaded file is checked for size (MAX_UPLOAD_MB, 413) and for the
+   `%PDF-` header (422).
+3. A file without an end-of-file marker is truncated (422). Otherwise
+   PyPDF2 opens it, which reads only the trailer and the cross-reference
+   table, and the page count is read from the root of the page tree.
+   Corrupt (422), password-protected (422) and overlong (MAX_PDF_PAGES,
+   413) files are rejected here.
+4. A PDF without a single font has no text layer, so extraction would
+   return nothing; scanned or blank files are rejected with 422. Fonts are
+   first looked for in the raw bytes, and only when the font dictionaries
+   may be hidden in compressed object streams is the page tree consulted.
+
+Steps 2 to 4 take milliseconds, even for documents with thousands of pages.
+"""
+import io
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import UPLOADS_REJECTED
+
+# Largest accepted PDF, in MB (0 = unlimited)
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+
+# Largest accepted request body, in MB; a comparison carries two PDFs (0 = unlimited)
+MAX_REQUEST_BODY_MB = int(os.getenv("MAX_REQUEST_BODY_MB", str(2 * MAX_UPLOAD_MB + 1)))
+
+# Longest accepted PDF, in pages (0 = unlimited)
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "1500"))
+
+# Reject PDFs without a text layer (scans, blank files) instead of extracting nothing
+REJECT_IMAGE_ONLY = os.getenv("REJECT_IMAGE_ONLY", "true").lower() in ("1", "true", "yes")
+
+# The header may follow up to this many bytes of junk, as readers allow
+HEADER_WINDOW = 1024
+
+# Pages whose resources are inspected before falling back to the whole page tree
+FONT_SAMPLE_PAGES = 16
+
+_HEADER = re.compile(rb"%PDF-(\d\.\d)")
+_EOF = re.compile(rb"%%EOF")
+_FONT = re.compile(rb"/Font\b")
+_OBJECT_STREAM = re.compile(rb"/Type\s*/ObjStm\b")
+
+
+class AdmissionError(Exception):
+    """An upload rejected by the admission checks."""
+
+    def __init__(self, status_code: int, reason: str, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason  # Metric label, e.g. "encrypted"
+        self.detail = detail
+
+
+@dataclass
+class PdfProfile:
+    """What the admission checks learned about an accepted PDF."""
+    version: str
+    size: int
+    page_count: int
+    encrypted: bool  # Encrypted, but readable without a password
+    elapsed_seconds: float
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "size": self.size,
+            "pageCount": self.page_count,
+            "encrypted": self.encrypted,
+            "admissionMs": round(self.elapsed_seconds * 1000, 2),
+        }
+
+
+def _walk_pages(root, wanted: Optional[Set[int]] = None) -> Iterator[Tuple[int, object, object]]:
+    """
+    Yield (index, page, resources) of the pages in a page tree, with inherited resources.
+
+    Subtrees that hold none of the `wanted` page indexes are skipped using
+    their /Count, so a sample costs a few object lookups per tree level.
+    """
+    stack = [(root, 0, None)]
+    seen = set()
+    while stack:
+        node, first, inherited = stack.pop()
+        node = node.get_object()
+        if id(node) in seen:  # Malformed trees may contain cycles
+            continue
+        seen.add(id(node))
+        resources = node.get("/Resources", inherited)
+        kids = node.get("/Kids")
+        if kids is None:
+            yield first, node, resources
+            continue
+        children = []
+        offset = first
+        for kid in kids.get_object():
+            kid = kid.get_object()
+            count = int(kid["/Count"]) if "/Kids" in kid else 1
+            if wanted is None or any(offset <= index < offset + count for index in wanted):
+                children.append((kid, offset, resources))
+            offset += count
+        stack.extend(reversed(children))
+
+
+def _has_fonts(resources, depth: int = 0) -> bool:
+    """True when a resource dictionary, or a form XObject it uses, declares a font."""
+    if resources is None:
+        return False
+    resources = resources.get_object()
+    if resources.get("/Font"):
+        return True
+    if depth >= 2:
+        return False
+    xobjects = resources.get("/XObject")
+    for xobject in (xobjects.get_object() if xobjects is not None else {}).values():
+        xobject = xobject.get_object()
+        if xobject.get("/Subtype") == "/Form" and _has_fonts(xobject.get("/Resources"), depth + 1):
+            return True
+    return False
+
+
+def has_text_layer(view: memoryview, page_tree, page_count: int) -> bool:
+    """Whether any page of the PDF can contain extractable text, i.e. uses a font."""
+    if _FONT.search(view):
+        return True
+    if not _OBJECT_STREAM.search(view):
+        # Every dictionary is stored uncompressed, so there is no font anywhere
+        return False
+
+    # Font dictionaries may sit in compressed object streams: ask the page tree
+    step = max(1, page_count // FONT_SAMPLE_PAGES)
+    sample = set(range(0, page_count, step))
+    if any(_has_fonts(resources) for _, _, resources in _walk_pages(page_tree, sample)):
+        return True
+    return any(_has_fonts(resources) for index, _, resources in _walk_pages(page_tree) if index not in sample)
+
+
+def admit_pdf(view: memoryview, stream: Optional[BinaryIO] = None) -> PdfProfile:
+    """
+    Check an uploaded PDF before it is stored or extracted.
+
+    Args:
+        view: The PDF bytes (or any buffer)
+        stream: Optional seekable stream over the same bytes
+
+    Returns:
+        PdfProfile: Version, size and page count of the accepted file
+
+    Raises:
+        AdmissionError: With status 413 (too large, too many pages) or 422
+            (not a PDF, corrupt, password-protected, no text layer)
+    """
+    # Imported on first use, as in extraction.py
+    import PyPDF2
+    from PyPDF2.errors import DependencyError
+
+    started = time.perf_counter()
+    size = len(view)
+    if MAX_UPLOAD_MB and size > MAX_UPLOAD_MB * 1024 * 1024:
+        raise AdmissionError(413, "file_size", f"PDF is {size / (1024 * 1024):.1f} MB; the limit is {MAX_UPLOAD_MB} MB")
+    # Copies of the ends: a match must not hold an export of the upload's buffer
+    header = _HEADER.search(bytes(view[:HEADER_WINDOW]))
+    if header is None:
+        raise AdmissionError(422, "not_pdf", "File is not a PDF (no %PDF- header)")
+    # A truncated upload has no end-of-file marker; PyPDF2 would scan the whole file for one
+    if not _EOF.search(bytes(view[-HEADER_WINDOW:])) and not _EOF.search(view):
+        raise AdmissionError(422, "corrupt", "PDF is truncated (no %%EOF marker)")
+
+    if stream is None:
+        stream = io.BytesIO(view)
+    stream.seek(0)
+    try:
+        reader = PyPDF2.PdfReader(stream)
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise AdmissionError(422, "encrypted", "PDF is password-protected; remove the password and upload it again")
+        page_tree = reader.trailer["/Root"]["/Pages"]
+        if reader.is_encrypted:
+            # Decrypt one content stream: some ciphers need an optional package (PyCryptodome for AES)
+            for _, page, _ in _walk_pages(page_tree, {0}):
+                contents = page.get("/Contents")
+                if contents is not None:
+                    contents = contents.get_object()
+                    (contents[0].get_object() if isinstance(contents, list) else contents).get_data()
+        page_count = int(page_tree.get_object()["/Count"])
+        if MAX_PDF_PAGES and page_count > MAX_PDF_PAGES:
+            raise AdmissionError(413, "page_count", f"PDF has {page_count} pages; the limit is {MAX_PDF_PAGES}")
+        if page_count < 1:
+            raise AdmissionError(422, "no_pages", "PDF has no pages")
+        if REJECT_IMAGE_ONLY and not has_text_layer(view, page_tree, page_count):
+            raise AdmissionError(
+                422, "image_only",
+                "PDF has no text layer (it is scanned or blank); run it through OCR and upload it again"
+            )
+    except AdmissionError:
+        raise
+    except DependencyError as e:
+        raise AdmissionError(422, "encrypted", f"PDF is encrypted with an unsupported cipher: {e}")
+    except Exception as e:
+        raise AdmissionError(422, "corrupt", f"PDF is damaged and cannot be read: {e}")
+    finally:
+        stream.seek(0)
+
+    return PdfProfile(
+        version=header.group(1).decode(),
+        size=size,
+        page_count=page_count,
+        encrypted=reader.is_encrypted,
+        elapsed_seconds=time.perf_counter() - started
+    )
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware answering 413 once a request body passes `max_body_bytes`.
+
+    A declared Content-Length over the limit is refused before the body is
+    read; otherwise the body is counted as the application receives it.
+
+    Args:
+        app: The wrapped application
+        max_body_bytes: Largest accepted body; 0 disables the limit
+    """
+
+    def __init__(self, app: ASGIApp, max_body_bytes: int = MAX_REQUEST_BODY_MB * 1024 * 1024):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    def _detail(self) -> str:
+        return f"Request body exceeds the limit of {self.max_body_bytes // (1024 * 1024)} MB"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.max_body_bytes:
+            await self.app(scope, receive, send)
+            return
+        declared = Headers(scope=scope).get("content-length", "")
+        if declared.isdigit() and int(declared) > self.max_body_bytes:
+            UPLOADS_REJECTED.inc(reason="request_size")
+            response = JSONResponse(status_code=413, content={"detail": self._detail()})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def receive_limited() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    UPLOADS_REJECTED.inc(reason="request_size")
+                    # Raised inside the body parser, which lets HTTPException through
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, receive_limited, send)
@@ -0,0 +1,268 @@
+"""
+Content-based alignment of the sections of two bill versions.
+
+Between a draft and an enrolled version, sections are inserted, removed and
+renumbered ("SECTION 4." becomes "SEC. 5."), so pairing them by number pairs
+the wrong ones. Sections are aligned by content instead:
+
+1. Sections whose text is identical (ignoring whitespace) pair up directly.
+2. The rest are fingerprinted with MinHash over 3-word shingles. All
+   signatures are computed at once with NumPy, and so is the matrix of
+   estimated Jaccard similarities between every remaining pair.
+3. Pairs are matched greedily from the most similar down. Ties go to
+   sections at the same relative position.
+4. Leftover sections that are mostly contained in a matched section are
+   parts of a split or a merge. Where the same number of sections is left
+   on both sides between two in-order matches, they are paired as rewrites.
+   Anything else was added or removed.
+5. Matched pairs outside the longest in-order run are marked moved.
+
+Callers pass the section bodies without their headings, so a section that
+was only renumbered counts as unchanged.
+"""
+import os
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Estimated Jaccard similarity at which two sections are the same section
+SECTION_MATCH_THRESHOLD = float(os.getenv("SECTION_MATCH_THRESHOLD", "0.4"))
+
+# Share of a leftover section found inside another one to count as split off or merged in
+SECTION_PART_THRESHOLD = 0.6
+
+# Signature positions that must agree before containment is estimated; a
+# part much smaller than its whole is below MinHash's resolution
+MIN_PART_AGREEMENT = 4
+
+SHINGLE_WORDS = 3
+MINHASH_PERMUTATIONS = 64
+
+# Permutations hashed per pass and signature rows compared per pass (bounds memory)
+_PERMUTATION_BLOCK = 16
+_ROW_BLOCK = 64
+
+UNCHANGED = "unchanged"
+MODIFIED = "modified"
+MOVED = "moved"
+SPLIT = "split"
+MERGED = "merged"
+ADDED = "added"
+REMOVED = "removed"
+
+# Shingles are hashed to 64 bits, then folded to 32 bits for the permutations
+_rng = np.random.default_rng(0x5EC7)
+_SEEDS = _rng.integers(0, 2 ** 32, MINHASH_PERMUTATIONS, dtype=np.uint32)
+_MULTIPLIERS = _rng.integers(0, 2 ** 31, MINHASH_PERMUTATIONS, dtype=np.uint32) * np.uint32(2) + np.uint32(1)
+_SHINGLE_WEIGHTS = np.array([0x9E3779B97F4A7C15 ** power % 2 ** 64 for power in range(SHINGLE_WORDS)], dtype=np.uint64)
+
+
+@dataclass
+class SectionMatch:
+    """Sections of both versions that correspond, by index into each version's sections."""
+    status: str
+    sections_a: List[int]
+    sections_b: List[int]
+    similarity: float  # Estimated Jaccard similarity; 1.0 for identical text
+
+
+def minhash_signatures(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    MinHash signatures of word shingles.
+
+    Words are identified by Python's string hash, which is stable within a
+    process, so signatures are only comparable within one process.
+
+    Args:
+        texts: Section bodies
+
+    Returns:
+        (signatures of shape (len(texts), MINHASH_PERMUTATIONS), shingle count per text)
+    """
+    # Every text is followed by SHINGLE_WORDS - 1 padding ids (0), so a text of
+    # n words has exactly n shingles, however short it is
+    ids: List[int] = []
+    counts = np.zeros(len(texts), dtype=np.int64)
+    padding = [0] * (SHINGLE_WORDS - 1)
+    for index, text in enumerate(texts):
+        words = text.lower().split()
+        counts[index] = len(words)
+        ids.extend(map(hash, words))
+        ids.extend(padding)
+
+    signatures = np.full((len(texts), MINHASH_PERMUTATIONS), np.iinfo(np.uint32).max, dtype=np.uint32)
+    filled = np.flatnonzero(counts)
+    if not len(filled):
+        return signatures, counts
+
+    padded = np.array(ids, dtype=np.int64).view(np.uint64)
+    shingle_count = len(padded) - SHINGLE_WORDS + 1
+    hashes = np.zeros(shingle_count, dtype=np.uint64)
+    for offset in range(SHINGLE_WORDS):
+        hashes += padded[offset:offset + shingle_count] * _SHINGLE_WEIGHTS[offset]
+
+    # Keep the shingles that start on a word, not on padding
+    spans = counts + SHINGLE_WORDS - 1
+    offsets = np.cumsum(spans) - spans
+    groups = np.cumsum(counts[filled]) - counts[filled]
+    hashes = hashes[np.repeat(offsets[filled] - groups, counts[filled]) + np.arange(counts.sum())]
+    hashes = (hashes ^ (hashes >> np.uint64(32))).astype(np.uint32)
+
+    for block in range(0, MINHASH_PERMUTATIONS, _PERMUTATION_BLOCK):
+        seeds = _SEEDS[block:block + _PERMUTATION_BLOCK, None]
+        multipliers = _MULTIPLIERS[block:block + _PERMUTATION_BLOCK, None]
+        permuted = (hashes[None, :] ^ seeds) * multipliers
+        permuted ^= permuted >> np.uint32(15)
+        signatures[filled, block:block + _PERMUTATION_BLOCK] = np.minimum.reduceat(permuted, groups, axis=1).T
+    return signatures, counts
+
+
+def similarity_matrix(signatures_a: np.ndarray, signatures_b: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard similarity of every pair of signatures, shape (len(a), len(b))."""
+    matrix = np.empty((len(signatures_a), len(signatures_b)), dtype=np.float32)
+    for row in range(0, len(signatures_a), _ROW_BLOCK):
+        block = signatures_a[row:row + _ROW_BLOCK, None, :] == signatures_b[None, :, :]
+        matrix[row:row + _ROW_BLOCK] = block.sum(axis=2) / np.float32(MINHASH_PERMUTATIONS)
+    return matrix
+
+
+def _in_order(pairs: List[Tuple[int, int]]) -> set:
+    """Pairs (a, b) on a longest run that is increasing in both a and b."""
+    pairs = sorted(pairs, key=lambda pair: pair[1])
+    tails: List[int] = []  # smallest a ending an increasing run of each length
+    tail_index: List[int] = []
+    previous = [-1] * len(pairs)
+    for index, (a, _) in enumerate(pairs):
+        length = bisect_left(tails, a)
+        if length == len(tails):
+            tails.append(a)
+            tail_index.append(index)
+        else:
+            tails[length] = a
+            tail_index[length] = index
+        previous[index] = tail_index[length - 1] if length else -1
+    keep = set()
+    index = tail_index[-1] if tail_index else -1
+    while index >= 0:
+        keep.add(pairs[index])
+        index = previous[index]
+    return keep
+
+
+def align_sections(bodies_a: List[str], bodies_b: List[str]) -> List[SectionMatch]:
+    """
+    Align the sections of two versions of a bill by content.
+
+    Args:
+        bodies_a: Section texts of the first version, without their headings
+        bodies_b: Section texts of the second version, without their headings
+
+    Returns:
+        Matches covering every section of both versions once, in the order
+        of the second version; sections only in the first version follow
+        the match of the section that preceded them there
+    """
+    normalized_a = [" ".join(body.split()) for body in bodies_a]
+    normalized_b = [" ".join(body.split()) for body in bodies_b]
+
+    # Identical sections pair up in order without being fingerprinted
+    by_text: Dict[str, deque] = {}
+    for index, text in enumerate(normalized_b):
+        by_text.setdefault(text, deque()).append(index)
+    pairs: Dict[int, Tuple[int, float]] = {}  # a -> (b, similarity)
+    for index, text in enumerate(normalized_a):
+        candidates = by_text.get(text)
+        if candidates:
+            pairs[index] = (candidates.popleft(), 1.0)
+    matched_b = {b for b, _ in pairs.values()}
+    rest_a = [index for index in range(len(bodies_a)) if index not in pairs]
+    rest_b = [index for index in range(len(bodies_b)) if index not in matched_b]
+
+    split_parts: Dict[int, List[int]] = {}  # a -> parts of b split off from it
+    merged_parts: Dict[int, List[int]] = {}  # b -> parts of a merged into it
+    similarity = np.zeros((len(rest_a), len(rest_b)), dtype=np.float32)
+    if rest_a and rest_b:
+        signatures_a, counts_a = minhash_signatures([normalized_a[index] for index in rest_a])
+        signatures_b, counts_b = minhash_signatures([normalized_b[index] for index in rest_b])
+        similarity = similarity_matrix(signatures_a, signatures_b)
+
+        # Most similar pairs first; among equals, those at the same relative position
+        rows, columns = np.nonzero(similarity >= SECTION_MATCH_THRESHOLD)
+        scores = similarity[rows, columns]
+        drift = np.abs(np.asarray(rest_a)[rows] / max(len(bodies_a), 1) - np.asarray(rest_b)[columns] / max(len(bodies_b), 1))
+        free_rows = np.ones(len(rest_a), dtype=bool)
+        free_columns = np.ones(len(rest_b), dtype=bool)
+        for candidate in np.lexsort((drift, -scores)):
+            row, column = rows[candidate], columns[candidate]
+            if free_rows[row] and free_columns[column]:
+                free_rows[row] = free_columns[column] = False
+                pairs[rest_a[row]] = (rest_b[column], float(scores[candidate]))
+
+        # Leftovers mostly contained in a matched section were split off from it
+        # or merged into it: |A n B| / |B| = J (|A| + |B|) / ((1 + J) |B|)
+        overlap = similarity / (1 + similarity) * (counts_a[:, None] + counts_b[None, :])
+        overlap[similarity < MIN_PART_AGREEMENT / MINHASH_PERMUTATIONS] = 0
+        matched_rows, matched_columns = ~free_rows, ~free_columns
+        for column in np.flatnonzero(free_columns & (counts_b >= SHINGLE_WORDS)):
+            contained = np.where(matched_rows, overlap[:, column], 0) / counts_b[column]
+            row = int(np.argmax(contained))
+            if contained[row] >= SECTION_PART_THRESHOLD:
+                split_parts.setdefault(rest_a[row], []).append(rest_b[column])
+        for row in np.flatnonzero(free_rows & (counts_a >= SHINGLE_WORDS)):
+            contained = np.where(matched_columns, overlap[row, :], 0) / counts_a[row]
+            column = int(np.argmax(contained))
+            if contained[column] >= SECTION_PART_THRESHOLD:
+                merged_parts.setdefault(rest_b[column], []).append(rest_a[row])
+
+    in_order = _in_order([(a, b) for a, (b, _) in pairs.items()])
+
+    # Between two in-order matches, equally many leftover sections on both
+    # sides are rewrites of each other, however little text they share
+    taken_a = set(pairs).union(*merged_parts.values())
+    taken_b = {b for b, _ in pairs.values()}.union(*split_parts.values())
+    left_a = [a for a in rest_a if a not in taken_a]
+    left_b = [b for b in rest_b if b not in taken_b]
+    row_of = {a: row for row, a in enumerate(rest_a)}
+    column_of = {b: column for column, b in enumerate(rest_b)}
+    anchors = [(-1, -1)] + sorted(in_order, key=lambda pair: pair[1]) + [(len(bodies_a), len(bodies_b))]
+    for (low_a, low_b), (high_a, high_b) in zip(anchors, anchors[1:]):
+        gap_a = left_a[bisect_left(left_a, low_a):bisect_left(left_a, high_a)]
+        gap_b = left_b[bisect_left(left_b, low_b):bisect_left(left_b, high_b)]
+        if gap_a and len(gap_a) == len(gap_b):
+            for a, b in zip(gap_a, gap_b):
+                pairs[a] = (b, float(similarity[row_of[a], column_of[b]]))
+                in_order.add((a, b))
+
+    matches: List[SectionMatch] = []
+    for a, (b, score) in pairs.items():
+        if a in split_parts or b in merged_parts:
+            status = SPLIT if a in split_parts else MERGED
+            matches.append(SectionMatch(status, sorted([a] + merged_parts.pop(b, [])), sorted([b] + split_parts.pop(a, [])), score))
+        elif (a, b) not in in_order:
+            matches.append(SectionMatch(MOVED, [a], [b], score))
+        else:
+            matches.append(SectionMatch(UNCHANGED if normalized_a[a] == normalized_b[b] else MODIFIED, [a], [b], score))
+
+    covered_a = {a for match in matches for a in match.sections_a}
+    covered_b = {b for match in matches for b in match.sections_b}
+    matches.extend(SectionMatch(ADDED, [], [b], 0.0) for b in range(len(bodies_b)) if b not in covered_b)
+
+    # Order by the second version; removed sections follow the match of the
+    # section that preceded them in the first version
+    matches.sort(key=lambda match: match.sections_b[0])
+    match_of_a = {a: position for position, match in enumerate(matches) for a in match.sections_a}
+    removed_after: Dict[int, List[SectionMatch]] = {}
+    previous = -1
+    for a in range(len(bodies_a)):
+        if a in covered_a:
+            previous = match_of_a.get(a, previous)
+        else:
+            removed_after.setdefault(previous, []).append(SectionMatch(REMOVED, [a], [], 0.0))
+    ordered = list(removed_after.get(-1, []))
+    for position, match in enumerate(matches):
+        ordered.append(match)
+        ordered.extend(removed_after.get(position, []))
+    return ordered
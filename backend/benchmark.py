@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmarks for extraction, normalization, diffing and /api/compare.
+
+Runs against the documents checked into the repository and an in-process
+stub of the OpenAI API (httpx.MockTransport), so results depend only on this
+code and the machine. Each benchmark is repeated and summarized by its median;
+results are written as JSON and can be compared with an earlier run:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json --threshold 0.2
+
+The second run exits with status 1 when any benchmark's median got slower
+than the baseline by more than the threshold.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PDF_CORPUS = [
+    "FWPA_Draft.pdf",
+    "FWPA_Final.pdf",
+    "app/pdf/Document_1.2_Original.pdf",
+    "app/pdf/Document_1.3_Revised.pdf",
+    "test/hr748_enrolled.pdf",
+    "test/hr1_enrolled.pdf",
+]
+
+# Documents over this many pages are skipped by --quick
+QUICK_MAX_PAGES = 100
+
+DIFF_PAIRS = [
+    ("FWPA_Draft.pdf", "FWPA_Final.pdf"),
+    ("app/pdf/Document_1.2_Original.pdf", "app/pdf/Document_1.3_Revised.pdf"),
+    ("test/demo_bill_original.txt", "test/demo_bill_revised.txt"),
+    ("test/education_equity_original.txt", "test/education_equity_revised.txt"),
+    ("test/hr748_enrolled.pdf", "test/hr1_enrolled.pdf"),
+]
+
+# Each is also diffed against an edited copy of itself: a large, near-identical
+# pair measures the diff algorithm, where two unrelated bills only hit its timeout
+EDITED_DIFF_DOCUMENTS = ["test/hr1_enrolled.pdf"]
+
+# Average number of lines between two edits of an edited copy
+EDIT_EVERY_LINES = 150
+
+# Normalization counters that must be non-zero for a document: HR 1 numbers
+# its lines at the right margin and hyphenates across them
+EXPECTED_NORMALIZATION = {
+    "test/hr1_enrolled.pdf": ("line_numbers_removed", "hyphens_joined"),
+}
+
+COMPARE_PAIRS = [
+    ("FWPA_Draft.pdf", "FWPA_Final.pdf"),
+    ("app/pdf/Document_1.2_Original.pdf", "app/pdf/Document_1.3_Revised.pdf"),
+    ("test/hr748_enrolled.pdf", "test/hr1_enrolled.pdf"),
+]
+
+# Medians below this are compared as if they took this long, so timer noise
+# on sub-millisecond benchmarks does not fail a run
+DEFAULT_MIN_SECONDS = 0.005
+
+STUB_ANALYSIS = {
+    "executive_summary": {
+        "bill_a_title": "Bill A",
+        "bill_b_title": "Bill B",
+        "primary_subject": "Benchmark",
+        "key_changes": [{
+            "topic": "Benchmark",
+            "description": "Stub analysis returned by the benchmark's OpenAI stand-in",
+            "impact": "None",
+            "original_quote": "",
+            "proposed_quote": ""
+        }],
+        "overall_impact_assessment": "Not assessed"
+    },
+    "stakeholder_analysis": [{
+        "name": "Benchmark",
+        "category": "other",
+        "effect": "neutral",
+        "description": "Stub",
+        "evidence_quote": ""
+    }],
+    "impact_forecast": {
+        "assumptions": ["Stub"],
+        "short_term_1y": {"economic": "", "social": "", "political": ""},
+        "medium_term_3y": {"economic": "", "social": "", "political": ""},
+        "long_term_5y": {"economic": "", "social": "", "political": ""}
+    }
+}
+
+
+def openai_stub(latency: float, stream_chunk_chars: int = 64):
+    """
+    httpx.MockTransport that answers chat completions with STUB_ANALYSIS.
+
+    Args:
+        latency: Seconds to wait before answering, to model the API's own latency
+        stream_chunk_chars: Characters per delta when the call streams
+    """
+    import httpx
+
+    content = json.dumps(STUB_ANALYSIS)
+    usage = {"prompt_tokens": 1000, "completion_tokens": len(content) // 4, "total_tokens": 1000 + len(content) // 4}
+
+    def chunk(delta: Optional[dict], **extra) -> str:
+        body = {"id": "bench", "object": "chat.completion.chunk", "created": 0, "model": "stub", "choices": [], **extra}
+        if delta is not None:
+            body["choices"] = [{"index": 0, "delta": delta, "finish_reason": None}]
+        return f"data: {json.dumps(body)}\n\n"
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        if latency:
+            await asyncio.sleep(latency)
+        if payload.get("stream"):
+            events = [chunk({"content": content[i:i + stream_chunk_chars]}) for i in range(0, len(content), stream_chunk_chars)]
+            events.append(chunk(None, usage=usage))
+            events.append("data: [DONE]\n\n")
+            return httpx.Response(200, content="".join(events).encode(), headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json={
+            "id": "bench",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": usage
+        })
+
+    return httpx.MockTransport(handler)
+
+
+def measure(func: Callable[[], object], repeat: int, warmup: int = 1) -> Tuple[dict, object]:
+    """
+    Time `func` `repeat` times after `warmup` untimed calls.
+
+    Returns:
+        (timing summary, result of the last call)
+    """
+    result = None
+    for _ in range(warmup):
+        result = func()
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - started)
+    return {
+        "median_s": statistics.median(runs),
+        "min_s": min(runs),
+        "max_s": max(runs),
+        "runs_s": [round(run, 6) for run in runs],
+    }, result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_document(path: str, extractor) -> List[str]:
+    """Page texts of a corpus document; a .txt file counts as one page."""
+    full_path = os.path.join(ROOT, path)
+    if path.endswith(".txt"):
+        with open(full_path, encoding="utf-8") as f:
+            return [f.read()]
+    with open(full_path, "rb") as f:
+        return [page.text for page in extractor.extract(f.read()).pages]
+
+
+def edit_text(text: str, every: int = EDIT_EVERY_LINES, seed: int = 0) -> str:
+    """A reproducible revision of `text` with a line amended, removed or added every `every` lines on average."""
+    rng = random.Random(seed)
+    revised = []
+    for line in text.splitlines():
+        if rng.random() >= 1 / every:
+            revised.append(line)
+            continue
+        edit = rng.randrange(3)
+        if edit == 0:
+            revised.append(f"{line} (as amended)")
+        elif edit == 2:
+            revised.extend([line, "Such sums as may be necessary are authorized to be appropriated."])
+    return "\n".join(revised)
+
+
+def run_benchmarks(args) -> Dict[str, dict]:
+    # Imported here: the extraction pool spawns processes that re-import this
+    # module, and they should not load the whole app
+    import PyPDF2
+
+    import main
+    from diffing import diff_texts
+    from extraction import join_pages
+    from fastapi.testclient import TestClient
+    from normalization import normalize_pages
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results: Dict[str, dict] = {}
+    extractor = main.page_extractor
+
+    def selected(group: str) -> bool:
+        return not args.only or group in args.only
+
+    def report(name: str, entry: dict):
+        results[name] = entry
+        extras = ", ".join(f"{key}={value}" for key, value in entry.items() if not key.endswith("_s"))
+        print(f"{name:<64} {entry['median_s'] * 1000:>10.1f} ms  {extras}", flush=True)
+
+    page_texts: Dict[str, List[str]] = {}
+    skipped = set()
+    for path in PDF_CORPUS:
+        with open(os.path.join(ROOT, path), "rb") as f:
+            data = f.read()
+        if args.quick and len(PyPDF2.PdfReader(os.path.join(ROOT, path)).pages) > QUICK_MAX_PAGES:
+            skipped.add(path)
+            continue
+        if not selected("extraction"):
+            page_texts[path] = [page.text for page in extractor.extract(data).pages]
+            continue
+        timing, extraction = measure(lambda: extractor.extract(data), args.repeat)
+        page_texts[path] = [page.text for page in extraction.pages]
+        report(f"extraction:{path}", {
+            **timing,
+            "pages": extraction.page_count,
+            "workers": extraction.workers,
+            "pages_per_second": round(extraction.page_count / timing["median_s"], 1),
+        })
+
+    if selected("normalization"):
+        for path, pages in page_texts.items():
+            timing, (_, stats) = measure(lambda: normalize_pages(pages), args.repeat)
+            counts = stats.to_dict()
+            report(f"normalization:{path}", {
+                **timing,
+                "chars": stats.chars_before,
+                "chars_per_second": round(stats.chars_before / timing["median_s"]),
+                "saved_percent": counts["saved_percent"],
+                **{counter: counts[counter] for counter in EXPECTED_NORMALIZATION.get(path, ())},
+            })
+
+    if selected("diff"):
+        def document_text(path: str) -> str:
+            pages = page_texts.get(path) or read_document(path, extractor)
+            if main.TEXT_NORMALIZATION:
+                pages, _ = normalize_pages(pages)
+            return join_pages(pages, elapsed_seconds=0.0, workers=1).text
+
+        diff_inputs = [
+            (f"{os.path.basename(path_a)}:{os.path.basename(path_b)}", path_a, path_b, None)
+            for path_a, path_b in DIFF_PAIRS
+        ] + [
+            (f"{os.path.basename(path)}:edited", path, path, edit_text)
+            for path in EDITED_DIFF_DOCUMENTS
+        ]
+        for name, path_a, path_b, revise in diff_inputs:
+            if path_a in skipped or path_b in skipped:
+                continue
+            texts = [document_text(path_a), document_text(path_b)]
+            if revise is not None:
+                texts[1] = revise(texts[1])
+            timing, diff = measure(lambda: diff_texts(texts[0], texts[1]), args.repeat)
+            report(f"diff:{name}", {
+                **timing,
+                "hunks": len(diff.hunks),
+                "timed_out": diff.timed_out,
+            })
+
+    if selected("compare"):
+        main.llm_pool.transport = openai_stub(args.llm_latency_ms / 1000)
+        with TestClient(main.app) as client:
+            for path_a, path_b in COMPARE_PAIRS:
+                if path_a in skipped or path_b in skipped:
+                    continue
+                with open(os.path.join(ROOT, path_a), "rb") as f:
+                    bill_a = f.read()
+                with open(os.path.join(ROOT, path_b), "rb") as f:
+                    bill_b = f.read()
+
+                def compare() -> dict:
+                    response = client.post("/api/compare", files={
+                        "bill_a_file": (os.path.basename(path_a), bill_a, "application/pdf"),
+                        "bill_b_file": (os.path.basename(path_b), bill_b, "application/pdf"),
+                    })
+                    response.raise_for_status()
+                    return response.json()
+
+                def cold_compare() -> dict:
+                    for cache in main.caches.values():
+                        cache.clear()
+                    return compare()
+
+                name = f"{os.path.basename(path_a)}:{os.path.basename(path_b)}"
+                calls_before = main.llm_scheduler.stats()["admitted"]["interactive"]
+                timing, response = measure(cold_compare, args.repeat)
+                calls = (main.llm_scheduler.stats()["admitted"]["interactive"] - calls_before) // (args.repeat + 1)
+                report(f"compare_cold:{name}", {**timing, "llm_calls": calls, "cached": response["metadata"]["cached"]})
+                timing, response = measure(compare, args.repeat)
+                report(f"compare_warm:{name}", {**timing, "cached": response["metadata"]["cached"]})
+
+    return results
+
+
+def check_normalization(results: Dict[str, dict]) -> List[str]:
+    """Documents whose normalization left an EXPECTED_NORMALIZATION counter at zero."""
+    failures = []
+    for path, counters in EXPECTED_NORMALIZATION.items():
+        entry = results.get(f"normalization:{path}")
+        if entry is None:
+            continue
+        failures.extend(f"{path}: {counter} is 0" for counter in counters if not entry.get(counter))
+    return failures
+
+
+def compare_with_baseline(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float, min_seconds: float) -> List[str]:
+    """
+    Benchmarks whose median regressed past the threshold.
+
+    Args:
+        results: Benchmarks of this run
+        baseline: Benchmarks of the run to compare with
+        threshold: Allowed slowdown as a fraction (0.2 = 20%)
+        min_seconds: Floor applied to both medians before comparing
+
+    Returns:
+        Human-readable descriptions of the regressions
+    """
+    regressions = []
+    for name, entry in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        current_s = max(entry["median_s"], min_seconds)
+        previous_s = max(previous["median_s"], min_seconds)
+        change = current_s / previous_s - 1
+        marker = "REGRESSION" if change > threshold else ""
+        print(f"{name:<64} {previous_s * 1000:>10.1f} -> {current_s * 1000:>10.1f} ms  {change * 100:+6.1f}%  {marker}")
+        if change > threshold:
+            regressions.append(f"{name}: {previous_s * 1000:.1f}ms -> {current_s * 1000:.1f}ms ({change * 100:+.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extraction, normalization, diffing and /api/compare")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark (after one warm-up run)")
+    parser.add_argument("--only", nargs="+", choices=["extraction", "normalization", "diff", "compare"], help="Benchmark groups to run")
+    parser.add_argument("--quick", action="store_true", help=f"Skip documents over {QUICK_MAX_PAGES} pages")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Latency of the stubbed OpenAI API")
+    parser.add_argument("--baseline", help="Earlier results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown against the baseline (0.2 = 20%%)")
+    parser.add_argument("--min-seconds", type=float, default=DEFAULT_MIN_SECONDS, help="Noise floor for the comparison")
+    args = parser.parse_args()
+
+    # Isolated caches and an unthrottled scheduler; set before the app is imported
+    cache_dir = tempfile.mkdtemp(prefix="legiscompare-bench-")
+    os.environ["CACHE_DIR"] = cache_dir
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ["LLM_RPM"] = "0"
+    os.environ["LLM_TPM"] = "0"
+    os.environ["PROFILE_SAMPLE_EVERY"] = "0"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    try:
+        results = run_benchmarks(args)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    output = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+            "quick": args.quick,
+            "llm_latency_ms": args.llm_latency_ms,
+        },
+        "benchmarks": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"\nWrote {len(results)} benchmarks to {args.output}")
+
+    failures = check_normalization(results)
+    if failures:
+        print(f"\n{len(failures)} normalization check(s) failed:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline} (commit {baseline['meta'].get('git_commit')}), threshold {args.threshold * 100:.0f}%:")
+        regressions = compare_with_baseline(results, baseline["benchmarks"], args.threshold, args.min_seconds)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Content-addressed two-tier cache.
+
+Entries live in a bounded in-memory LRU and are written through to a SQLite
+file on disk, so results survive restarts and are shared across workers on
+the same machine. Both tiers are bounded by size and evict least recently
+used entries first; entries can optionally expire after a TTL.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+
+def content_hash(data) -> str:
+    """SHA-256 hex digest of raw bytes (or any buffer) or of a UTF-8 string."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class TwoTierCache:
+    """
+    String cache with a memory LRU in front of a size-bounded SQLite store.
+
+    Args:
+        name: Cache name, used for the SQLite table and in stats
+        db_path: Path to the SQLite file
+        memory_max_bytes: Size budget of the in-memory tier (measured in characters)
+        disk_max_bytes: Size budget of the on-disk tier (compressed bytes)
+        ttl_seconds: Optional lifetime of an entry, measured from when it was stored
+    """
+
+    def __init__(
+        self,
+        name: str,
+        db_path: str,
+        memory_max_bytes: int,
+        disk_max_bytes: int,
+        ttl_seconds: Optional[float] = None
+    ):
+        self.name = name
+        self.db_path = db_path
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # key -> (value, created_at)
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid = None
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.name} ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute(f"CREATE INDEX IF NOT EXISTS {self.name}_accessed ON {self.name} (accessed_at)")
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # A SQLite connection must not be used across fork(), e.g. by server
+        # workers forked from a preloaded app; each process opens its own
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+
+            row = self._db.execute(f"SELECT value, created_at FROM {self.name} WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._expired(row[1], now):
+                self._delete(key)
+                self.expirations += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._db.execute(f"UPDATE {self.name} SET accessed_at = ? WHERE key = ?", (now, key))
+            value = zlib.decompress(row[0]).decode("utf-8")
+            self._remember(key, value, row[1])
+            self.disk_hits += 1
+            return value
+
+    def set(self, key: str, value: str):
+        """Store value under key in both tiers."""
+        compressed = zlib.compress(value.encode("utf-8"), 1)
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.name} (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, compressed, len(compressed), now, now),
+            )
+            self._evict_disk()
+
+    def invalidate(self, key: str) -> bool:
+        """Remove a single entry from both tiers. Returns True if it existed."""
+        with self._lock:
+            existed = self._delete(key)
+            if existed:
+                self.invalidations += 1
+            return existed
+
+    def clear(self) -> int:
+        """Remove every entry from both tiers. Returns the number of disk entries removed."""
+        with self._lock:
+            (count,) = self._db.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()
+            self._db.execute(f"DELETE FROM {self.name}")
+            self._memory.clear()
+            self._memory_bytes = 0
+            self.invalidations += count
+            return count
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current tier sizes."""
+        with self._lock:
+            disk_entries, disk_bytes = self._db.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.name}"
+            ).fetchone()
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "memory_evictions": self.memory_evictions,
+                "disk_evictions": self.disk_evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _delete(self, key: str) -> bool:
+        """Remove key from both tiers. Caller holds the lock."""
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[0])
+        cursor = self._db.execute(f"DELETE FROM {self.name} WHERE key = ?", (key,))
+        return entry is not None or cursor.rowcount > 0
+
+    def _remember(self, key: str, value: str, created_at: float):
+        """Insert into the memory tier and evict LRU entries over budget. Caller holds the lock."""
+        size = len(value)
+        if size > self.memory_max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous[0])
+        self._memory[key] = (value, created_at)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.memory_evictions += 1
+
+    def _evict_disk(self):
+        """Drop expired rows, then least recently used rows until the disk tier fits its budget. Caller holds the lock."""
+        if self.ttl_seconds is not None:
+            cursor = self._db.execute(
+                f"DELETE FROM {self.name} WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self.expirations += max(cursor.rowcount, 0)
+        (total,) = self._db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.name}").fetchone()
+        if total <= self.disk_max_bytes:
+            return
+        rows = self._db.execute(f"SELECT key, size FROM {self.name} ORDER BY accessed_at").fetchall()
+        doomed = []
+        for key, size in rows:
+            if total <= self.disk_max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._db.executemany(f"DELETE FROM {self.name} WHERE key = ?", doomed)
+        self.disk_evictions += len(doomed)
+        logger.info(f"Cache '{self.name}' evicted {len(doomed)} entries from disk")
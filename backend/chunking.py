@@ -0,0 +1,359 @@
+"""
+Section-aware chunking of bill pairs for map-reduce analysis.
+
+Bills are split on their `SECTION n.` / `SEC. n.` headings, sections of the
+two versions are aligned by content (see alignment.py), and consecutive
+pairs are packed into chunks that fit a token budget. Sections that are
+identical in both versions are left out. Each chunk is analysed
+independently and the partial analyses are merged back into a single result,
+so every change in both bills reaches the model without overflowing its
+context.
+"""
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from alignment import ADDED, MERGED, MOVED, REMOVED, SPLIT, UNCHANGED, align_sections
+
+# Document tokens (both versions together) allowed in one chunk's prompt
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "6000"))
+
+# Rough characters-per-token ratio for English legislative text
+CHARS_PER_TOKEN = 4
+
+# Upper-case headings (and "Section 1:" style drafts) start a section; the
+# mixed-case "Sec. 123." entries of a table of contents do not.
+SECTION_HEADING = re.compile(r"^[ \t]*(?:SECTION|SEC\.|Section)[ \t]+(\d+[A-Za-z]?)[.:]", re.MULTILINE)
+
+# Label of the text before the first heading (title, enacting clause, table of contents)
+PREAMBLE = "preamble"
+
+# Longest free-text field (assessment, forecast, stakeholder description) merged from chunk analyses
+MERGED_TEXT_MAX_CHARS = int(os.getenv("MERGED_TEXT_MAX_CHARS", "1500"))
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+# Impact forecast horizons and dimensions holding free text
+FORECAST_HORIZONS = ("short_term_1y", "medium_term_3y", "long_term_5y")
+FORECAST_DIMENSIONS = ("economic", "social", "political")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for budgeting prompts."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class Section:
+    """A contiguous span of a bill starting at a section heading."""
+    number: Optional[str]  # None for text before the first heading
+    start: int
+    end: int
+    text: str
+
+
+@dataclass
+class Chunk:
+    """Matching slices of both bills analysed in one model call."""
+    index: int
+    bill_a_text: str
+    bill_b_text: str
+    sections: List[str] = field(default_factory=list)
+    unchanged_sections: int = 0  # Sections identical in both bills, left out of every chunk
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.bill_a_text) + estimate_tokens(self.bill_b_text)
+
+
+def split_sections(text: str) -> List[Section]:
+    """
+    Split a bill into sections at its headings.
+
+    Args:
+        text: Full document text
+
+    Returns:
+        List of sections covering the whole text, in order
+    """
+    matches = list(SECTION_HEADING.finditer(text))
+    sections = []
+    if not matches or matches[0].start() > 0:
+        end = matches[0].start() if matches else len(text)
+        if text[:end].strip():
+            sections.append(Section(number=None, start=0, end=end, text=text[:end]))
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        sections.append(Section(number=match.group(1), start=match.start(), end=end, text=text[match.start():end]))
+    return sections
+
+
+def _label(section: Section) -> str:
+    return PREAMBLE if section.number is None else f"SEC. {section.number}"
+
+
+def _body(section: Section) -> str:
+    """Section text without its heading, so renumbered sections compare equal."""
+    heading = SECTION_HEADING.match(section.text)
+    return section.text[heading.end():] if heading else section.text
+
+
+def pair_sections(bill_a_text: str, bill_b_text: str) -> List[Tuple[str, str, str, str]]:
+    """
+    Pair the sections of two bill versions by content.
+
+    Sections only present in one version are paired with empty text; split
+    and merged sections are paired with all their parts. Order follows bill
+    B, with sections removed from bill A placed after the section that
+    preceded them in bill A.
+
+    Returns:
+        List of (label, bill_a_section_text, bill_b_section_text, status),
+        with the status from alignment.py
+    """
+    sections_a = split_sections(bill_a_text)
+    sections_b = split_sections(bill_b_text)
+    pairs = []
+    for match in align_sections([_body(section) for section in sections_a], [_body(section) for section in sections_b]):
+        labels_a = ", ".join(_label(sections_a[index]) for index in match.sections_a)
+        labels_b = ", ".join(_label(sections_b[index]) for index in match.sections_b)
+        if match.status == ADDED:
+            label = f"{labels_b} (added)"
+        elif match.status == REMOVED:
+            label = f"{labels_a} (removed)"
+        else:
+            label = labels_b if labels_a == labels_b else f"{labels_a} -> {labels_b}"
+            if match.status in (MOVED, SPLIT, MERGED):
+                label = f"{label} ({match.status})"
+        pairs.append((
+            label,
+            "".join(sections_a[index].text for index in match.sections_a),
+            "".join(sections_b[index].text for index in match.sections_b),
+            match.status
+        ))
+    return pairs
+
+
+def _split_oversized(text: str, max_chars: int) -> List[str]:
+    """Split text into pieces of at most max_chars, preferring paragraph breaks."""
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind("\n\n", 0, max_chars)
+        if cut < max_chars // 2:
+            cut = text.rfind("\n", 0, max_chars)
+        if cut < max_chars // 2:
+            cut = max_chars
+        pieces.append(text[:cut])
+        text = text[cut:]
+    pieces.append(text)
+    return pieces
+
+
+def plan_chunks(bill_a_text: str, bill_b_text: str, token_budget: int = CHUNK_TOKEN_BUDGET) -> List[Chunk]:
+    """
+    Pack paired sections of both bills into chunks under a token budget.
+
+    Args:
+        bill_a_text: Text of the original bill
+        bill_b_text: Text of the revised bill
+        token_budget: Maximum estimated document tokens per chunk
+
+    Returns:
+        Chunks covering every section that differs between the bills (plus
+        the preamble), in document order
+    """
+    max_chars = token_budget * CHARS_PER_TOKEN
+    pairs = pair_sections(bill_a_text, bill_b_text)
+    # The preamble stays for the titles; identical bills keep only their first section
+    changed = [pair for pair in pairs if pair[3] != UNCHANGED or pair[0] == PREAMBLE]
+    if not any(pair[3] != UNCHANGED for pair in changed):
+        changed = pairs[:1]
+    unchanged_sections = len(pairs) - len(changed)
+
+    units: List[Tuple[str, str, str]] = []
+    for label, section_a, section_b, _ in changed:
+        if len(section_a) + len(section_b) <= max_chars:
+            units.append((label, section_a, section_b))
+            continue
+        # A single section pair over budget: split both sides into aligned parts
+        parts_a = _split_oversized(section_a, max_chars // 2) if section_a else []
+        parts_b = _split_oversized(section_b, max_chars // 2) if section_b else []
+        for part in range(max(len(parts_a), len(parts_b))):
+            units.append((
+                f"{label} (part {part + 1})",
+                parts_a[part] if part < len(parts_a) else "",
+                parts_b[part] if part < len(parts_b) else ""
+            ))
+
+    chunks: List[Chunk] = []
+    parts_a: List[str] = []
+    parts_b: List[str] = []
+    labels: List[str] = []
+    size = 0
+    for label, section_a, section_b in units:
+        unit_size = len(section_a) + len(section_b)
+        if labels and size + unit_size > max_chars:
+            chunks.append(Chunk(index=len(chunks), bill_a_text="".join(parts_a), bill_b_text="".join(parts_b), sections=labels, unchanged_sections=unchanged_sections))
+            parts_a, parts_b, labels, size = [], [], [], 0
+        parts_a.append(section_a)
+        parts_b.append(section_b)
+        labels.append(label)
+        size += unit_size
+    if labels:
+        chunks.append(Chunk(index=len(chunks), bill_a_text="".join(parts_a), bill_b_text="".join(parts_b), sections=labels, unchanged_sections=unchanged_sections))
+    return chunks
+
+
+def _merge_text(values: List[str], max_chars: int = MERGED_TEXT_MAX_CHARS) -> str:
+    """
+    Combine the chunks' versions of a free-text field, each sentence once.
+
+    When the distinct sentences fit in `max_chars` they are joined in order.
+    Otherwise each value contributes only its lead sentence, and those are
+    sampled evenly across the chunks, so the end of a long bill is covered
+    as well as its start.
+    """
+    seen = set()
+    distinct: List[List[str]] = []
+    for value in values:
+        if not isinstance(value, str) or not value.strip():
+            continue
+        sentences = []
+        for sentence in _SENTENCE_BREAK.split(value.strip()):
+            if sentence.lower() not in seen:
+                seen.add(sentence.lower())
+                sentences.append(sentence)
+        if sentences:
+            distinct.append(sentences)
+    text = " ".join(sentence for sentences in distinct for sentence in sentences)
+    if len(text) <= max_chars:
+        return text
+
+    leads = [sentences[0] for sentences in distinct]
+    average = sum(len(lead) + 1 for lead in leads) / len(leads)
+    count = max(1, min(len(leads), int(max_chars // average)))
+    sampled = [leads[index * len(leads) // count] for index in range(count)]
+    while len(sampled) > 1 and len(" ".join(sampled)) > max_chars:
+        sampled.pop()
+    return " ".join(sampled)
+
+
+def merge_analyses(partials: List[dict]) -> dict:
+    """
+    Merge per-chunk analyses into one analysis result.
+
+    Titles and subject come from the first chunk that provides them, key
+    changes and assumptions are concatenated without duplicates, stakeholders
+    are merged by name (conflicting effects become "mixed"), and free-text
+    assessments, forecasts and descriptions are combined in document order,
+    deduplicated by sentence and capped at MERGED_TEXT_MAX_CHARS.
+
+    Args:
+        partials: Parsed analysis JSON of each chunk, in chunk order
+
+    Returns:
+        dict: Analysis in the same shape as a single-call result
+    """
+    if len(partials) == 1:
+        return partials[0]
+
+    summaries = [partial.get("executive_summary") or {} for partial in partials]
+
+    def first(field_name: str) -> str:
+        return next((summary[field_name] for summary in summaries if summary.get(field_name)), "")
+
+    key_changes = []
+    seen_changes = set()
+    for summary in summaries:
+        for change in summary.get("key_changes") or []:
+            identity = (str(change.get("topic", "")).lower(), str(change.get("description", "")).lower())
+            if identity not in seen_changes:
+                seen_changes.add(identity)
+                key_changes.append(change)
+
+    stakeholders: Dict[str, dict] = {}
+    for partial in partials:
+        for stakeholder in partial.get("stakeholder_analysis") or []:
+            name = str(stakeholder.get("name", "")).strip().lower()
+            existing = stakeholders.get(name)
+            if existing is None:
+                stakeholders[name] = dict(stakeholder)
+                continue
+            if stakeholder.get("effect") and stakeholder.get("effect") != existing.get("effect"):
+                existing["effect"] = "mixed"
+            existing["description"] = _merge_text([existing.get("description", ""), stakeholder.get("description", "")])
+
+    forecasts = [partial.get("impact_forecast") or {} for partial in partials]
+    assumptions = []
+    for forecast in forecasts:
+        for assumption in forecast.get("assumptions") or []:
+            if assumption not in assumptions:
+                assumptions.append(assumption)
+    impact_forecast = {"assumptions": assumptions}
+    for horizon in FORECAST_HORIZONS:
+        impact_forecast[horizon] = {
+            dimension: _merge_text([(forecast.get(horizon) or {}).get(dimension, "") for forecast in forecasts])
+            for dimension in FORECAST_DIMENSIONS
+        }
+
+    return {
+        "executive_summary": {
+            "bill_a_title": first("bill_a_title"),
+            "bill_b_title": first("bill_b_title"),
+            "primary_subject": first("primary_subject"),
+            "key_changes": key_changes,
+            "overall_impact_assessment": _merge_text([summary.get("overall_impact_assessment", "") for summary in summaries]),
+        },
+        "stakeholder_analysis": list(stakeholders.values()),
+        "impact_forecast": impact_forecast,
+    }
+
+
+def summary_fields(analysis: dict) -> dict:
+    """The overall assessment and forecast texts of an analysis, in its own shape."""
+    forecast = analysis.get("impact_forecast") or {}
+    return {
+        "executive_summary": {
+            "overall_impact_assessment": (analysis.get("executive_summary") or {}).get("overall_impact_assessment", ""),
+        },
+        "impact_forecast": {
+            horizon: {dimension: (forecast.get(horizon) or {}).get(dimension, "") for dimension in FORECAST_DIMENSIONS}
+            for horizon in FORECAST_HORIZONS
+        },
+    }
+
+
+def apply_summary(analysis: dict, summary: dict) -> dict:
+    """
+    Replace the assessment and forecast texts of a merged analysis with their summary.
+
+    Fields the summary leaves out or empty keep their merged text.
+
+    Args:
+        analysis: Result of merge_analyses
+        summary: Parsed response to the summary prompt, shaped like summary_fields()
+
+    Returns:
+        dict: A copy of the analysis with the summarized texts
+    """
+    def text(value) -> Optional[str]:
+        return value.strip() if isinstance(value, str) and value.strip() else None
+
+    executive_summary = dict(analysis.get("executive_summary") or {})
+    assessment = text((summary.get("executive_summary") or {}).get("overall_impact_assessment"))
+    if assessment:
+        executive_summary["overall_impact_assessment"] = assessment
+
+    impact_forecast = dict(analysis.get("impact_forecast") or {})
+    summarized = summary.get("impact_forecast") or {}
+    for horizon in FORECAST_HORIZONS:
+        dimensions = dict(impact_forecast.get(horizon) or {})
+        for dimension in FORECAST_DIMENSIONS:
+            forecast = text((summarized.get(horizon) or {}).get(dimension))
+            if forecast:
+                dimensions[dimension] = forecast
+        impact_forecast[horizon] = dimensions
+
+    return {**analysis, "executive_summary": executive_summary, "impact_forecast": impact_forecast}
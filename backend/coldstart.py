@@ -0,0 +1,132 @@
+"""
+Cold-start accounting.
+
+On hosts that scale to zero (Render, Railway), the first request after an
+idle period waits for a new process: the interpreter starts, the app is
+imported, the lifespan hook runs, and only then is the port bound. This
+module records when each phase ended, so the logs and /health show where a
+cold start's time went.
+
+The slowest imports (openai, PyPDF2) are deferred until first use; once the
+server is ready, they are imported on a background thread so a later request
+does not pay for them either. With the preloading launcher they are imported
+once in the master process instead and shared with every worker.
+"""
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Deferred modules imported once the server is ready; read from WARM_IMPORTS
+# when warming, since this module is imported before .env is loaded
+DEFAULT_WARM_IMPORTS = "openai,PyPDF2"
+
+
+def process_started_at() -> Optional[float]:
+    """Wall-clock time the current process started, from /proc (None elsewhere)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesized command name; starttime is field 22 of the full line
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        age = uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+    return time.time() - max(age, 0.0)
+
+
+class StartupTimer:
+    """
+    Timestamps of the startup phases of this process.
+
+    Created when the application module starts importing; `mark()` records
+    the end of a phase ("imported", "ready", "first_response").
+    """
+
+    def __init__(self):
+        self.import_started = time.time()
+        self.import_pid = os.getpid()
+        self.marks: Dict[str, float] = {}
+        self.warm_imports: Dict[str, float] = {}
+        self._started_at = process_started_at()
+        self._started_pid = os.getpid()
+
+    @property
+    def started_at(self) -> float:
+        """Start of this process; a forked worker started when it was forked."""
+        if self._started_pid != os.getpid():
+            self._started_at = process_started_at()
+            self._started_pid = os.getpid()
+        return self._started_at or self.import_started
+
+    def mark(self, phase: str):
+        """Record that `phase` ended now; only the first call per phase counts."""
+        if phase in self.marks:
+            return
+        self.marks[phase] = time.time()
+        since = self.import_started if phase == "imported" else self.started_at
+        logger.info(f"Startup: {phase} after {self.marks[phase] - since:.3f}s")
+
+    def warm(self, modules: Optional[List[str]] = None, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Import deferred modules now rather than on a request.
+
+        Args:
+            modules: Module names, by default WARM_IMPORTS (comma-separated,
+                empty disables); those already imported are skipped
+            background: Import on a daemon thread instead of the caller's
+
+        Returns:
+            The thread, when one was started
+        """
+        if modules is None:
+            modules = [name.strip() for name in os.getenv("WARM_IMPORTS", DEFAULT_WARM_IMPORTS).split(",") if name.strip()]
+        pending = [name for name in modules if name not in sys.modules]
+        if not pending:
+            return None
+
+        def run():
+            for name in pending:
+                started = time.perf_counter()
+                try:
+                    importlib.import_module(name)
+                except ImportError as e:
+                    logger.warning(f"Could not warm import {name}: {e}")
+                    continue
+                self.warm_imports[name] = time.perf_counter() - started
+            logger.info("Warmed imports: " + ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.warm_imports.items()))
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="warm-imports", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        started_at = self.started_at
+
+        def seconds(start: float, phase: str) -> Optional[float]:
+            return round(self.marks[phase] - start, 3) if phase in self.marks else None
+
+        return {
+            "pid": os.getpid(),
+            # Imported by a parent process and inherited through fork()
+            "preloaded": self.import_pid != os.getpid(),
+            "process_started_at": round(started_at, 3),
+            "interpreter_seconds": round(self.import_started - started_at, 3) if self.import_pid == os.getpid() else None,
+            "import_seconds": seconds(self.import_started, "imported"),
+            "ready_seconds": seconds(started_at, "ready"),
+            "first_response_seconds": seconds(started_at, "first_response"),
+            "warm_imports_ms": {name: round(value * 1000, 1) for name, value in self.warm_imports.items()},
+        }
+
+
+# Created on first import, i.e. when the application module starts loading
+startup_timer = StartupTimer()
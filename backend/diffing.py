@@ -0,0 +1,392 @@
+"""
+Server-side structural diff of two bill texts.
+
+Sections are aligned first: every section is interned to an integer by its
+exact text, so identical sections pair up without their lines ever being
+compared. Lines are interned the same way and diffed with Myers' linear-space
+algorithm, but only inside the runs of sections that differ. The result is a
+list of unified-diff style hunks that can be served a page at a time.
+"""
+import bisect
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from chunking import split_sections
+
+# Unchanged lines shown around each change
+DIFF_CONTEXT_LINES = int(os.getenv("DIFF_CONTEXT_LINES", "3"))
+
+# Wall-clock budget for one diff; regions still open afterwards are reported
+# as whole-block replacements instead of a minimal edit script
+DIFF_TIMEOUT_SECONDS = float(os.getenv("DIFF_TIMEOUT_SECONDS", "1.0"))
+
+# Changed lines (removed plus added) in one hunk; longer replacements, such as
+# the regions left unrefined at the timeout, are split across several hunks
+DIFF_MAX_HUNK_LINES = int(os.getenv("DIFF_MAX_HUNK_LINES", "200"))
+
+# (a_lo, a_hi, b_lo, b_hi): a[a_lo:a_hi] was replaced by b[b_lo:b_hi]
+Region = Tuple[int, int, int, int]
+
+
+@dataclass
+class DiffHunk:
+    """A run of changes plus surrounding context, in unified-diff form."""
+    a_start: int  # 0-based first line in bill A
+    a_count: int
+    b_start: int  # 0-based first line in bill B
+    b_count: int
+    section: Optional[str]
+    lines: List[str] = field(default_factory=list)  # each prefixed with " ", "-" or "+"
+
+    def to_dict(self) -> dict:
+        return {
+            "a_start": self.a_start + 1,
+            "a_lines": self.a_count,
+            "b_start": self.b_start + 1,
+            "b_lines": self.b_count,
+            "section": self.section,
+            "lines": self.lines,
+        }
+
+
+@dataclass
+class DiffResult:
+    """All hunks of a diff and summary counts."""
+    hunks: List[DiffHunk]
+    a_lines: int
+    b_lines: int
+    added: int
+    removed: int
+    sections: int
+    sections_changed: int
+    elapsed_seconds: float
+    timed_out: bool
+
+    def stats(self) -> dict:
+        return {
+            "bill_a_lines": self.a_lines,
+            "bill_b_lines": self.b_lines,
+            "lines_added": self.added,
+            "lines_removed": self.removed,
+            "sections": self.sections,
+            "sections_changed": self.sections_changed,
+            "diff_ms": round(self.elapsed_seconds * 1000, 1),
+            "timed_out": self.timed_out,
+        }
+
+    def page(self, offset: int, limit: int) -> dict:
+        """Serialize hunks [offset, offset + limit) with pagination fields."""
+        offset = max(0, offset)
+        end = offset + max(0, limit)
+        return {
+            "stats": self.stats(),
+            "total_hunks": len(self.hunks),
+            "offset": offset,
+            "limit": limit,
+            "next_offset": end if end < len(self.hunks) else None,
+            "hunks": [hunk.to_dict() for hunk in self.hunks[offset:end]],
+        }
+
+
+def _intern(items: List[str], table: Dict[str, int]) -> List[int]:
+    """Map each string to a small integer shared across both documents."""
+    return [table.setdefault(item, len(table)) for item in items]
+
+
+def myers_diff(a: List[int], b: List[int], deadline: Optional[float] = None) -> List[Region]:
+    """
+    Diff two sequences with Myers' O(ND) algorithm in linear space.
+
+    Args:
+        a: Original sequence (interned integers compare fastest)
+        b: New sequence
+        deadline: time.perf_counter() value after which remaining regions
+            are returned unrefined
+
+    Returns:
+        Sorted, non-overlapping change regions (a_lo, a_hi, b_lo, b_hi)
+    """
+    regions: List[Region] = []
+    _diff_range(a, b, 0, len(a), 0, len(b), deadline, regions)
+    return _coalesce(regions)
+
+
+def _diff_range(a, b, a_lo: int, a_hi: int, b_lo: int, b_hi: int, deadline: Optional[float], out: List[Region]):
+    # Common prefix and suffix never need the full search
+    while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+        a_lo += 1
+        b_lo += 1
+    while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+        a_hi -= 1
+        b_hi -= 1
+    if a_lo == a_hi or b_lo == b_hi:
+        if a_lo != a_hi or b_lo != b_hi:
+            out.append((a_lo, a_hi, b_lo, b_hi))
+        return
+
+    split = _middle_snake(a, b, a_lo, a_hi, b_lo, b_hi, deadline)
+    if split is None:
+        out.append((a_lo, a_hi, b_lo, b_hi))
+        return
+    x, y = split
+    _diff_range(a, b, a_lo, x, b_lo, y, deadline, out)
+    _diff_range(a, b, x, a_hi, y, b_hi, deadline, out)
+
+
+def _middle_snake(a, b, a_lo: int, a_hi: int, b_lo: int, b_hi: int, deadline: Optional[float]) -> Optional[Tuple[int, int]]:
+    """
+    Find a point on an optimal edit path by searching from both ends at once.
+
+    Returns the absolute (x, y) split point, or None when the sequences share
+    nothing or the deadline passed.
+    """
+    n = a_hi - a_lo
+    m = b_hi - b_lo
+    max_d = (n + m + 1) // 2
+    v_offset = max_d
+    v_length = 2 * max_d + 2
+    v1 = [-1] * v_length
+    v2 = [-1] * v_length
+    v1[v_offset + 1] = 0
+    v2[v_offset + 1] = 0
+    delta = n - m
+    front = delta % 2 != 0
+    k1_start = k1_end = k2_start = k2_end = 0
+
+    for d in range(max_d):
+        if deadline is not None and time.perf_counter() > deadline:
+            return None
+
+        # Forward search
+        for k1 in range(-d + k1_start, d + 1 - k1_end, 2):
+            k1_offset = v_offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[a_lo + x1] == b[b_lo + y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > n:
+                k1_end += 2
+            elif y1 > m:
+                k1_start += 2
+            elif front:
+                k2_offset = v_offset + delta - k1
+                if 0 <= k2_offset < v_length and v2[k2_offset] != -1 and x1 >= n - v2[k2_offset]:
+                    return a_lo + x1, b_lo + y1
+
+        # Reverse search
+        for k2 in range(-d + k2_start, d + 1 - k2_end, 2):
+            k2_offset = v_offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[a_hi - 1 - x2] == b[b_hi - 1 - y2]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2_end += 2
+            elif y2 > m:
+                k2_start += 2
+            elif not front:
+                k1_offset = v_offset + delta - k2
+                if 0 <= k1_offset < v_length and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    y1 = v_offset + x1 - k1_offset
+                    if x1 >= n - x2:
+                        return a_lo + x1, b_lo + y1
+    return None
+
+
+def _coalesce(regions: List[Region]) -> List[Region]:
+    """Merge touching regions produced by neighbouring recursion steps."""
+    merged: List[Region] = []
+    for region in sorted(regions):
+        if merged and merged[-1][1] == region[0] and merged[-1][3] == region[2]:
+            last = merged[-1]
+            merged[-1] = (last[0], region[1], last[2], region[3])
+        else:
+            merged.append(region)
+    return merged
+
+
+def _split_lines(text: str) -> Tuple[List[str], List[int], List[str]]:
+    """
+    Split a document into lines and record where each section starts.
+
+    Returns:
+        (lines, section line starts, section labels); the section texts
+        are the line runs between consecutive starts
+    """
+    sections = split_sections(text)
+    starts = [section.start for section in sections]
+    labels = [f"SEC. {section.number}" if section.number else None for section in sections]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+        labels.insert(0, None)
+
+    lines: List[str] = []
+    line_starts: List[int] = []
+    for index, start in enumerate(starts):
+        end = starts[index + 1] if index + 1 < len(starts) else len(text)
+        line_starts.append(len(lines))
+        lines.extend(text[start:end].splitlines())
+    return lines, line_starts, labels
+
+
+def _split_region(region: Region, max_lines: int) -> List[Region]:
+    """Cut a replacement into consecutive pieces of at most `max_lines` (at least 2) changed lines each."""
+    a_lo, a_hi, b_lo, b_hi = region
+    max_lines = max(2, max_lines)
+    pieces = -(-(a_hi - a_lo + b_hi - b_lo) // max_lines)
+    if pieces <= 1:
+        return [region]
+    # Each piece takes an even share of both sides, rounded up
+    while -(-(a_hi - a_lo) // pieces) - (-(b_hi - b_lo) // pieces) > max_lines:
+        pieces += 1
+    a_cuts = [a_lo + (a_hi - a_lo) * index // pieces for index in range(pieces + 1)]
+    b_cuts = [b_lo + (b_hi - b_lo) * index // pieces for index in range(pieces + 1)]
+    return [(a_cuts[index], a_cuts[index + 1], b_cuts[index], b_cuts[index + 1]) for index in range(pieces)]
+
+
+def _section_bounds(line_starts: List[int], total: int, lo: int, hi: int) -> Tuple[int, int]:
+    """Line range covered by sections [lo, hi); an empty run maps to its insertion point."""
+    start = line_starts[lo] if lo < len(line_starts) else total
+    end = line_starts[hi] if hi < len(line_starts) else total
+    return start, end
+
+
+def diff_texts(
+    bill_a_text: str,
+    bill_b_text: str,
+    context: int = DIFF_CONTEXT_LINES,
+    timeout: float = DIFF_TIMEOUT_SECONDS,
+    max_hunk_lines: int = DIFF_MAX_HUNK_LINES
+) -> DiffResult:
+    """
+    Diff two documents section by section, then line by line.
+
+    Args:
+        bill_a_text: Text of the original bill
+        bill_b_text: Text of the revised bill
+        context: Unchanged lines kept around each change
+        timeout: Seconds before remaining regions are reported unrefined
+        max_hunk_lines: Changed lines per hunk; 0 keeps every region in one hunk
+
+    Returns:
+        DiffResult: Hunks in document order plus summary counts
+    """
+    started = time.perf_counter()
+    deadline = started + timeout if timeout > 0 else None
+    context = max(0, context)
+
+    lines_a, starts_a, _ = _split_lines(bill_a_text)
+    lines_b, starts_b, labels_b = _split_lines(bill_b_text)
+
+    # Align whole sections first
+    section_table: Dict[str, int] = {}
+    sections_a = _intern(["\n".join(lines_a[start:end]) for start, end in zip(starts_a, starts_a[1:] + [len(lines_a)])], section_table)
+    sections_b = _intern(["\n".join(lines_b[start:end]) for start, end in zip(starts_b, starts_b[1:] + [len(lines_b)])], section_table)
+    section_regions = myers_diff(sections_a, sections_b, deadline)
+
+    # Then diff lines inside the sections that differ
+    line_table: Dict[str, int] = {}
+    ids_a = _intern(lines_a, line_table)
+    ids_b = _intern(lines_b, line_table)
+    regions: List[Region] = []
+    for sa_lo, sa_hi, sb_lo, sb_hi in section_regions:
+        a_lo, a_hi = _section_bounds(starts_a, len(lines_a), sa_lo, sa_hi)
+        b_lo, b_hi = _section_bounds(starts_b, len(lines_b), sb_lo, sb_hi)
+        _diff_range(ids_a, ids_b, a_lo, a_hi, b_lo, b_hi, deadline, regions)
+    regions = _coalesce(regions)
+
+    hunks = _build_hunks(regions, lines_a, lines_b, starts_b, labels_b, context, max_hunk_lines)
+    elapsed = time.perf_counter() - started
+    return DiffResult(
+        hunks=hunks,
+        a_lines=len(lines_a),
+        b_lines=len(lines_b),
+        added=sum(b_hi - b_lo for _, _, b_lo, b_hi in regions),
+        removed=sum(a_hi - a_lo for a_lo, a_hi, _, _ in regions),
+        sections=max(len(sections_a), len(sections_b)),
+        sections_changed=sum(max(sa_hi - sa_lo, sb_hi - sb_lo) for sa_lo, sa_hi, sb_lo, sb_hi in section_regions),
+        elapsed_seconds=elapsed,
+        timed_out=deadline is not None and time.perf_counter() > deadline,
+    )
+
+
+def _build_hunks(
+    regions: List[Region],
+    lines_a: List[str],
+    lines_b: List[str],
+    starts_b: List[int],
+    labels_b: List[Optional[str]],
+    context: int,
+    max_lines: int = 0
+) -> List[DiffHunk]:
+    """
+    Group change regions whose context overlaps into unified-diff hunks.
+
+    With `max_lines`, a hunk holds at most that many changed lines: long
+    regions are split across consecutive hunks.
+    """
+    if max_lines > 0:
+        max_lines = max(2, max_lines)
+        regions = [piece for region in regions for piece in _split_region(region, max_lines)]
+
+    def changed(region: Region) -> int:
+        return region[1] - region[0] + region[3] - region[2]
+
+    groups: List[List[Region]] = []
+    group_lines = 0
+    for region in regions:
+        if (
+            groups
+            and region[0] - groups[-1][-1][1] <= 2 * context
+            and (max_lines <= 0 or group_lines + changed(region) <= max_lines)
+        ):
+            groups[-1].append(region)
+            group_lines += changed(region)
+        else:
+            groups.append([region])
+            group_lines = changed(region)
+
+    hunks = []
+    for group_index, group in enumerate(groups):
+        first, last = group[0], group[-1]
+        # Hunks split by max_lines may sit closer than 2 * context: the
+        # unchanged lines between them are shared out, so no line is in two hunks
+        a_floor = (groups[group_index - 1][-1][1] + first[0]) // 2 if group_index else 0
+        a_ceiling = (last[1] + groups[group_index + 1][0][0]) // 2 if group_index + 1 < len(groups) else len(lines_a)
+        a_start = max(a_floor, first[0] - context)
+        b_start = first[2] - (first[0] - a_start)
+        a_end = min(a_ceiling, last[1] + context)
+        b_end = last[3] + (a_end - last[1])
+
+        lines = [" " + line for line in lines_a[a_start:first[0]]]
+        for index, (a_lo, a_hi, b_lo, b_hi) in enumerate(group):
+            if index:
+                previous_a_hi = group[index - 1][1]
+                lines.extend(" " + line for line in lines_a[previous_a_hi:a_lo])
+            lines.extend("-" + line for line in lines_a[a_lo:a_hi])
+            lines.extend("+" + line for line in lines_b[b_lo:b_hi])
+        lines.extend(" " + line for line in lines_a[last[1]:a_end])
+
+        section_index = bisect.bisect_right(starts_b, first[2]) - 1
+        hunks.append(DiffHunk(
+            a_start=a_start,
+            a_count=a_end - a_start,
+            b_start=b_start,
+            b_count=b_end - b_start,
+            section=labels_b[section_index] if section_index >= 0 else None,
+            lines=lines,
+        ))
+    return hunks
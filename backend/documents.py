@@ -0,0 +1,253 @@
+"""
+Registry of uploaded documents, addressed by content.
+
+A PDF registered through POST /api/documents is extracted and normalized
+once; its pages are stored one row each in SQLite, so later comparisons can
+refer to it by ID instead of re-uploading it, and single pages can be read
+without loading the whole document. The original PDF is kept alongside.
+
+The ID is derived from the SHA-256 of the PDF bytes, so registering the same
+file twice returns the same document.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+from cache import CACHE_DIR
+from extraction import ExtractionResult, PageText, join_pages
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTS_DB = os.getenv("DOCUMENTS_DB", os.path.join(CACHE_DIR, "documents.sqlite3"))
+
+# Hex digits of the SHA-256 used as the document ID
+DOCUMENT_ID_LENGTH = 32
+
+
+def document_id(sha256: str) -> str:
+    """Document ID for PDF content with the given SHA-256 hex digest."""
+    return sha256[:DOCUMENT_ID_LENGTH]
+
+
+@dataclass
+class DocumentInfo:
+    """Metadata of a registered document."""
+    id: str
+    sha256: str
+    filename: str
+    page_count: int
+    chars: int
+    tokens: int
+    normalized: bool
+    normalization: Optional[dict]
+    created_at: float
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "sha256": self.sha256,
+            "filename": self.filename,
+            "pageCount": self.page_count,
+            "chars": self.chars,
+            "tokens": self.tokens,
+            "normalized": self.normalized,
+            "normalization": self.normalization,
+            "createdAt": self.created_at,
+        }
+
+
+@dataclass
+class DocumentSource:
+    """One side of a comparison: an upload or a registered document."""
+    name: str
+    sha256: str
+    load: Callable[[], Awaitable[ExtractionResult]]
+    close: Optional[Callable[[], Awaitable[None]]] = None  # Releases an upload the source owns
+
+
+class DocumentStore:
+    """
+    SQLite store of registered documents and their page texts.
+
+    Args:
+        db_path: Path to the SQLite file
+    """
+
+    def __init__(self, db_path: str = DOCUMENTS_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid = None
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id TEXT PRIMARY KEY, sha256 TEXT NOT NULL, filename TEXT NOT NULL, "
+            "page_count INTEGER NOT NULL, chars INTEGER NOT NULL, tokens INTEGER NOT NULL, "
+            "normalized INTEGER NOT NULL, normalization TEXT, created_at REAL NOT NULL)"
+        )
+        # One row per page, so a page is read without touching the others
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS document_pages ("
+            "document_id TEXT NOT NULL, page_number INTEGER NOT NULL, "
+            "start INTEGER NOT NULL, text BLOB NOT NULL, "
+            "PRIMARY KEY (document_id, page_number)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS document_files (id TEXT PRIMARY KEY, pdf BLOB NOT NULL)"
+        )
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # Reopened in a forked process, like TwoTierCache._db
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def get(self, doc_id: str) -> Optional[DocumentInfo]:
+        """Metadata of a document, or None if it is not registered."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, sha256, filename, page_count, chars, tokens, normalized, normalization, created_at "
+                "FROM documents WHERE id = ?", (doc_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return DocumentInfo(
+            id=row[0],
+            sha256=row[1],
+            filename=row[2],
+            page_count=row[3],
+            chars=row[4],
+            tokens=row[5],
+            normalized=bool(row[6]),
+            normalization=json.loads(row[7]) if row[7] else None,
+            created_at=row[8],
+        )
+
+    def put(self, sha256: str, filename: str, pdf, result: ExtractionResult, tokens: int, normalized: bool) -> DocumentInfo:
+        """
+        Register an extracted document; an existing registration is kept.
+
+        Args:
+            sha256: SHA-256 hex digest of the PDF bytes
+            filename: Name of the uploaded file
+            pdf: The PDF bytes (or any buffer)
+            result: Extracted (and possibly normalized) pages
+            tokens: Estimated token count of the document text
+            normalized: Whether `result` holds normalized text
+
+        Returns:
+            DocumentInfo: The stored metadata
+        """
+        doc_id = document_id(sha256)
+        created_at = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                inserted = self._db.execute(
+                    "INSERT OR IGNORE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        doc_id, sha256, filename, result.page_count, len(result.text), tokens,
+                        int(normalized), json.dumps(result.normalization) if result.normalization else None, created_at
+                    )
+                ).rowcount
+                if inserted:
+                    self._db.executemany(
+                        "INSERT INTO document_pages VALUES (?, ?, ?, ?)",
+                        ((doc_id, page.page_number, page.start, zlib.compress(page.text.encode("utf-8"))) for page in result.pages)
+                    )
+                    self._db.execute("INSERT INTO document_files VALUES (?, ?)", (doc_id, bytes(pdf)))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if inserted:
+            logger.info(f"Registered document {doc_id} ({filename}, {result.page_count} pages)")
+        return self.get(doc_id)
+
+    def page(self, doc_id: str, page_number: int) -> Optional[str]:
+        """Text of one page (1-based), or None if the document or page does not exist."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text FROM document_pages WHERE document_id = ? AND page_number = ?", (doc_id, page_number)
+            ).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def _page_rows(self, query: str, params: tuple) -> List[PageText]:
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        pages = []
+        for number, start, blob in rows:
+            text = zlib.decompress(blob).decode("utf-8")
+            pages.append(PageText(page_number=number, text=text, start=start, end=start + len(text)))
+        return pages
+
+    def pages_between(self, doc_id: str, first: int, last: int) -> List[PageText]:
+        """Pages `first` to `last` (1-based, inclusive) that exist, in order."""
+        return self._page_rows(
+            "SELECT page_number, start, text FROM document_pages "
+            "WHERE document_id = ? AND page_number BETWEEN ? AND ? ORDER BY page_number",
+            (doc_id, first, last)
+        )
+
+    def pages_covering(self, doc_id: str, start: int, end: int) -> List[PageText]:
+        """The consecutive pages that hold characters `start` to `end` of the joined text."""
+        return self._page_rows(
+            "SELECT page_number, start, text FROM document_pages "
+            "WHERE document_id = ? AND start < ? AND start >= COALESCE("
+            "(SELECT MAX(start) FROM document_pages WHERE document_id = ? AND start <= ?), 0) "
+            "ORDER BY page_number",
+            (doc_id, max(end, start + 1), doc_id, start)
+        )
+
+    def load(self, doc_id: str) -> Optional[ExtractionResult]:
+        """All pages of a document as an ExtractionResult, or None if it is not registered."""
+        info = self.get(doc_id)
+        if info is None:
+            return None
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT text FROM document_pages WHERE document_id = ? ORDER BY page_number", (doc_id,)
+            ).fetchall()
+        result = join_pages([zlib.decompress(row[0]).decode("utf-8") for row in rows], elapsed_seconds=0.0, workers=0)
+        result.normalization = info.normalization
+        return result
+
+    def pdf(self, doc_id: str) -> Optional[bytes]:
+        """The original PDF bytes, or None if the document is not registered."""
+        with self._lock:
+            row = self._db.execute("SELECT pdf FROM document_files WHERE id = ?", (doc_id,)).fetchone()
+        return row[0] if row else None
+
+    def delete(self, doc_id: str) -> bool:
+        """Remove a document and its pages; returns False if it was not registered."""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                removed = self._db.execute("DELETE FROM documents WHERE id = ?", (doc_id,)).rowcount
+                self._db.execute("DELETE FROM document_pages WHERE document_id = ?", (doc_id,))
+                self._db.execute("DELETE FROM document_files WHERE id = ?", (doc_id,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return bool(removed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            documents, pages = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(page_count), 0) FROM documents"
+            ).fetchone()
+        return {"documents": documents, "pages": pages}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,496 @@
+"""
+Pluggable PDF text extraction engines and per-document engine selection.
+
+An engine opens a PDF and extracts the text of one page at a time, so the
+same engine runs in-thread or split into page ranges across the extraction
+process pool. PyPDF2 is the baseline and always available. pypdf, pdfium
+(pypdfium2) and pdfminer.six are registered too, and are used when they are
+installed.
+
+Engines differ in speed and in how well they cope with unusual fonts and
+encodings. EngineSelector tries the candidates fastest first, judged by the
+seconds per page each has actually taken so far, and keeps the first engine
+whose first pages pass the quality checks: enough characters per page, few
+garbage glyphs (replacement characters, private-use code points, control
+characters, pdfminer's "(cid:n)" placeholders) and enough whitespace that
+words were not run together. The accepted engine's stream then carries on
+from those pages. The chosen engine is remembered per content
+hash, so the same PDF is always extracted the same way, and without trials.
+"""
+import importlib.util
+import io
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+from metrics import EXTRACTION_ENGINE_RUNS
+
+if TYPE_CHECKING:
+    from cache import TwoTierCache
+    from extraction import PageStream, PageText
+
+logger = logging.getLogger(__name__)
+
+# Engine used when no selection is made, and the last resort of a selection
+BASELINE_ENGINE = "pypdf2"
+
+# Candidate engines, comma-separated; "auto" means every installed engine
+PDF_ENGINES = os.getenv("PDF_ENGINES", "auto")
+
+# Quality an engine's text needs to be accepted
+PDF_MIN_CHARS_PER_PAGE = float(os.getenv("PDF_MIN_CHARS_PER_PAGE", "200"))
+PDF_MAX_GARBAGE_RATIO = float(os.getenv("PDF_MAX_GARBAGE_RATIO", "0.01"))
+PDF_MIN_WHITESPACE_RATIO = float(os.getenv("PDF_MIN_WHITESPACE_RATIO", "0.08"))
+
+# Pages whose text decides whether an engine is accepted
+PDF_QUALITY_SAMPLE_PAGES = int(os.getenv("PDF_QUALITY_SAMPLE_PAGES", "8"))
+
+# Weight of the newest document in an engine's running seconds-per-page estimate
+SPEED_SMOOTHING = 0.2
+
+_GARBAGE = re.compile(r"\(cid:\d+\)|[\ufffd\ue000-\uf8ff\x00-\x08\x0b\x0e-\x1f\x7f]")
+_WHITESPACE = re.compile(r"\s")
+
+
+class ExtractionEngine:
+    """
+    A PDF text extractor; subclasses implement open() and extract_page().
+
+    `seconds_per_page` is the speed assumed until the engine has been measured.
+    """
+    name = ""
+    module = ""  # Module that must be importable for the engine to be available
+    seconds_per_page = 0.05
+
+    def available(self) -> bool:
+        return importlib.util.find_spec(self.module) is not None
+
+    def open(self, stream: BinaryIO):
+        """Open a PDF; returns the document handle passed to the other methods."""
+        raise NotImplementedError
+
+    def page_count(self, document) -> int:
+        raise NotImplementedError
+
+    def extract_page(self, document, index: int) -> str:
+        """Text of the page at a 0-based index."""
+        raise NotImplementedError
+
+    def close(self, document):
+        pass
+
+
+class PyPDF2Engine(ExtractionEngine):
+    name = "pypdf2"
+    module = "PyPDF2"
+    seconds_per_page = 0.004
+
+    def open(self, stream: BinaryIO):
+        # Imported on first use so it does not add to the server's cold start
+        import PyPDF2
+
+        return PyPDF2.PdfReader(stream)
+
+    def page_count(self, document) -> int:
+        return len(document.pages)
+
+    def extract_page(self, document, index: int) -> str:
+        return document.pages[index].extract_text()
+
+
+class PypdfEngine(PyPDF2Engine):
+    """pypdf, PyPDF2's maintained successor: the same API, slower but more careful with fonts."""
+    name = "pypdf"
+    module = "pypdf"
+    seconds_per_page = 0.008
+
+    def open(self, stream: BinaryIO):
+        # pypdf warns once per page about fonts it can only partly decode
+        logging.getLogger("pypdf").setLevel(logging.ERROR)
+
+        import pypdf
+
+        return pypdf.PdfReader(stream)
+
+
+class _ReadintoStream:
+    """A memory-mapped upload as the file object pypdfium2 reads from (it needs readinto())."""
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._stream.seek(offset, whence)
+        return self._stream.tell()
+
+    def tell(self) -> int:
+        return self._stream.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stream.read(size)
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        memoryview(buffer).cast("B")[:len(data)] = data
+        return len(data)
+
+
+class PdfiumEngine(ExtractionEngine):
+    """PDFium (Chrome's PDF library) through pypdfium2; much faster than the pure-Python engines."""
+    name = "pdfium"
+    module = "pypdfium2"
+    seconds_per_page = 0.0015
+
+    # PDFium is not thread-safe; the process pool's workers each have their own copy
+    _lock = threading.Lock()
+
+    def open(self, stream: BinaryIO):
+        import pypdfium2
+
+        if not hasattr(stream, "readinto"):
+            stream = _ReadintoStream(stream)
+        with self._lock:
+            return pypdfium2.PdfDocument(stream)
+
+    def page_count(self, document) -> int:
+        return len(document)
+
+    def extract_page(self, document, index: int) -> str:
+        with self._lock:
+            page = document[index]
+            try:
+                text_page = page.get_textpage()
+                try:
+                    text = text_page.get_text_range()
+                finally:
+                    text_page.close()
+            finally:
+                page.close()
+        return text.replace("\r\n", "\n")
+
+    def close(self, document):
+        with self._lock:
+            document.close()
+
+
+class PdfminerEngine(ExtractionEngine):
+    """pdfminer.six: slow, but lays out text from fonts and encodings the others get wrong."""
+    name = "pdfminer"
+    module = "pdfminer"
+    seconds_per_page = 0.035
+
+    def open(self, stream: BinaryIO):
+        # pdfminer warns once per page about fonts it can only partly decode
+        logging.getLogger("pdfminer").setLevel(logging.ERROR)
+
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfinterp import PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfparser import PDFParser
+
+        pages = list(PDFPage.create_pages(PDFDocument(PDFParser(stream))))
+        # Fonts are parsed once per document, not once per page
+        return pages, PDFResourceManager(caching=True)
+
+    def page_count(self, document) -> int:
+        return len(document[0])
+
+    def extract_page(self, document, index: int) -> str:
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter
+
+        pages, resources = document
+        output = io.StringIO()
+        device = TextConverter(resources, output, laparams=LAParams())
+        try:
+            PDFPageInterpreter(resources, device).process_page(pages[index])
+        finally:
+            device.close()
+        # Every page ends with a form feed
+        return output.getvalue().rstrip("\x0c")
+
+
+ENGINES: Dict[str, ExtractionEngine] = {}
+
+
+def register_engine(engine: ExtractionEngine) -> ExtractionEngine:
+    """Make an engine available by its name, replacing any engine of the same name."""
+    ENGINES[engine.name] = engine
+    return engine
+
+
+def get_engine(name: str) -> ExtractionEngine:
+    engine = ENGINES.get(name)
+    if engine is None:
+        raise ValueError(f"Unknown extraction engine: {name}")
+    return engine
+
+
+for _engine in (PyPDF2Engine(), PypdfEngine(), PdfiumEngine(), PdfminerEngine()):
+    register_engine(_engine)
+
+
+@dataclass
+class TextQuality:
+    """How usable an engine's text is; accumulated page by page."""
+    pages: int = 0
+    chars: int = 0
+    garbage_chars: int = 0
+    whitespace_chars: int = 0
+    empty_pages: int = 0
+
+    def add(self, text: str):
+        self.pages += 1
+        self.chars += len(text)
+        self.garbage_chars += sum(len(match) for match in _GARBAGE.findall(text))
+        self.whitespace_chars += len(_WHITESPACE.findall(text))
+        self.empty_pages += not text.strip()
+
+    @property
+    def chars_per_page(self) -> float:
+        return self.chars / self.pages if self.pages else 0.0
+
+    @property
+    def garbage_ratio(self) -> float:
+        """Garbage glyphs per visible character."""
+        visible = self.chars - self.whitespace_chars
+        return self.garbage_chars / visible if visible else 0.0
+
+    @property
+    def whitespace_ratio(self) -> float:
+        return self.whitespace_chars / self.chars if self.chars else 0.0
+
+    @property
+    def score(self) -> float:
+        """Usable characters per page; ranks results when none is acceptable."""
+        return (self.chars - self.garbage_chars) / self.pages if self.pages else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "chars_per_page": round(self.chars_per_page, 1),
+            "garbage_ratio": round(self.garbage_ratio, 5),
+            "whitespace_ratio": round(self.whitespace_ratio, 3),
+            "empty_pages": self.empty_pages,
+        }
+
+
+def assess_text(page_texts: List[str]) -> TextQuality:
+    """Measure the quality of extracted page texts."""
+    quality = TextQuality()
+    for text in page_texts:
+        quality.add(text)
+    return quality
+
+
+def configured_engines(names: str = PDF_ENGINES) -> List[str]:
+    """Installed engines among a comma-separated list ("auto" for all registered engines)."""
+    if names.strip().lower() == "auto":
+        candidates = list(ENGINES)
+    else:
+        candidates = [name.strip() for name in names.split(",") if name.strip()]
+        for name in candidates:
+            get_engine(name)
+    installed = [name for name in candidates if ENGINES[name].available()]
+    return installed or [BASELINE_ENGINE]
+
+
+class EngineSelector:
+    """
+    Chooses the fastest engine that produces acceptable text for each document.
+
+    The decision is made on the first `sample_pages` pages, so the chosen
+    engine's stream continues from there instead of starting over. When no
+    engine's sample is acceptable, the best-scoring stream is kept open and
+    continued the same way.
+
+    Args:
+        choices: Optional cache of the engine chosen per content hash
+        engines: Candidate engine names; by default PDF_ENGINES
+        min_chars_per_page: Less text than this per page is rejected
+        max_garbage_ratio: More garbage glyphs per visible character is rejected
+        min_whitespace_ratio: Less whitespace per character (run-together words) is rejected
+        sample_pages: Pages judged before an engine is accepted
+    """
+
+    def __init__(
+        self,
+        choices: Optional["TwoTierCache"] = None,
+        engines: Optional[List[str]] = None,
+        min_chars_per_page: float = PDF_MIN_CHARS_PER_PAGE,
+        max_garbage_ratio: float = PDF_MAX_GARBAGE_RATIO,
+        min_whitespace_ratio: float = PDF_MIN_WHITESPACE_RATIO,
+        sample_pages: int = PDF_QUALITY_SAMPLE_PAGES
+    ):
+        self.choices = choices
+        self.engines = engines or configured_engines()
+        self.min_chars_per_page = min_chars_per_page
+        self.max_garbage_ratio = max_garbage_ratio
+        self.min_whitespace_ratio = min_whitespace_ratio
+        self.sample_pages = max(1, sample_pages)
+
+        self._seconds_per_page = {name: get_engine(name).seconds_per_page for name in self.engines}
+        self._measured = set()
+        self._lock = threading.Lock()
+        self.runs = {name: {"accepted": 0, "rejected": 0, "failed": 0} for name in self.engines}
+        self.remembered = 0
+
+    def acceptable(self, quality: TextQuality) -> bool:
+        return (
+            quality.chars_per_page >= self.min_chars_per_page
+            and quality.garbage_ratio <= self.max_garbage_ratio
+            and quality.whitespace_ratio >= self.min_whitespace_ratio
+        )
+
+    def ranked(self) -> List[str]:
+        """Candidate engines, fastest first."""
+        with self._lock:
+            return sorted(self.engines, key=self._seconds_per_page.__getitem__)
+
+    def _record_speed(self, name: str, page_seconds: List[float]):
+        if not page_seconds:
+            return
+        # Time spent on the pages themselves, so pool and in-thread runs compare
+        seconds = sum(page_seconds) / len(page_seconds)
+        with self._lock:
+            if name in self._measured:
+                seconds = (1 - SPEED_SMOOTHING) * self._seconds_per_page[name] + SPEED_SMOOTHING * seconds
+            self._seconds_per_page[name] = seconds
+            self._measured.add(name)
+
+    def _count(self, name: str, outcome: str):
+        EXTRACTION_ENGINE_RUNS.inc(engine=name, outcome=outcome)
+        with self._lock:
+            self.runs[name][outcome] += 1
+
+    def _remembered(self, digest: Optional[str]) -> Optional[str]:
+        if self.choices is None or digest is None:
+            return None
+        cached = self.choices.get(digest)
+        if cached is None:
+            return None
+        name = json.loads(cached)["engine"]
+        # Engines may have been uninstalled or deconfigured since
+        return name if name in self.engines else None
+
+    def select(
+        self,
+        open_stream: Callable[[str], "PageStream"],
+        digest: Optional[str] = None,
+        fatal: Tuple[Type[BaseException], ...] = (),
+        on_page: Optional[Callable[[int, int], None]] = None
+    ) -> "PageStream":
+        """
+        Stream a document with the engine chosen for it.
+
+        Args:
+            open_stream: Starts streaming the document with the named engine
+            digest: Content hash of the document; its choice is looked up and remembered
+            fatal: Exceptions that end the selection instead of moving on to the next engine
+            on_page: Optional progress callback, called as on_page(page_number, page_count)
+                for the pages of the returned stream only, not for rejected samples
+
+        Returns:
+            PageStream: The accepted engine's pages (or, when no engine's
+            sample is acceptable, the best one's). Its `quality` is set, and
+            the choice remembered, once every page has been read.
+        """
+        remembered = self._remembered(digest)
+        if remembered is not None:
+            with self._lock:
+                self.remembered += 1
+            EXTRACTION_ENGINE_RUNS.inc(engine=remembered, outcome="remembered")
+            return self._measure(open_stream(remembered), [], digest, on_page)
+
+        # The best rejected stream, kept open with its sample in case no engine passes
+        best: Optional[Tuple[float, "PageStream", List["PageText"]]] = None
+        chosen: Optional[Tuple["PageStream", List["PageText"]]] = None
+        error: Optional[Exception] = None
+        try:
+            for name in self.ranked():
+                stream = None
+                try:
+                    stream = open_stream(name)
+                    sample = list(islice(stream, self.sample_pages))
+                except fatal:
+                    raise
+                except Exception as e:
+                    if stream is not None:
+                        stream.close()
+                    logger.warning(f"Extraction engine {name} failed: {e}")
+                    self._count(name, "failed")
+                    error = error or e
+                    continue
+                quality = assess_text([page.text for page in sample])
+                if self.acceptable(quality):
+                    self._count(name, "accepted")
+                    chosen = (stream, sample)
+                    break
+                self._record_speed(name, [page.seconds for page in sample])
+                self._count(name, "rejected")
+                logger.info(
+                    f"Extraction engine {name} rejected: {quality.chars_per_page:.0f} chars/page, "
+                    f"garbage {quality.garbage_ratio:.2%}, whitespace {quality.whitespace_ratio:.1%}"
+                )
+                if best is None or quality.score > best[0]:
+                    if best is not None:
+                        best[1].close()
+                    best = (quality.score, stream, sample)
+                else:
+                    stream.close()
+
+            if chosen is None:
+                if best is None:
+                    raise error
+                # No sample passed: the best stream continues after its sample
+                chosen = best[1:]
+        finally:
+            if best is not None and (chosen is None or chosen[0] is not best[1]):
+                best[1].close()
+        return self._measure(*chosen, digest, on_page)
+
+    def _measure(
+        self,
+        stream: "PageStream",
+        sample: List["PageText"],
+        digest: Optional[str],
+        on_page: Optional[Callable[[int, int], None]] = None
+    ) -> "PageStream":
+        """Add a stage that replays the sample, then reports and measures every page's quality and speed."""
+        name = stream.engine
+
+        def stage(pages: Iterator["PageText"]) -> Iterator["PageText"]:
+            quality = TextQuality()
+            page_seconds = []
+            for page in chain(sample, pages):
+                if on_page is not None:
+                    on_page(page.page_number, stream.page_count)
+                quality.add(page.text)
+                page_seconds.append(page.seconds)
+                yield page
+            self._record_speed(name, page_seconds)
+            stream.quality = {**quality.to_dict(), "acceptable": self.acceptable(quality)}
+            if self.choices is not None and digest is not None:
+                self.choices.set(digest, json.dumps({"engine": name, "acceptable": stream.quality["acceptable"]}))
+
+        return stream.pipe(stage)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "engines": [
+                    {
+                        "name": name,
+                        "seconds_per_page": round(self._seconds_per_page[name], 5),
+                        "measured": name in self._measured,
+                        **self.runs[name],
+                    }
+                    for name in sorted(self.engines, key=self._seconds_per_page.__getitem__)
+                ],
+                "remembered": self.remembered,
+            }
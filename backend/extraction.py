@@ -0,0 +1,384 @@
+"""
+Parallel PDF text extraction.
+
+Large documents are split into contiguous page ranges that are parsed in a
+process pool, so PyPDF2's pure-Python text extraction uses every core instead
+of one. Small documents are parsed in the calling thread, where the cost of
+shipping the bytes to another process would outweigh the gain.
+
+The parallel path places the PDF in a single shared-memory segment that every
+worker attaches to, rather than pickling a copy of the bytes for each range.
+
+Pages are extracted by a named engine from engines.py (PyPDF2 by default).
+
+Extraction is a stream: PageExtractor.iter_pages() returns a PageStream that
+parses pages as it is iterated and yields them in order, with their offsets
+in the joined text. Later stages (engine selection, normalization) wrap the
+stream lazily, so they work on page 1 while page 200 is still being parsed,
+and no stage holds more than a few pages. collect_pages() turns a stream
+into the ExtractionResult that the caches and pdf_to_text use.
+"""
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from engines import BASELINE_ENGINE, ExtractionEngine, get_engine
+
+logger = logging.getLogger(__name__)
+
+PAGE_SEPARATOR = "\n\n"
+
+PDF_PROCESS_WORKERS = int(os.getenv("PDF_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+
+# Most pages in one process pool task; smaller tasks deliver the first pages
+# sooner, but every task opens the PDF again
+PDF_STREAM_BATCH_PAGES = int(os.getenv("PDF_STREAM_BATCH_PAGES", "256"))
+
+
+@dataclass
+class PageText:
+    """Text of one page and its character span in the joined document text."""
+    page_number: int  # 1-based
+    text: str
+    start: int
+    end: int
+    seconds: float = 0.0  # Extraction time; 0 when the text was not extracted in this run
+
+
+@dataclass
+class ExtractionResult:
+    """Extracted document text with per-page offsets and timing."""
+    pages: List[PageText]
+    text: str
+    elapsed_seconds: float
+    workers: int
+    peak_memory_bytes: int = 0
+    normalization: Optional[dict] = None  # NormalizationStats.to_dict() when boilerplate was stripped
+    page_seconds: List[float] = field(default_factory=list)  # Per-page extraction time; empty when cached
+    engine: Optional[str] = None  # Name of the engine that extracted the text
+    quality: Optional[dict] = None  # TextQuality.to_dict() of the raw text, when an engine was selected
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.page_count / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+    def page_at(self, offset: int) -> Optional[int]:
+        """1-based page number containing the character offset, if any."""
+        lo, hi = 0, len(self.pages) - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            page = self.pages[mid]
+            if offset < page.start:
+                hi = mid - 1
+            elif offset >= page.end + len(PAGE_SEPARATOR):
+                lo = mid + 1
+            else:
+                return page.page_number
+        return None
+
+    def to_json(self) -> str:
+        """Serialize the page texts; offsets are rebuilt on load."""
+        page_texts = [page.text for page in self.pages]
+        extras = {
+            name: value
+            for name, value in (("normalization", self.normalization), ("engine", self.engine), ("quality", self.quality))
+            if value is not None
+        }
+        if not extras:
+            return json.dumps(page_texts)
+        return json.dumps({"pages": page_texts, **extras})
+
+    @classmethod
+    def from_json(cls, data: str) -> "ExtractionResult":
+        payload = json.loads(data)
+        if isinstance(payload, list):
+            return join_pages(payload, elapsed_seconds=0.0, workers=0)
+        result = join_pages(payload["pages"], elapsed_seconds=0.0, workers=0)
+        result.normalization = payload.get("normalization")
+        result.engine = payload.get("engine")
+        result.quality = payload.get("quality")
+        return result
+
+
+def offset_pages(page_texts: Iterable[Tuple[str, float]]) -> Iterator[PageText]:
+    """
+    Number (text, seconds) pairs in order, with each page's span in the joined text.
+
+    The joined text matches the historical pdf_to_text output: every page is
+    followed by a blank line.
+    """
+    offset = 0
+    for number, (page_text, seconds) in enumerate(page_texts, start=1):
+        end = offset + len(page_text)
+        yield PageText(page_number=number, text=page_text, start=offset, end=end, seconds=seconds)
+        offset = end + len(PAGE_SEPARATOR)
+
+
+def join_pages(page_texts: List[str], elapsed_seconds: float, workers: int) -> ExtractionResult:
+    """
+    Join page texts in order, recording each page's offsets.
+
+    The joined text is built with a single join rather than repeated concatenation.
+    """
+    pages = list(offset_pages((page_text, 0.0) for page_text in page_texts))
+    text = "".join(part for page_text in page_texts for part in (page_text, PAGE_SEPARATOR))
+    return ExtractionResult(pages=pages, text=text, elapsed_seconds=elapsed_seconds, workers=workers)
+
+
+class PageStream:
+    """
+    The pages of one document, produced lazily and in order.
+
+    A stream is iterated once. Stages are added with pipe(); stages that
+    learn something about the whole document (quality, normalization
+    statistics) record it here once the stream is exhausted.
+
+    Args:
+        pages: The page iterator
+        page_count: Number of pages the document has
+        workers: Processes extracting the pages
+        engine: Name of the extraction engine
+        started: perf_counter() time the extraction started
+    """
+
+    def __init__(
+        self,
+        pages: Iterator[PageText],
+        page_count: int,
+        workers: int = 1,
+        engine: Optional[str] = None,
+        started: Optional[float] = None
+    ):
+        self._pages = pages
+        self.page_count = page_count
+        self.workers = workers
+        self.engine = engine
+        self.started = time.perf_counter() if started is None else started
+        self.quality: Optional[dict] = None
+        self.normalization: Optional[dict] = None
+
+    def __iter__(self) -> Iterator[PageText]:
+        return self._pages
+
+    def pipe(self, stage: Callable[[Iterator[PageText]], Iterator[PageText]]) -> "PageStream":
+        """Transform the pages with a generator stage; returns this stream."""
+        self._pages = stage(self._pages)
+        return self
+
+    def close(self):
+        """Stop producing pages, releasing whatever the extraction holds."""
+        close = getattr(self._pages, "close", None)
+        if close is not None:
+            close()
+
+
+def collect_pages(stream: PageStream) -> ExtractionResult:
+    """Consume a page stream into an ExtractionResult."""
+    try:
+        pages = list(stream)
+    finally:
+        # On an error, stop the extraction rather than leave it suspended
+        stream.close()
+    text = "".join(part for page in pages for part in (page.text, PAGE_SEPARATOR))
+    return ExtractionResult(
+        pages=pages,
+        text=text,
+        elapsed_seconds=time.perf_counter() - stream.started,
+        workers=stream.workers,
+        normalization=stream.normalization,
+        page_seconds=[page.seconds for page in pages],
+        engine=stream.engine,
+        quality=stream.quality
+    )
+
+
+def _extract_page(engine: ExtractionEngine, document, index: int) -> Tuple[str, float]:
+    """Extract one page, returning its text and extraction time in seconds."""
+    started = time.perf_counter()
+    text = engine.extract_page(document, index)
+    return text, time.perf_counter() - started
+
+
+def _extract_page_range(engine: ExtractionEngine, shm_name: str, size: int, start: int, stop: int) -> List[Tuple[str, float]]:
+    """Worker entry point: extract pages [start, stop) of a PDF held in shared memory."""
+    segment = shared_memory.SharedMemory(name=shm_name)
+    try:
+        stream = io.BytesIO(segment.buf[:size])
+        document = engine.open(stream)
+        try:
+            return [_extract_page(engine, document, index) for index in range(start, stop)]
+        finally:
+            engine.close(document)
+    finally:
+        segment.close()
+
+
+def _page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """Split [0, page_count) into at most `parts` contiguous, near-equal ranges."""
+    parts = max(1, min(parts, page_count))
+    size, remainder = divmod(page_count, parts)
+    ranges = []
+    start = 0
+    for index in range(parts):
+        stop = start + size + (1 if index < remainder else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+class PageExtractor:
+    """
+    Extracts PDF pages, fanning large documents out across a process pool.
+
+    Args:
+        max_workers: Size of the process pool
+        parallel_min_pages: Documents with fewer pages are parsed in-thread
+    """
+
+    def __init__(self, max_workers: int = PDF_PROCESS_WORKERS, parallel_min_pages: int = PDF_PARALLEL_MIN_PAGES):
+        self.max_workers = max(1, max_workers)
+        self.parallel_min_pages = parallel_min_pages
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn avoids forking a process that already runs threads and an event loop
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def iter_pages(
+        self,
+        data,
+        stream: Optional[BinaryIO] = None,
+        on_page: Optional[Callable[[int, int], None]] = None,
+        engine: str = BASELINE_ENGINE
+    ) -> PageStream:
+        """
+        Stream the pages of a PDF, extracting them as the stream is iterated.
+
+        The document is opened (and its pages counted) right away. Large
+        documents are parsed in page ranges across the process pool, a few
+        ranges ahead of the consumer.
+
+        Args:
+            data: Raw PDF content as bytes or any buffer (memoryview, mmap)
+            stream: Optional seekable stream over the same content; avoids
+                wrapping `data` when the caller already has one
+            on_page: Optional callback invoked as on_page(page_number, page_count)
+                once each page's text is available
+            engine: Name of the extraction engine
+
+        Returns:
+            PageStream: The pages, in order, with offsets and extraction times
+        """
+        backend = get_engine(engine)
+        started = time.perf_counter()
+        if stream is None:
+            stream = io.BytesIO(data)
+        stream.seek(0)
+        document = backend.open(stream)
+        try:
+            page_count = backend.page_count(document)
+        except Exception:
+            backend.close(document)
+            raise
+
+        if page_count < self.parallel_min_pages or self.max_workers == 1:
+            texts = self._iter_inline(backend, document, page_count)
+            workers = 1
+        else:
+            backend.close(document)
+            texts = self._iter_parallel(data, page_count, backend)
+            workers = min(self.max_workers, page_count)
+
+        def pages() -> Iterator[PageText]:
+            for page in offset_pages(texts):
+                if on_page is not None:
+                    on_page(page.page_number, page_count)
+                yield page
+            elapsed = time.perf_counter() - started
+            logger.info(
+                f"Extracted {page_count} pages with {engine} in {elapsed * 1000:.0f}ms "
+                f"({page_count / elapsed if elapsed > 0 else 0.0:.1f} pages/s, {workers} worker(s))"
+            )
+
+        return PageStream(pages(), page_count=page_count, workers=workers, engine=engine, started=started)
+
+    def extract(
+        self,
+        data,
+        stream: Optional[BinaryIO] = None,
+        on_page: Optional[Callable[[int, int], None]] = None,
+        engine: str = BASELINE_ENGINE
+    ) -> ExtractionResult:
+        """
+        Extract every page of a PDF; collects iter_pages(), which takes the same arguments.
+
+        Returns:
+            ExtractionResult: Page texts, offsets and timing
+        """
+        return collect_pages(self.iter_pages(data, stream=stream, on_page=on_page, engine=engine))
+
+    @staticmethod
+    def _iter_inline(engine: ExtractionEngine, document, page_count: int) -> Iterator[Tuple[str, float]]:
+        try:
+            for index in range(page_count):
+                yield _extract_page(engine, document, index)
+        finally:
+            engine.close(document)
+
+    def _iter_parallel(self, data, page_count: int, engine: ExtractionEngine) -> Iterator[Tuple[str, float]]:
+        view = memoryview(data)
+        size = view.nbytes
+        segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            segment.buf[:size] = view
+        finally:
+            # Released before the first page is yielded: the caller's buffer must not stay exported
+            view.release()
+
+        ranges = iter(_page_ranges(page_count, max(self.max_workers, math.ceil(page_count / PDF_STREAM_BATCH_PAGES))))
+        pending = deque()
+        try:
+            pool = self._get_pool()
+
+            def submit():
+                page_range = next(ranges, None)
+                if page_range is not None:
+                    pending.append(pool.submit(_extract_page_range, engine, segment.name, size, *page_range))
+
+            # Two ranges per worker in flight: workers stay busy, and a slow consumer
+            # holds back the extraction instead of piling up finished pages
+            for _ in range(2 * self.max_workers):
+                submit()
+            while pending:
+                texts = pending.popleft().result()
+                submit()
+                yield from texts
+        finally:
+            for future in pending:
+                future.cancel()
+            segment.close()
+            segment.unlink()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions API, for load testing.
+
+Replays recorded completions (round-robin) with configurable latency and
+injected 429s, streamed or not, so the backend's scheduler, retries and
+connection pool can be exercised without spending quota:
+
+    python fake_openai.py --port 8100 --latency-ms 1500 --jitter-ms 500 --rate-limit-fraction 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=sk-fake python start.py
+
+Recorded responses are a JSON array whose items are either completion text
+or analysis objects (serialized as the completion text). Without a file,
+the benchmark's stub analysis is replayed.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmark import STUB_ANALYSIS
+
+
+class FakeOpenAI:
+    """
+    Replays completions with simulated latency and throttling.
+
+    Args:
+        responses: Completion texts, replayed in order
+        latency: Mean seconds before the response starts
+        jitter: Latency varies uniformly by up to this many seconds either way
+        rate_limit_fraction: Share of calls answered with a 429
+        retry_after: Retry-After seconds sent with a 429
+        chunk_chars: Characters per streamed delta
+        chunk_delay: Seconds between streamed deltas
+    """
+
+    def __init__(
+        self,
+        responses: List[str],
+        latency: float = 1.0,
+        jitter: float = 0.0,
+        rate_limit_fraction: float = 0.0,
+        retry_after: float = 1.0,
+        chunk_chars: int = 40,
+        chunk_delay: float = 0.0,
+    ):
+        self._responses = itertools.cycle(responses)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_fraction = rate_limit_fraction
+        self.retry_after = retry_after
+        self.chunk_chars = max(1, chunk_chars)
+        self.chunk_delay = chunk_delay
+        self.served = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _usage(self, prompt: str, content: str) -> dict:
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    async def complete(self, payload: dict):
+        if random.random() < self.rate_limit_fraction:
+            self.throttled += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": f"{self.retry_after:g}"},
+                content={"error": {
+                    "message": "Rate limit reached (injected by fake_openai)",
+                    "type": "requests",
+                    "code": "rate_limit_exceeded"
+                }}
+            )
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        finally:
+            self.in_flight -= 1
+        self.served += 1
+
+        content = next(self._responses)
+        prompt = "".join(str(message.get("content", "")) for message in payload.get("messages", []))
+        usage = self._usage(prompt, content)
+        model = payload.get("model", "fake")
+        completion_id = f"chatcmpl-fake{self.served}"
+
+        if not payload.get("stream"):
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": usage
+            })
+
+        include_usage = bool((payload.get("stream_options") or {}).get("include_usage"))
+
+        async def events():
+            base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+            for i in range(0, len(content), self.chunk_chars):
+                delta = {"content": content[i:i + self.chunk_chars]}
+                yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})}\n\n"
+                if self.chunk_delay:
+                    await asyncio.sleep(self.chunk_delay)
+            yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+            if include_usage:
+                yield f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    def stats(self) -> dict:
+        return {
+            "served": self.served,
+            "throttled": self.throttled,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+        }
+
+
+def load_responses(path: Optional[str]) -> List[str]:
+    if not path:
+        return [json.dumps(STUB_ANALYSIS)]
+    with open(path, encoding="utf-8") as f:
+        recorded = json.load(f)
+    if not isinstance(recorded, list) or not recorded:
+        raise ValueError(f"{path} must hold a non-empty JSON array")
+    return [item if isinstance(item, str) else json.dumps(item) for item in recorded]
+
+
+def create_app(fake: FakeOpenAI) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await fake.complete(await request.json())
+
+    @app.get("/stats")
+    async def stats():
+        return fake.stats()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--responses", help="JSON array of recorded completions to replay")
+    parser.add_argument("--latency-ms", type=float, default=1000.0, help="Mean time before a response starts")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform latency variation either way")
+    parser.add_argument("--rate-limit-fraction", type=float, default=0.0, help="Share of calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--chunk-chars", type=int, default=40, help="Characters per streamed delta")
+    parser.add_argument("--chunk-delay-ms", type=float, default=0.0, help="Delay between streamed deltas")
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(
+        responses=load_responses(args.responses),
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        rate_limit_fraction=args.rate_limit_fraction,
+        retry_after=args.retry_after,
+        chunk_chars=args.chunk_chars,
+        chunk_delay=args.chunk_delay_ms / 1000,
+    )
+    print(f"Fake OpenAI listening on http://{args.host}:{args.port}/v1")
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Checks the quotes in an analysis against the source documents.
+
+The model is asked for `original_quote`, `proposed_quote` and
+`evidence_quote` fields. Each one is looked up in the extracted text, marked
+verified or unverified, and cited by character span and page.
+
+A QuoteIndex is built once per document. It tokenizes the joined text into
+lowercased words and keeps an inverted index from each word to its
+positions. A quote is looked up through its rarest word, which usually has
+only a handful of occurrences, and is confirmed by comparing the word
+sequence there. Case, punctuation, quote styles and whitespace do not
+matter. When there is no exact match, the positions of the quote's rarer
+words vote for a likely start, and the densest cluster is scored against
+the quote with difflib. This tolerates the small paraphrases and elisions
+models make. Nothing scans the whole text per quote, so hundreds of quotes
+take milliseconds once the index exists.
+"""
+import hashlib
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+from extraction import ExtractionResult
+
+# Similarity (0-1) a fuzzy match needs to count as verified
+GROUNDING_MIN_SCORE = float(os.getenv("GROUNDING_MIN_SCORE", "0.8"))
+
+# Documents whose index is kept in memory
+GROUNDING_INDEX_CACHE_SIZE = int(os.getenv("GROUNDING_INDEX_CACHE_SIZE", "8"))
+
+# Quotes shorter than this (in words) must match exactly
+MIN_FUZZY_WORDS = 4
+
+# Rarest words of a quote whose positions vote for fuzzy candidates
+FUZZY_ANCHORS = 6
+
+# Words occurring more often than this do not vote
+MAX_ANCHOR_POSTINGS = 500
+
+# Candidate regions scored per fuzzy lookup
+FUZZY_CANDIDATES = 3
+
+# Words an elision ("...") may skip between two fragments of a quote
+MAX_ELIDED_WORDS = 2000
+
+_WORD = re.compile(r"\w+")
+_ELLIPSIS = re.compile(r"\.\s*\.\s*\.|…|\[\s*\.\.\.\s*\]")
+
+# (score, first word, end word) of a match, in word positions
+_Span = Tuple[float, int, int]
+
+
+@dataclass
+class QuoteMatch:
+    """Outcome of looking up one quote."""
+    verified: bool
+    match: str  # "exact", "fuzzy" or "none"
+    score: float
+    start: Optional[int] = None  # Character span in the joined document text
+    end: Optional[int] = None
+    page: Optional[int] = None
+    end_page: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        result = {"verified": self.verified, "match": self.match, "score": round(self.score, 3)}
+        if self.start is not None:
+            result.update(start=self.start, end=self.end, page=self.page)
+            if self.end_page != self.page:
+                result["end_page"] = self.end_page
+        return result
+
+
+class QuoteIndex:
+    """
+    Word-level inverted index of one extracted document.
+
+    Args:
+        result: The extracted document; spans refer to its joined text
+    """
+
+    def __init__(self, result: ExtractionResult):
+        self._result = result
+        self._vocabulary: Dict[str, int] = {}
+        self._postings: List[List[int]] = []
+        self._words = array("i")
+        self._starts = array("l")
+        self._ends = array("l")
+
+        text = result.text
+        lowered = text.lower()
+        # Lowercasing a few characters changes their length; fall back to per-word lowering then
+        per_word = len(lowered) != len(text)
+        for match in _WORD.finditer(text if per_word else lowered):
+            word = match.group().lower() if per_word else match.group()
+            word_id = self._vocabulary.get(word)
+            if word_id is None:
+                word_id = self._vocabulary[word] = len(self._postings)
+                self._postings.append([])
+            self._postings[word_id].append(len(self._words))
+            self._words.append(word_id)
+            self._starts.append(match.start())
+            self._ends.append(match.end())
+
+    @property
+    def word_count(self) -> int:
+        return len(self._words)
+
+    def _word_ids(self, text: str) -> array:
+        # Words missing from the document get -1, which never matches
+        return array("i", (self._vocabulary.get(word.lower(), -1) for word in _WORD.findall(text)))
+
+    def _find_words(self, quote: array, after: int = 0, before: Optional[int] = None) -> Optional[_Span]:
+        """Best match of a word sequence starting between word positions `after` and `before`."""
+        length = len(quote)
+        anchors = sorted((len(self._postings[word_id]), offset, word_id) for offset, word_id in enumerate(quote) if word_id >= 0)
+        if not anchors:
+            return None
+        if before is None:
+            before = len(self._words)
+
+        # Exact: every occurrence of the rarest word is a candidate start
+        _, offset, word_id = anchors[0]
+        postings = self._postings[word_id]
+        for position in postings[bisect_left(postings, after + offset):]:
+            first = position - offset
+            if first > before:
+                break
+            if self._words[first:first + length] == quote:
+                return 1.0, first, first + length
+        if length < MIN_FUZZY_WORDS:
+            return None
+
+        # Fuzzy: rare words vote for a start; insertions and deletions shift votes by a few words
+        slack = length // 4 + 2
+        voters = [anchor for anchor in anchors if anchor[0] <= MAX_ANCHOR_POSTINGS][:FUZZY_ANCHORS] or anchors[:1]
+        starts = sorted(
+            position - offset
+            for _, offset, word_id in voters
+            for position in self._postings[word_id]
+            if after - slack <= position - offset <= before + slack
+        )
+        clusters = []
+        low = 0
+        for high, start in enumerate(starts):
+            while starts[low] < start - slack:
+                low += 1
+            clusters.append((high - low + 1, starts[low], start))
+        clusters.sort(reverse=True)
+
+        best = None
+        scored: List[Tuple[int, int]] = []
+        for _, cluster_first, cluster_last in clusters:
+            if len(scored) == FUZZY_CANDIDATES:
+                break
+            if any(first - slack <= cluster_last and cluster_first <= last + slack for first, last in scored):
+                continue
+            scored.append((cluster_first, cluster_last))
+            window_start = max(0, cluster_first - slack)
+            window = self._words[window_start:max(window_start, cluster_last) + length + slack]
+            blocks = [block for block in SequenceMatcher(None, quote, window, autojunk=False).get_matching_blocks() if block.size]
+            if not blocks:
+                continue
+            matched = sum(block.size for block in blocks)
+            span = blocks[-1].b + blocks[-1].size - blocks[0].b
+            # Dice coefficient over the matched region, so scattered words score low
+            score = 2 * matched / (length + span)
+            if best is None or score > best[0]:
+                best = (score, window_start + blocks[0].b, window_start + blocks[-1].b + blocks[-1].size)
+        return best
+
+    def find(self, quote: str) -> QuoteMatch:
+        """
+        Look up a quote in the document.
+
+        Text elided with "..." is allowed: every fragment must be found, and
+        the span runs from the first fragment to the last.
+
+        Args:
+            quote: Quote as returned by the model
+
+        Returns:
+            QuoteMatch: Whether the quote was found, how closely, and where
+        """
+        fragments = [words for words in map(self._word_ids, _ELLIPSIS.split(quote)) if words]
+        if not fragments:
+            return QuoteMatch(verified=False, match="none", score=0.0)
+
+        # Later fragments are looked for shortly after the previous one
+        spans = [self._find_words(fragments[0])]
+        for words in fragments[1:]:
+            if spans[-1] is None:
+                break
+            spans.append(self._find_words(words, after=spans[-1][2], before=spans[-1][2] + MAX_ELIDED_WORDS))
+        total = sum(len(words) for words in fragments)
+        score = sum(span[0] * len(words) for span, words in zip(spans, fragments) if span) / total
+        if len(spans) < len(fragments) or any(span is None for span in spans) or score < GROUNDING_MIN_SCORE:
+            return QuoteMatch(verified=False, match="none", score=score)
+
+        start = self._starts[spans[0][1]]
+        end = self._ends[spans[-1][2] - 1]
+        return QuoteMatch(
+            verified=True,
+            match="exact" if score == 1.0 else "fuzzy",
+            score=score,
+            start=start,
+            end=end,
+            page=self._result.page_at(start),
+            end_page=self._result.page_at(end - 1)
+        )
+
+
+class QuoteIndexCache:
+    """
+    LRU of QuoteIndex objects keyed by a hash of the document text.
+
+    Args:
+        max_entries: Indexes kept in memory
+    """
+
+    def __init__(self, max_entries: int = GROUNDING_INDEX_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, QuoteIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, result: ExtractionResult) -> QuoteIndex:
+        """The index of a document, built on first use."""
+        key = hashlib.blake2b(result.text.encode("utf-8"), digest_size=16).hexdigest()
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return index
+            self.misses += 1
+
+        # Built outside the lock; a concurrent build of the same document just wins or loses the race
+        index = QuoteIndex(result)
+        with self._lock:
+            self._entries[key] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def ground_analysis(analysis: dict, bill_a: QuoteIndex, bill_b: QuoteIndex) -> dict:
+    """
+    Check every quote of an analysis and annotate the items in place.
+
+    Each key change and stakeholder gets a `grounding` object mapping its
+    quote fields to QuoteMatch dicts. Original quotes are looked up in the
+    first document and proposed quotes in the second. Evidence quotes are
+    looked up in the second document, then the first, and carry the
+    `document` they were found in.
+
+    Args:
+        analysis: Parsed (possibly merged) analysis JSON
+        bill_a: Index of the first document
+        bill_b: Index of the second document
+
+    Returns:
+        dict: Counts of checked quotes by outcome
+    """
+    counts = {"quotes": 0, "verified": 0, "exact": 0, "fuzzy": 0, "unverified": 0}
+
+    def check(item: dict, field_name: str, indexes: List[Tuple[str, QuoteIndex]]):
+        quote = item.get(field_name)
+        if not isinstance(quote, str) or not quote.strip():
+            return
+        found = None
+        document = None
+        for name, index in indexes:
+            match = index.find(quote)
+            if found is None or match.score > found.score:
+                found, document = match, name
+            if match.verified:
+                break
+        citation = found.to_dict()
+        if len(indexes) > 1 and found.verified:
+            citation["document"] = document
+        item.setdefault("grounding", {})[field_name] = citation
+        counts["quotes"] += 1
+        counts[found.match if found.verified else "unverified"] += 1
+        counts["verified"] += found.verified
+
+    summary = analysis.get("executive_summary")
+    changes = summary.get("key_changes") if isinstance(summary, dict) else None
+    for change in changes if isinstance(changes, list) else []:
+        if isinstance(change, dict):
+            check(change, "original_quote", [("bill_a", bill_a)])
+            check(change, "proposed_quote", [("bill_b", bill_b)])
+
+    stakeholders = analysis.get("stakeholder_analysis")
+    for stakeholder in stakeholders if isinstance(stakeholders, list) else []:
+        if isinstance(stakeholder, dict):
+            check(stakeholder, "evidence_quote", [("bill_b", bill_b), ("bill_a", bill_a)])
+    return counts
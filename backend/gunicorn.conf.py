@@ -0,0 +1,112 @@
+"""
+Gunicorn settings for production: `python start.py --prod`, or directly
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is imported once in the master process (preload_app) together with
+the deferred heavy modules, and the workers are forked from it, so they share
+that memory copy-on-write and start serving without importing anything.
+Each worker is a uvicorn event loop; after MAX_REQUESTS requests (plus
+jitter, so they do not all restart together) it is replaced to bound memory
+creep. On SIGTERM, workers stop accepting connections, finish in-flight
+requests and drain background jobs within GRACEFUL_TIMEOUT.
+
+Worker count: WEB_CONCURRENCY when set, otherwise one per available CPU
+(honouring cgroup CPU quotas), capped by the memory limit divided by
+WORKER_MEMORY_MB.
+"""
+import gc
+import logging
+import math
+import os
+from typing import Optional
+
+logger = logging.getLogger("gunicorn.error")
+
+# Expected resident memory of one worker, including its PDF extraction processes
+WORKER_MEMORY_MB = int(os.getenv("WORKER_MEMORY_MB", "512"))
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def available_cpus() -> float:
+    """CPUs this process may use: affinity mask, narrowed by a cgroup v2/v1 quota."""
+    cpus = float(len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1)
+    quota = _read("/sys/fs/cgroup/cpu.max")
+    if quota:
+        limit, _, period = quota.partition(" ")
+        if limit != "max":
+            cpus = min(cpus, int(limit) / int(period or 100000))
+    else:
+        limit, period = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"), _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+        if limit and period and int(limit) > 0:
+            cpus = min(cpus, int(limit) / int(period))
+    return cpus
+
+
+def available_memory_mb() -> Optional[float]:
+    """Memory limit of the cgroup, else the machine's total memory, in MB."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        limit = _read(path)
+        # cgroup v1 reports "no limit" as a number near 2**63
+        if limit and limit != "max" and int(limit) < 2 ** 60:
+            return int(limit) / 2 ** 20
+    meminfo = _read("/proc/meminfo")
+    for line in (meminfo or "").splitlines():
+        if line.startswith("MemTotal:"):
+            return int(line.split()[1]) / 1024
+    return None
+
+
+def worker_count() -> int:
+    if os.getenv("WEB_CONCURRENCY"):
+        return max(1, int(os.environ["WEB_CONCURRENCY"]))
+    count = max(1, math.floor(available_cpus()))
+    memory_mb = available_memory_mb()
+    if memory_mb:
+        count = min(count, max(1, int(memory_mb // WORKER_MEMORY_MB)))
+    return count
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', os.getenv('BACKEND_PORT', '8000'))}"
+workers = worker_count()
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+max_requests = int(os.getenv("MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", str(max_requests // 10)))
+
+# Seconds a stopping worker gets to finish requests and drain jobs (JOB_DRAIN_SECONDS)
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# A worker silent for this long is restarted; the event loop keeps it alive during long analyses
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = int(os.getenv("KEEPALIVE_SECONDS", "5"))
+
+accesslog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+# Every worker would otherwise start one PDF extraction process per CPU
+os.environ.setdefault("PDF_PROCESS_WORKERS", str(max(1, math.floor(available_cpus()) // workers)))
+
+
+def when_ready(server):
+    """In the master, after the app is preloaded and before workers are forked."""
+    from coldstart import startup_timer
+
+    # Import the deferred modules here, once, instead of in every worker
+    startup_timer.warm(background=False)
+    # Keep the preloaded objects out of the collector, so its bookkeeping
+    # does not write to (and un-share) the pages the workers inherit
+    gc.freeze()
+    stats = startup_timer.stats()
+    logger.info(
+        f"Preloaded app in {stats['import_seconds']}s "
+        f"(warmed {stats['warm_imports_ms']}); starting {workers} workers "
+        f"({available_cpus():g} CPUs, {available_memory_mb() or 0:.0f} MB, {WORKER_MEMORY_MB} MB per worker)"
+    )
@@ -0,0 +1,242 @@
+"""
+In-process job queue for long-running comparisons.
+
+Jobs are accepted immediately and processed by a fixed number of worker tasks
+pulling from a bounded asyncio queue. When the queue is full, submissions are
+rejected so callers can back off instead of piling up timeouts. Job state
+lives in this process only; with several server workers, the status must be
+polled from the worker that accepted the job (use sticky sessions or a single
+worker for the job API).
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from metrics import JOB_QUEUE_DEPTH, JOB_WAIT_SECONDS, JOBS, JOBS_RUNNING
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "32"))
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+
+# On shutdown, how long running and queued jobs may take to finish before they are cancelled
+JOB_DRAIN_SECONDS = float(os.getenv("JOB_DRAIN_SECONDS", "20"))
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted to a full queue."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Job:
+    """A queued comparison and its outcome."""
+
+    def __init__(self, run: Callable[[], Awaitable[dict]], cleanup: Optional[Callable[[], Awaitable[None]]] = None, **info: Any):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.info = info
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[dict] = None
+        self.error: Optional[dict] = None
+        self._run = run
+        self._cleanup = cleanup
+
+    def to_dict(self) -> dict:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            **self.info,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.started_at is not None:
+            data["queue_wait_ms"] = int((self.started_at - self.created_at) * 1000)
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    """
+    Bounded queue served by a fixed pool of asyncio worker tasks.
+
+    Args:
+        workers: Number of jobs processed concurrently
+        max_depth: Maximum number of jobs waiting to start
+        result_ttl: Seconds finished jobs are kept for polling
+        drain_timeout: Seconds stop(drain=True) waits for outstanding jobs
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        max_depth: int = JOB_QUEUE_SIZE,
+        result_ttl: float = JOB_RESULT_TTL_SECONDS,
+        drain_timeout: float = JOB_DRAIN_SECONDS
+    ):
+        self.workers = max(1, workers)
+        self.max_depth = max(1, max_depth)
+        self.result_ttl = result_ttl
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running = 0
+
+        self.submitted = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._service_total = 0.0
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_depth)
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        logger.info(f"Job queue started ({self.workers} workers, depth {self.max_depth})")
+
+    async def stop(self, drain: bool = False):
+        """
+        Cancel the workers and release the inputs of jobs that never ran.
+
+        Args:
+            drain: First stop accepting jobs and give the outstanding ones up to
+                `drain_timeout` seconds to finish
+        """
+        if drain and self._queue is not None:
+            self.draining = True
+            outstanding = self._queue.qsize() + self._running
+            if outstanding:
+                logger.info(f"Draining {outstanding} jobs (up to {self.drain_timeout:.0f}s)")
+                try:
+                    await asyncio.wait_for(self._queue.join(), self.drain_timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Job drain timed out; cancelling {self._queue.qsize() + self._running} jobs")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while self._queue is not None and not self._queue.empty():
+            job = self._queue.get_nowait()
+            job.status = "failed"
+            job.error = {"status": 503, "detail": "Server shut down before the job started"}
+            JOBS.inc(outcome="failed")
+            await self._release(job)
+        JOB_QUEUE_DEPTH.set(0)
+
+    def submit(self, job: Job) -> Job:
+        """
+        Enqueue a job without waiting.
+
+        Raises:
+            QueueFull: When max_depth jobs are already waiting, or while
+                draining, so the client retries against another worker
+        """
+        self._prune()
+        if self.draining:
+            self.rejected += 1
+            JOBS.inc(outcome="rejected")
+            raise QueueFull(self.retry_after())
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            JOBS.inc(outcome="rejected")
+            raise QueueFull(self.retry_after())
+        self.jobs[job.id] = job
+        self.submitted += 1
+        JOB_QUEUE_DEPTH.set(self._queue.qsize())
+        logger.info(f"Job {job.id} queued (depth {self._queue.qsize()})")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up, from the average job duration."""
+        completed = self.succeeded + self.failed
+        average_service = self._service_total / completed if completed else 30.0
+        backlog = (self._queue.qsize() if self._queue else 0) / self.workers
+        return max(1, int(average_service * max(backlog, 1.0) + 0.5))
+
+    def metrics(self) -> dict:
+        started = self.succeeded + self.failed + self._running
+        return {
+            "workers": self.workers,
+            "max_depth": self.max_depth,
+            "depth": self._queue.qsize() if self._queue else 0,
+            "running": self._running,
+            "draining": self.draining,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "wait_time_avg_ms": round(self._wait_total / started * 1000, 1) if started else 0.0,
+            "wait_time_max_ms": round(self._wait_max * 1000, 1),
+        }
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            self._running += 1
+            JOB_QUEUE_DEPTH.set(self._queue.qsize())
+            JOBS_RUNNING.set(self._running)
+            job.status = "running"
+            job.started_at = time.time()
+            wait = job.started_at - job.created_at
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            JOB_WAIT_SECONDS.observe(wait)
+            try:
+                job.result = await job._run()
+                job.status = "succeeded"
+                self.succeeded += 1
+            except HTTPException as e:
+                job.status = "failed"
+                job.error = {"status": e.status_code, "detail": e.detail}
+                self.failed += 1
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}")
+                job.status = "failed"
+                job.error = {"status": 500, "detail": f"Processing failed: {str(e)}"}
+                self.failed += 1
+            finally:
+                job.finished_at = time.time()
+                self._service_total += job.finished_at - job.started_at
+                self._running -= 1
+                JOBS_RUNNING.set(self._running)
+                JOBS.inc(outcome=job.status)
+                await self._release(job)
+                self._queue.task_done()
+                logger.info(f"Job {job.id} {job.status} in {(job.finished_at - job.started_at) * 1000:.0f}ms (worker {index})")
+
+    async def _release(self, job: Job):
+        job._run = None
+        if job._cleanup is not None:
+            try:
+                await job._cleanup()
+            finally:
+                job._cleanup = None
+
+    def _prune(self):
+        """Forget finished jobs older than the result TTL."""
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
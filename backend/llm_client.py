@@ -0,0 +1,195 @@
+"""
+Shared, application-scoped HTTP connection pool for OpenAI calls.
+
+A single httpx.AsyncClient (and the AsyncOpenAI client built on top of it) is
+created when the application starts and closed when it shuts down, so requests
+reuse warm TLS connections instead of paying a new handshake every time.
+
+The openai package is the slowest import of the application, so it is only
+imported when the AsyncOpenAI client is first needed, not when the server
+boots.
+"""
+import importlib.util
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Optional
+
+import httpx
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """Counters describing how requests are served by the connection pool."""
+
+    def __init__(self):
+        self.requests_total = 0
+        self.waits_recorded = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.wait_time_last = 0.0
+
+    def record_wait(self, seconds: float):
+        self.waits_recorded += 1
+        self.wait_time_total += seconds
+        self.wait_time_last = seconds
+        self.wait_time_max = max(self.wait_time_max, seconds)
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """
+    AsyncHTTPTransport that measures how long each request waits for a
+    connection from the pool.
+
+    The wait ends at the first httpcore trace event emitted on a connection:
+    either a new TCP connect or the request headers being sent on a reused one.
+    """
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        acquired = False
+        upstream_trace = request.extensions.get("trace")
+
+        async def trace(name: str, info: dict):
+            nonlocal acquired
+            if not acquired and name.endswith(("connect_tcp.started", "send_request_headers.started")):
+                acquired = True
+                self.stats.record_wait(time.monotonic() - started)
+            if upstream_trace is not None:
+                await upstream_trace(name, info)
+
+        request.extensions["trace"] = trace
+        self.stats.requests_total += 1
+        return await super().handle_async_request(request)
+
+    def connection_counts(self) -> dict:
+        """Snapshot of connection and queue state inside the httpcore pool."""
+        connections = list(self._pool.connections)
+        in_use = sum(1 for conn in connections if not conn.is_idle() and not conn.is_closed())
+        idle = sum(1 for conn in connections if conn.is_idle())
+        queued = sum(1 for request in getattr(self._pool, "_requests", []) if request.is_queued())
+        return {
+            "connections": len(connections),
+            "in_use": in_use,
+            "idle": idle,
+            "queued_requests": queued,
+        }
+
+
+class OpenAIClientPool:
+    """
+    Owns the pooled httpx client and the AsyncOpenAI client that uses it.
+
+    Call start() from the application lifespan hook and aclose() on shutdown.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        timeout: float = 300.0,
+        max_retries: int = 0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        # Replaces the network transport, e.g. with httpx.MockTransport in benchmarks
+        self.transport = transport
+        self.stats = PoolStats()
+        self._transport: Optional[httpx.AsyncBaseTransport] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._client: Optional["AsyncOpenAI"] = None
+
+    @classmethod
+    def from_env(cls, api_key: Optional[str]) -> "OpenAIClientPool":
+        """Build a pool configured from OPENAI_* environment variables."""
+        return cls(
+            api_key=api_key,
+            timeout=float(os.getenv("OPENAI_TIMEOUT", "300")),
+            # Retries belong to the LLM scheduler; client-side retries would bypass it
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "0")),
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30")),
+            http2=os.getenv("OPENAI_HTTP2", "false").lower() in ("1", "true", "yes"),
+        )
+
+    async def start(self):
+        """Create the shared HTTP client; the OpenAI client is built on first use."""
+        if self.http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("OPENAI_HTTP2 is enabled but the 'h2' package is not installed; falling back to HTTP/1.1")
+            self.http2 = False
+
+        self._transport = self.transport or InstrumentedTransport(
+            self.stats,
+            limits=self.limits,
+            http2=self.http2,
+            verify=True,
+        )
+        self._http_client = httpx.AsyncClient(
+            transport=self._transport,
+            timeout=self.timeout,
+            follow_redirects=True,
+        )
+        logger.info(
+            f"OpenAI client pool started (max_connections={self.limits.max_connections}, "
+            f"max_keepalive={self.limits.max_keepalive_connections}, http2={self.http2})"
+        )
+
+    async def aclose(self):
+        """Close all pooled connections."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            logger.info("OpenAI client pool closed")
+        self._client = None
+        self._http_client = None
+        self._transport = None
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        """The shared AsyncOpenAI client, created on first use."""
+        if self._client is None:
+            if self._http_client is None or not self.api_key:
+                raise RuntimeError("OpenAI client pool is not started or no API key is configured")
+            from openai import AsyncOpenAI
+
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                timeout=self.timeout,
+                max_retries=self.max_retries,
+                http_client=self._http_client,
+            )
+        return self._client
+
+    def get_stats(self) -> dict:
+        """Pool statistics: connections in use, idle connections and wait times."""
+        stats = {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "requests_total": self.stats.requests_total,
+            "wait_time_avg_ms": round(self.stats.wait_time_total / self.stats.waits_recorded * 1000, 2) if self.stats.waits_recorded else 0.0,
+            "wait_time_max_ms": round(self.stats.wait_time_max * 1000, 2),
+            "wait_time_last_ms": round(self.stats.wait_time_last * 1000, 2),
+        }
+        if isinstance(self._transport, InstrumentedTransport):
+            stats.update(self._transport.connection_counts())
+        return stats
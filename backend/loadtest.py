@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Concurrent load generator and capacity report for a running backend.
+
+Drives /api/compare, /api/test-pdf and /health with a weighted mix of
+requests, stage by stage, either closed-loop at fixed concurrency or
+open-loop at fixed arrival rates, and reports throughput, p50/p95/p99
+latency and error rate per stage plus the point where the server saturates.
+
+Point the backend at fake_openai.py so the test costs no quota:
+
+    python fake_openai.py --latency-ms 1500 --rate-limit-fraction 0.02 &
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=sk-fake ANALYSIS_CACHE_TTL_HOURS=0 \
+        uvicorn main:app --workers 2 &
+    python loadtest.py --concurrency 1 2 4 8 16 32 --duration 30 --workers 2
+
+Uploaded PDFs get a unique trailing comment per request so the extracted
+text cache does not turn the test into a cache benchmark (--allow-cache turns
+that off). The analysis cache is keyed by the extracted text, so start the
+backend with ANALYSIS_CACHE_TTL_HOURS=0 to send every comparison to the model.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmark import COMPARE_PAIRS, PDF_CORPUS, QUICK_MAX_PAGES, ROOT
+
+ENDPOINTS = ("compare", "test-pdf", "health")
+
+# A stage counts as saturated when throughput grew less than this over the best earlier stage
+SATURATION_MIN_GAIN = 0.1
+
+
+@dataclass
+class Sample:
+    endpoint: str
+    status: str
+    latency: float
+    finished: float
+
+    @property
+    def ok(self) -> bool:
+        return self.status.isdigit() and int(self.status) < 400
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(samples: List[Sample], elapsed: float) -> dict:
+    latencies = sorted(sample.latency for sample in samples)
+    errors = sum(1 for sample in samples if not sample.ok)
+    statuses: Dict[str, int] = {}
+    for sample in samples:
+        statuses[sample.status] = statuses.get(sample.status, 0) + 1
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 1)
+
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 3) if elapsed else 0.0,
+        "ok_throughput_rps": round((len(samples) - errors) / elapsed, 3) if elapsed else 0.0,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "statuses": statuses,
+    }
+
+
+class LoadGenerator:
+    """
+    Sends the request mix to one backend.
+
+    Args:
+        client: HTTP client with the backend as base URL
+        mix: Relative weight of each endpoint
+        pdfs: Corpus PDFs (path, bytes) for /api/test-pdf
+        pairs: Corpus PDF pairs for /api/compare
+        unique: Make every upload's bytes unique to defeat the caches
+    """
+
+    def __init__(self, client: httpx.AsyncClient, mix: Dict[str, float], pdfs: List[Tuple[str, bytes]], pairs: List[Tuple[Tuple[str, bytes], Tuple[str, bytes]]], unique: bool = True):
+        self.client = client
+        self.endpoints = [name for name in ENDPOINTS if mix.get(name, 0) > 0]
+        self.weights = [mix[name] for name in self.endpoints]
+        self.pdfs = pdfs
+        self.pairs = pairs
+        self.unique = unique
+        self._counter = itertools.count()
+
+    def _upload(self, document: Tuple[str, bytes]) -> Tuple[str, bytes, str]:
+        name, data = document
+        if self.unique:
+            # Bytes after %%EOF are ignored by PDF readers but change the content hash
+            data = data + f"\n%loadtest {os.getpid()}-{next(self._counter)}\n".encode()
+        return os.path.basename(name), data, "application/pdf"
+
+    async def request(self) -> Sample:
+        endpoint = random.choices(self.endpoints, weights=self.weights)[0]
+        started = time.perf_counter()
+        try:
+            if endpoint == "health":
+                response = await self.client.get("/health")
+            elif endpoint == "test-pdf":
+                response = await self.client.post("/api/test-pdf", files={"file": self._upload(random.choice(self.pdfs))})
+            else:
+                bill_a, bill_b = random.choice(self.pairs)
+                response = await self.client.post("/api/compare", files={
+                    "bill_a_file": self._upload(bill_a),
+                    "bill_b_file": self._upload(bill_b),
+                })
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        finished = time.perf_counter()
+        return Sample(endpoint, status, finished - started, finished)
+
+    async def closed_loop(self, concurrency: int, duration: float) -> Tuple[List[Sample], float]:
+        """`concurrency` clients each send their next request as soon as the last one returns."""
+        samples: List[Sample] = []
+        started = time.perf_counter()
+        deadline = started + duration
+
+        async def client_loop():
+            while time.perf_counter() < deadline:
+                samples.append(await self.request())
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        return samples, time.perf_counter() - started
+
+    async def open_loop(self, rate: float, duration: float, max_outstanding: int) -> Tuple[List[Sample], float, int]:
+        """Poisson arrivals at `rate` per second, regardless of how fast the server answers."""
+        tasks: List[asyncio.Task] = []
+        outstanding = set()
+        dropped = 0
+        started = time.perf_counter()
+        next_arrival = started
+        while True:
+            next_arrival += random.expovariate(rate)
+            if next_arrival >= started + duration:
+                break
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            if len(outstanding) >= max_outstanding:
+                # The client would need unbounded memory to keep up; count it as shed load
+                dropped += 1
+                continue
+            task = asyncio.create_task(self.request())
+            task.add_done_callback(outstanding.discard)
+            outstanding.add(task)
+            tasks.append(task)
+        samples = list(await asyncio.gather(*tasks))
+        return samples, time.perf_counter() - started, dropped
+
+
+async def scheduler_counters(client: httpx.AsyncClient) -> Dict[str, int]:
+    """LLM scheduler counters from /health (of whichever worker answers the probe)."""
+    try:
+        scheduler = (await client.get("/health")).json().get("scheduler", {})
+    except (httpx.HTTPError, ValueError):
+        return {}
+    return {key: scheduler.get(key, 0) for key in ("throttled", "retries", "failures")}
+
+
+def find_saturation(stages: List[dict], max_error_rate: float, open_loop: bool) -> dict:
+    """
+    First stage where more offered load stopped buying throughput.
+
+    A stage is saturated when its error rate exceeds `max_error_rate`, when
+    (closed loop) its throughput is less than SATURATION_MIN_GAIN above the
+    best earlier stage, or when (open loop) it served under 90% of the
+    requests that arrived per second (sent plus dropped).
+    """
+    best = None
+    for stage in stages:
+        result = stage["overall"]
+        reason = None
+        if result["error_rate"] > max_error_rate:
+            reason = f"error rate {result['error_rate'] * 100:.1f}% > {max_error_rate * 100:.1f}%"
+        elif open_loop and result["ok_throughput_rps"] < 0.9 * stage["arrival_rps"]:
+            reason = f"served {result['ok_throughput_rps']:.2f} of {stage['arrival_rps']:.2f} req/s that arrived"
+        elif not open_loop and best is not None and result["ok_throughput_rps"] < best["overall"]["ok_throughput_rps"] * (1 + SATURATION_MIN_GAIN):
+            reason = f"throughput {(result['ok_throughput_rps'] / best['overall']['ok_throughput_rps'] - 1) * 100:+.0f}% over {best['offered']:g}"
+        if reason:
+            return {"saturated_at": stage["offered"], "reason": reason, "last_good": best["offered"] if best else None}
+        if best is None or result["ok_throughput_rps"] > best["overall"]["ok_throughput_rps"]:
+            best = stage
+    return {"saturated_at": None, "reason": "not reached; increase the load", "last_good": best["offered"] if best else None}
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {name!r}; use {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def load_corpus(include_large: bool):
+    import PyPDF2
+
+    documents = {}
+    for path in PDF_CORPUS:
+        full_path = os.path.join(ROOT, path)
+        if not include_large and len(PyPDF2.PdfReader(full_path).pages) > QUICK_MAX_PAGES:
+            continue
+        with open(full_path, "rb") as f:
+            documents[path] = f.read()
+    pairs = [((a, documents[a]), (b, documents[b])) for a, b in COMPARE_PAIRS if a in documents and b in documents]
+    return list(documents.items()), pairs
+
+
+def print_report(report: dict):
+    unit = "req/s" if report["mode"] == "open" else "clients"
+    print(f"\n{'load (' + unit + ')':>16} {'requests':>9} {'rps':>8} {'ok rps':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'429s':>6}")
+    for stage in report["stages"]:
+        result = stage["overall"]
+        throttled = stage.get("scheduler", {}).get("throttled", "")
+        print(
+            f"{stage['offered']:>16g} {result['requests']:>9} {result['throughput_rps']:>8.2f} {result['ok_throughput_rps']:>8.2f} "
+            f"{result['error_rate'] * 100:>6.1f}% {result['p50_ms'] or 0:>9.0f} {result['p95_ms'] or 0:>9.0f} {result['p99_ms'] or 0:>9.0f} {throttled:>6}"
+        )
+    capacity = report["capacity"]
+    print(f"\nSaturation: {capacity['saturated_at'] if capacity['saturated_at'] is not None else '-'} ({capacity['reason']})")
+    print(
+        f"Peak: {capacity['max_ok_throughput_rps']:.2f} ok req/s with {report['workers']} worker(s) "
+        f"= {capacity['ok_rps_per_worker']:.2f} req/s per worker"
+    )
+
+
+async def run(args) -> dict:
+    pdfs, pairs = load_corpus(args.large)
+    open_loop = bool(args.rate)
+    loads = args.rate or args.concurrency
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=max(loads) if not open_loop else 100)
+    stages = []
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        generator = LoadGenerator(client, args.mix, pdfs, pairs, unique=not args.allow_cache)
+        for load in loads:
+            before = await scheduler_counters(client)
+            dropped = 0
+            if open_loop:
+                samples, elapsed, dropped = await generator.open_loop(load, args.duration, args.max_outstanding)
+            else:
+                samples, elapsed = await generator.closed_loop(int(load), args.duration)
+            after = await scheduler_counters(client)
+
+            stage = {
+                "offered": load,
+                "elapsed_s": round(elapsed, 2),
+                "overall": summarize(samples, elapsed),
+                "endpoints": {
+                    name: summarize([sample for sample in samples if sample.endpoint == name], elapsed)
+                    for name in generator.endpoints
+                },
+                "scheduler": {key: after.get(key, 0) - before.get(key, 0) for key in after},
+            }
+            if open_loop:
+                stage["dropped"] = dropped
+                stage["arrival_rps"] = round((len(samples) + dropped) / args.duration, 3)
+            stages.append(stage)
+            result = stage["overall"]
+            print(
+                f"{'rate' if open_loop else 'concurrency'} {load:g}: {result['requests']} requests, "
+                f"{result['ok_throughput_rps']:.2f} ok req/s, p95 {result['p95_ms']} ms, "
+                f"{result['error_rate'] * 100:.1f}% errors", flush=True
+            )
+            if args.pause:
+                await asyncio.sleep(args.pause)
+
+    capacity = find_saturation(stages, args.max_error_rate, open_loop)
+    peak = max((stage["overall"]["ok_throughput_rps"] for stage in stages), default=0.0)
+    capacity["max_ok_throughput_rps"] = peak
+    capacity["ok_rps_per_worker"] = round(peak / args.workers, 3)
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "url": args.url,
+            "mix": args.mix,
+            "duration_s": args.duration,
+            "unique_uploads": not args.allow_cache,
+        },
+        "mode": "open" if open_loop else "closed",
+        "workers": args.workers,
+        "stages": stages,
+        "capacity": capacity,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend and report its capacity")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Backend base URL")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Closed-loop client counts, one stage each")
+    load.add_argument("--rate", type=float, nargs="+", help="Open-loop arrival rates in req/s, one stage each")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per stage")
+    parser.add_argument("--pause", type=float, default=2.0, help="Seconds between stages")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("compare=1,test-pdf=1,health=1"), help="Endpoint weights, e.g. compare=1,test-pdf=3,health=1")
+    parser.add_argument("--workers", type=int, default=1, help="Server worker count, for the per-worker capacity figure")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument("--max-outstanding", type=int, default=1000, help="Open loop: requests in flight before arrivals are dropped")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Error rate that marks a stage as saturated")
+    parser.add_argument("--large", action="store_true", help=f"Include the bills over {QUICK_MAX_PAGES} pages")
+    parser.add_argument("--allow-cache", action="store_true", help="Upload identical bytes so the server caches can hit")
+    parser.add_argument("--output", default="capacity_report.json", help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,200 @@
-import io
+# Imported first, so the cold-start timer covers all other imports
+from coldstart import startup_timer
+
+import asyncio
+import contextvars
+import functools
+import hmac
 import json
 import logging
+import math
 import os
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, asynccontextmanager
 from datetime import datetime
-from typing import List, Optional
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 
-import httpx
-import PyPDF2
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import FastAPI, File, Form, Header, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from openai import OpenAI
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
+try:
+    import orjson
+except ImportError:  # optional; responses fall back to the standard json module
+    orjson = None
+
+from admission import AdmissionError, PdfProfile, UploadLimitMiddleware, admit_pdf
+from cache import CACHE_DIR, TwoTierCache, content_hash
+from chunking import Chunk, apply_summary, estimate_tokens, merge_analyses, plan_chunks, summary_fields
+from compression import CompressionMiddleware
+from diffing import DIFF_CONTEXT_LINES, diff_texts
+from documents import DocumentInfo, DocumentSource, DocumentStore, document_id
+from engines import EngineSelector
+from extraction import ExtractionResult, PageExtractor, collect_pages
+from grounding import QuoteIndexCache, ground_analysis
+from jobs import Job, JobQueue, QueueFull
+from llm_client import OpenAIClientPool
+from metrics import (
+    EXTRACTION_SECONDS,
+    JSON_PARSE_SECONDS,
+    LLM_FIRST_TOKEN_SECONDS,
+    LLM_SECONDS,
+    PAGE_EXTRACTION_SECONDS,
+    PROMETHEUS_CONTENT_TYPE,
+    PROMPT_BUILD_SECONDS,
+    QUOTE_GROUNDING_SECONDS,
+    QUOTES_CHECKED,
+    REGISTRY,
+    REQUEST_ID,
+    REQUEST_SECONDS,
+    SERIALIZATION_SECONDS,
+    UPLOAD_ADMISSION_SECONDS,
+    UPLOAD_READ_SECONDS,
+    UPLOADS_REJECTED,
+    RequestIdFilter,
+    new_request_id,
+    record_usage
+)
+from normalization import NORMALIZATION_VERSION, normalize_page_stream
+from profiling import RequestProfiler
+from scheduler import LLM_PRIORITY, LLMScheduler, retry_after_seconds
+from singleflight import SingleFlight
+from streaming import NDJSON_MEDIA_TYPE, SectionStreamParser, stream_event
+from textrange import TextRangeError, TextWindow, char_window, extraction_window, page_window, resolve_window
+from uploads import TRACK_REQUEST_MEMORY, MemoryLimitExceeded, RequestMemoryMeter, detach_upload, upload_buffer
+
 # Load environment variables
 load_dotenv()
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:[%(request_id)s] %(message)s")
+for handler in logging.getLogger().handlers:
+    handler.addFilter(RequestIdFilter())
 logger = logging.getLogger(__name__)
 
+# Configure OpenAI
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")  # Try simpler model for better connectivity
+ANALYSIS_TEMPERATURE = 0.3
+
+# Maximum chunk analyses in flight for one comparison
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))
+
+# Summarize the merged assessment and forecasts of a chunked analysis with one more call
+ANALYSIS_SUMMARY = os.getenv("ANALYSIS_SUMMARY", "true").lower() in ("1", "true", "yes")
+
+# Key change topics listed in the summary prompt
+SUMMARY_MAX_TOPICS = 60
+
+# Bump whenever the analysis prompt changes so cached results from the old
+# prompt are no longer served.
+PROMPT_VERSION = "4"
+
+# Token required by the /admin endpoints; they are disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# PyPDF2 parsing is CPU-bound and synchronous, so it runs on a dedicated
+# executor to keep the event loop free for other requests.
+PDF_EXTRACTION_THREADS = int(os.getenv("PDF_EXTRACTION_THREADS", "4"))
+pdf_executor = ThreadPoolExecutor(max_workers=PDF_EXTRACTION_THREADS, thread_name_prefix="pdf-extract")
+
+# Process pool that parses page ranges of large PDFs in parallel
+# (PDF_PROCESS_WORKERS, PDF_PARALLEL_MIN_PAGES)
+page_extractor = PageExtractor()
+
+# Strip running headers, stamps, line numbers and line-break hyphens before analysis
+TEXT_NORMALIZATION = os.getenv("TEXT_NORMALIZATION", "true").lower() in ("1", "true", "yes")
+
+# Check the model's quotes against both documents and cite their pages
+QUOTE_GROUNDING = os.getenv("QUOTE_GROUNDING", "true").lower() in ("1", "true", "yes")
+
+# Extracted PDF text, keyed by the SHA-256 of the PDF bytes
+pdf_text_cache = TwoTierCache(
+    name="pdf_text",
+    db_path=os.path.join(CACHE_DIR, "pdf_text.sqlite3"),
+    memory_max_bytes=int(os.getenv("PDF_TEXT_CACHE_MEMORY_MB", "64")) * 1024 * 1024,
+    disk_max_bytes=int(os.getenv("PDF_TEXT_CACHE_DISK_MB", "512")) * 1024 * 1024
+)
+
+# Parsed analysis results, keyed by both document hashes, model, temperature
+# and prompt version
+analysis_cache = TwoTierCache(
+    name="analysis",
+    db_path=os.path.join(CACHE_DIR, "analysis.sqlite3"),
+    memory_max_bytes=int(os.getenv("ANALYSIS_CACHE_MEMORY_MB", "16")) * 1024 * 1024,
+    disk_max_bytes=int(os.getenv("ANALYSIS_CACHE_DISK_MB", "128")) * 1024 * 1024,
+    ttl_seconds=float(os.getenv("ANALYSIS_CACHE_TTL_HOURS", "168")) * 3600
+)
+
+# Extraction engine chosen for each PDF, keyed by the SHA-256 of the PDF bytes
+engine_choices = TwoTierCache(
+    name="pdf_engine",
+    db_path=os.path.join(CACHE_DIR, "pdf_engine.sqlite3"),
+    memory_max_bytes=1024 * 1024,
+    disk_max_bytes=16 * 1024 * 1024
+)
+
+caches = {"pdf_text": pdf_text_cache, "analysis": analysis_cache, "pdf_engine": engine_choices}
+
+# Fastest extraction engine whose text passes the quality checks (PDF_ENGINES,
+# PDF_MIN_CHARS_PER_PAGE, PDF_MAX_GARBAGE_RATIO, PDF_MIN_WHITESPACE_RATIO)
+engine_selector = EngineSelector(choices=engine_choices)
+
+# Registered documents and their pages, compared by ID (DOCUMENTS_DB)
+document_store = DocumentStore()
+
+# Word indexes of recently compared documents (GROUNDING_INDEX_CACHE_SIZE)
+quote_indexes = QuoteIndexCache()
+
+# Shared OpenAI connection pool, started and closed by the lifespan hook
+llm_pool = OpenAIClientPool.from_env(api_key=OPENAI_API_KEY)
+
+# Every chat completion is admitted, throttled and retried by the scheduler
+# (LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY, LLM_MAX_ATTEMPTS)
+llm_scheduler = LLMScheduler.from_env()
+
+# Identical comparisons in flight share one extraction and one analysis
+comparison_flights = SingleFlight("comparison")
+
+# Background comparison jobs (JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RESULT_TTL_SECONDS)
+job_queue = JobQueue()
+
+# Opt-in and 1-in-N sampled request profiles
+# (PROFILE_DIR, PROFILE_SAMPLE_EVERY, PROFILE_INTERVAL_MS, PROFILE_RETAIN)
+request_profiler = RequestProfiler.from_env()
+PROFILED_ROUTES = {"/api/compare", "/api/test-pdf"}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared resources on startup and release them on shutdown."""
+    if TRACK_REQUEST_MEMORY:
+        tracemalloc.start()
+    await llm_pool.start()
+    await job_queue.start()
+    startup_timer.mark("ready")
+    # Deferred imports (WARM_IMPORTS) load in the background instead of on a request
+    startup_timer.warm()
+    try:
+        yield
+    finally:
+        # Let running jobs finish (JOB_DRAIN_SECONDS) before the pool closes under them
+        await job_queue.stop(drain=True)
+        await llm_pool.aclose()
+        pdf_executor.shutdown(wait=False, cancel_futures=True)
+        page_extractor.shutdown()
+        for cache in caches.values():
+            cache.close()
+        document_store.close()
+
 app = FastAPI(
     title="Document Comparison API",
     description="API for comparing PDF documents using AI analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -35,17 +205,84 @@ ALLOWED_ORIGINS = [
     "*"  # Temporarily allow all origins for testing
 ]
 
+# 413 as soon as a request body passes MAX_REQUEST_BODY_MB, before it is spooled;
+# inside CORS so browsers can read the error
+app.add_middleware(UploadLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "X-Profile-Id"],
 )
 
-# Configure OpenAI
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")  # Try simpler model for better connectivity
+# gzip, or brotli when installed, for complete (non-streamed) responses
+app.add_middleware(CompressionMiddleware)
+
+def is_admin(token: Optional[str]) -> bool:
+    """True when `token` matches ADMIN_TOKEN (always False while it is unset)."""
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token or "", ADMIN_TOKEN)
+
+# Registered before request_context, so it runs inside it and sees the request ID
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Profile requests to PROFILED_ROUTES that ask for it or are sampled."""
+    if request.url.path not in PROFILED_ROUTES:
+        return await call_next(request)
+    
+    requested = request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+    if requested and not is_admin(request.headers.get("x-admin-token")):
+        return JSONResponse(status_code=403, content={"detail": "Admin token required to profile a request"})
+    
+    sampler = request_profiler.start(requested)
+    if sampler is None:
+        return await call_next(request)
+    try:
+        response = await call_next(request)
+    finally:
+        profile_id = request_profiler.finish(sampler, REQUEST_ID.get(), request.url.path)
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Tag the request with an ID (echoed as X-Request-ID) and time it."""
+    request_id = new_request_id(request.headers.get("x-request-id"))
+    token = REQUEST_ID.set(request_id)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        # Label by route template so IDs in paths do not create new series
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status_code)
+        )
+        startup_timer.mark("first_response")
+        REQUEST_ID.reset(token)
+
+def json_response(data: dict, route: str) -> JSONResponse:
+    """Serialize a JSON response body (with orjson when installed), recording the serialization time."""
+    with SERIALIZATION_SECONDS.time(route=route):
+        if orjson is not None:
+            return ORJSONResponse(content=data)
+        return JSONResponse(content=data)
+
+def text_window_params(pages: Optional[str], start: Optional[int], limit: Optional[int], cursor: Optional[str]) -> Optional[TextWindow]:
+    """Parse the text window query parameters; 400 when they are malformed."""
+    try:
+        return resolve_window(pages=pages, start=start, limit=limit, cursor=cursor)
+    except TextRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 class ComparisonRequest(BaseModel):
     bill_a_name: str
@@ -57,77 +294,229 @@ class ComparisonResponse(BaseModel):
     impact_forecast: dict
     metadata: dict
 
-def pdf_to_text(pdf_file: UploadFile) -> str:
+def extract_pdf(
+    pdf_file: UploadFile,
+    on_page: Optional[Callable[[int, int], None]] = None,
+    digest: Optional[str] = None
+) -> ExtractionResult:
     """
-    Extract text from a PDF file using PyPDF2.
+    Extract per-page text from a PDF file with the engine selected for it.
     
     Args:
         pdf_file: Uploaded PDF file
+        on_page: Optional progress callback, called as on_page(page_number, page_count)
+        digest: SHA-256 of the upload, when the caller has already computed it
         
     Returns:
-        str: Extracted text from the PDF
+        ExtractionResult: Page texts with character offsets and timing
     """
     try:
         logger.info(f"Processing PDF: {pdf_file.filename} ({pdf_file.size} bytes)")
         
-        # Read the uploaded file
-        content = pdf_file.file.read()
-        pdf_file.file.seek(0)  # Reset file pointer for potential reuse
+        memory = RequestMemoryMeter(label=f"extraction of {pdf_file.filename}")
         
-        # Create a BytesIO object
-        pdf_stream = io.BytesIO(content)
+        def page_done(page_number: int, page_count: int):
+            memory.check()
+            if on_page is not None:
+                on_page(page_number, page_count)
         
-        # Create PDF reader
-        pdf_reader = PyPDF2.PdfReader(pdf_stream)
+        started = time.perf_counter()
         
-        # Extract text from each page
-        extracted_text = ""
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            page_text = page.extract_text()
-            extracted_text += page_text
-            extracted_text += "\n\n"  # Add spacing between pages
+        # Read the spooled upload in place (memory map or shared buffer) instead of copying it
+        with upload_buffer(pdf_file.file) as (content, stream):
+            # Identical uploads are served from the content-addressed cache;
+            # a digest passed in was timed by upload_hash
+            if digest is None:
+                digest = content_hash(content)
+                UPLOAD_READ_SECONDS.observe(time.perf_counter() - started)
+            prefix = f"normalized-v{NORMALIZATION_VERSION}" if TEXT_NORMALIZATION else "pages"
+            cache_key = f"{prefix}:{digest}"
+            cached_pages = pdf_text_cache.get(cache_key)
+            if cached_pages is not None:
+                logger.info(f"PDF text cache hit for {pdf_file.filename} ({digest[:12]})")
+                result = ExtractionResult.from_json(cached_pages)
+                EXTRACTION_SECONDS.observe(time.perf_counter() - started, cache="hit")
+                return result
             
-            logger.info(f"Processed page {page_num + 1}/{len(pdf_reader.pages)}")
+            # Pages stream from the extraction (page ranges across the process pool
+            # for large documents) through normalization as they are parsed; a
+            # faster engine is tried first and replaced if its text is unusable.
+            # Progress is reported for the chosen engine's pages only
+            pages = engine_selector.select(
+                lambda engine: page_extractor.iter_pages(content, stream=stream, engine=engine),
+                digest=digest,
+                fatal=(MemoryLimitExceeded,),
+                on_page=page_done
+            )
+            if TEXT_NORMALIZATION:
+                pages = normalize_page_stream(pages)
+            result = collect_pages(pages)
         
-        if not extracted_text.strip():
+        if not result.text.strip():
             raise ValueError("No text could be extracted from the PDF")
         
-        logger.info(f"Successfully extracted {len(extracted_text)} characters from PDF")
-        return extracted_text
+        if TEXT_NORMALIZATION:
+            stats = result.normalization
+            logger.info(
+                f"Normalized {pdf_file.filename}: {stats['chars_before']} -> {stats['chars_after']} chars, "
+                f"~{stats['tokens_before']} -> ~{stats['tokens_after']} tokens ({stats['saved_percent']}% saved)"
+            )
+        
+        result.peak_memory_bytes = memory.finish()
+        for seconds in result.page_seconds:
+            PAGE_EXTRACTION_SECONDS.observe(seconds)
+        EXTRACTION_SECONDS.observe(time.perf_counter() - started, cache="miss")
+        logger.info(f"Successfully extracted {len(result.text)} characters from PDF with {result.engine}")
+        pdf_text_cache.set(cache_key, result.to_json())
+        return result
         
+    except MemoryLimitExceeded as e:
+        logger.error(f"Memory limit exceeded processing PDF {pdf_file.filename}: {str(e)}")
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing PDF {pdf_file.filename}: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Failed to process PDF: {str(e)}")
 
-def analyze_documents_with_ai(bill_a_text: str, bill_b_text: str) -> dict:
+def pdf_to_text(pdf_file: UploadFile) -> str:
     """
-    Analyze two documents using OpenAI for comparison.
+    Extract text from a PDF file: its page stream, collected and joined.
     
     Args:
-        bill_a_text: Text from the first document
-        bill_b_text: Text from the second document
+        pdf_file: Uploaded PDF file
         
     Returns:
-        dict: Analysis results
+        str: Extracted text from the PDF
+    """
+    return extract_pdf(pdf_file).text
+
+async def run_in_pdf_executor(func: Callable, *args):
+    """Run func on the extraction executor, carrying over context variables such as the request ID."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(pdf_executor, functools.partial(context.run, func, *args))
+
+async def extract_pdf_async(
+    pdf_file: UploadFile,
+    on_page: Optional[Callable[[int, int], None]] = None,
+    digest: Optional[str] = None
+) -> ExtractionResult:
+    """
+    Run extract_pdf on the extraction executor without blocking the event loop.
+    
+    Args:
+        pdf_file: Uploaded PDF file
+        on_page: Optional progress callback; it runs on the executor thread
+        digest: SHA-256 of the upload, when the caller has already computed it
+        
+    Returns:
+        ExtractionResult: Page texts with character offsets and timing
+    """
+    return await run_in_pdf_executor(extract_pdf, pdf_file, on_page, digest)
+
+def admit_upload(pdf_file: UploadFile) -> PdfProfile:
+    """
+    Run the admission checks (size, header, structure, text layer) on an upload.
+    
+    Args:
+        pdf_file: Uploaded PDF file
+        
+    Returns:
+        PdfProfile: Version, size and page count of the accepted file
+        
+    Raises:
+        HTTPException: 413 or 422 when the upload is rejected
     """
+    started = time.perf_counter()
     try:
-        logger.info("Starting AI analysis of documents")
+        with upload_buffer(pdf_file.file) as (content, stream):
+            profile = admit_pdf(content, stream)
+    except AdmissionError as e:
+        UPLOADS_REJECTED.inc(reason=e.reason)
+        logger.warning(f"Rejected upload {pdf_file.filename}: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=f"{pdf_file.filename}: {e.detail}")
+    finally:
+        UPLOAD_ADMISSION_SECONDS.observe(time.perf_counter() - started)
+    logger.info(f"Admitted {pdf_file.filename}: {profile.page_count} pages in {profile.elapsed_seconds * 1000:.1f}ms")
+    return profile
+
+async def admit_uploads(*pdf_files: Optional[UploadFile]) -> List[PdfProfile]:
+    """Admit uploads (None entries are skipped) concurrently, before any of them is hashed or extracted."""
+    return await asyncio.gather(*(run_in_pdf_executor(admit_upload, pdf_file) for pdf_file in pdf_files if pdf_file is not None))
+
+async def pdf_to_text_async(pdf_file: UploadFile) -> str:
+    """
+    Run pdf_to_text on the extraction executor without blocking the event loop.
+    
+    Args:
+        pdf_file: Uploaded PDF file
         
-        # Check if API key is available
-        if not OPENAI_API_KEY:
-            logger.error("OpenAI API key is not configured")
-            raise HTTPException(status_code=500, detail="OpenAI API key is not configured")
+    Returns:
+        str: Extracted text from the PDF
+    """
+    return (await extract_pdf_async(pdf_file)).text
+
+def analysis_cache_key(bill_a_text: str, bill_b_text: str) -> str:
+    """
+    Cache key for an analysis of a document pair.
+    
+    Args:
+        bill_a_text: Text from the first document
+        bill_b_text: Text from the second document
         
-        # Prepare the prompt for analysis
-        prompt = f"""
-        Analyze these two legislative documents and provide detailed comparison information.
+    Returns:
+        str: Hash of both document hashes, the model, temperature and prompt version
+    """
+    key_material = json.dumps({
+        "bill_a": content_hash(bill_a_text),
+        "bill_b": content_hash(bill_b_text),
+        "model": OPENAI_MODEL,
+        "temperature": ANALYSIS_TEMPERATURE,
+        "prompt_version": PROMPT_VERSION
+    }, sort_keys=True)
+    return content_hash(key_material)
+
+ANALYSIS_SYSTEM_PROMPT = "You are an expert legislative analyst. Provide detailed, accurate analysis in JSON format."
+
+# Completion budget of one analysis call
+ANALYSIS_MAX_TOKENS = 4000
 
+# Top-level keys of the analysis JSON, in the order the prompt asks for them
+ANALYSIS_SECTIONS = ("executive_summary", "stakeholder_analysis", "impact_forecast")
+
+def build_analysis_prompt(
+    bill_a_text: str,
+    bill_b_text: str,
+    part: Optional[Tuple[int, int]] = None,
+    unchanged_sections: int = 0
+) -> str:
+    """
+    Build the comparison prompt for two documents.
+    
+    Args:
+        bill_a_text: Text from the first document (or one chunk of it)
+        bill_b_text: Text from the second document (or the matching chunk)
+        part: (part number, total parts) when the documents were chunked
+        unchanged_sections: Sections identical in both documents and left out of the text
+        
+    Returns:
+        str: Prompt asking for the analysis JSON
+    """
+    scope = ""
+    if part is not None and part[1] > 1:
+        scope = (
+            f"This is part {part[0]} of {part[1]} of both documents, split along matching sections. "
+            "Report only what this part shows.\n"
+        )
+    if unchanged_sections:
+        scope += f"{unchanged_sections} sections identical in both documents are left out.\n"
+    return f"""
+        Analyze these two legislative documents and provide detailed comparison information.
+        {scope}
         Original Document:
-        {bill_a_text[:8000]}  # Limit text length for API
+        {bill_a_text}
 
         Proposed Document:
-        {bill_b_text[:8000]}  # Limit text length for API
+        {bill_b_text}
 
         Please provide a JSON response with the following structure:
         {{
@@ -163,78 +552,324 @@ def analyze_documents_with_ai(bill_a_text: str, bill_b_text: str) -> dict:
             }}
         }}
         """
+
+def build_chunk_prompts(bill_a_text: str, bill_b_text: str) -> List[Tuple[Chunk, str]]:
+    """
+    Plan the section-aligned chunks of a comparison and build one prompt per chunk.
+    
+    Returns:
+        List of (chunk, prompt) in document order; bills that fit one chunk
+        and have no unchanged sections get the unsplit prompt
+    """
+    with PROMPT_BUILD_SECONDS.time():
+        chunks = plan_chunks(bill_a_text, bill_b_text)
+        if chunks and chunks[0].unchanged_sections:
+            logger.info(f"Skipping {chunks[0].unchanged_sections} unchanged section(s)")
+        if len(chunks) == 1 and not chunks[0].unchanged_sections:
+            return [(chunks[0], build_analysis_prompt(bill_a_text, bill_b_text))]
+        return [
+            (chunk, build_analysis_prompt(
+                chunk.bill_a_text,
+                chunk.bill_b_text,
+                part=(chunk.index + 1, len(chunks)),
+                unchanged_sections=chunk.unchanged_sections
+            ))
+            for chunk in chunks
+        ]
+
+def build_summary_prompt(analysis: dict, parts: int) -> str:
+    """
+    Build the prompt that condenses the merged free text of a chunked analysis.
+    
+    Args:
+        analysis: Result of merge_analyses over the chunk analyses
+        parts: Number of chunks that were analysed
         
-        logger.info(f"Prompt length: {len(prompt)} characters")
-        logger.info(f"Using OpenAI model: {OPENAI_MODEL}")
+    Returns:
+        str: Prompt asking for the assessment and forecasts as one coherent text each
+    """
+    key_changes = (analysis.get("executive_summary") or {}).get("key_changes") or []
+    topics = list(dict.fromkeys(str(change["topic"]) for change in key_changes if change.get("topic")))
+    if len(topics) > SUMMARY_MAX_TOPICS:
+        # Evenly spaced across the bill, so the prompt stays small for long bills
+        topics = [topics[index * len(topics) // SUMMARY_MAX_TOPICS] for index in range(SUMMARY_MAX_TOPICS)]
+    return f"""
+        Two legislative documents were compared in {parts} parts, and the findings of every
+        part were combined below. Each field now strings together the notes of several parts.
+
+        Key changes found: {"; ".join(topics) or "none listed"}
+
+        Combined findings:
+        {json.dumps(summary_fields(analysis), indent=2)}
+
+        Rewrite every field as one concise paragraph of at most four sentences that covers
+        the comparison as a whole: keep the most significant points, merge repeated ones and
+        drop details specific to a single section. Do not add facts that are not in the findings.
+        Return JSON with exactly the same structure and keys.
+        """
+
+def analysis_messages(prompt: str) -> List[dict]:
+    """Chat messages for an analysis prompt."""
+    return [
+        {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def analysis_token_estimate(prompt: str) -> int:
+    """Tokens an analysis call may consume: prompt estimate plus the completion budget."""
+    return estimate_tokens(ANALYSIS_SYSTEM_PROMPT) + estimate_tokens(prompt) + ANALYSIS_MAX_TOKENS
+
+def openai_error_to_http(openai_error: Exception) -> HTTPException:
+    """
+    Map an OpenAI client error to the HTTPException returned to the caller.
+    
+    Args:
+        openai_error: Exception raised by the OpenAI client
         
-        # Call OpenAI API with better error handling
-        try:
-            import httpx
+    Returns:
+        HTTPException: Exception with a user-facing status and message
+    """
+    logger.error(f"OpenAI API call failed: {str(openai_error)}")
+    logger.error(f"OpenAI error type: {type(openai_error).__name__}")
+    
+    # Imported on first use (see llm_client); an OpenAI call has been made by now
+    import openai
+    
+    # Throttling that outlasted the scheduler's retries
+    if isinstance(openai_error, openai.RateLimitError):
+        retry_after = retry_after_seconds(openai_error)
+        return HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded: OpenAI API rate limit reached. Please try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after or 30))}
+        )
+    
+    # Check for specific OpenAI error types
+    error_message = str(openai_error)
+    if "connection" in error_message.lower():
+        return HTTPException(status_code=500, detail="Connection error: Unable to connect to OpenAI API. Please check your internet connection.")
+    elif "authentication" in error_message.lower() or "api key" in error_message.lower():
+        return HTTPException(status_code=500, detail="Authentication error: Invalid OpenAI API key.")
+    elif "rate limit" in error_message.lower():
+        return HTTPException(status_code=429, detail="Rate limit exceeded: OpenAI API rate limit reached. Please try again later.")
+    elif "timeout" in error_message.lower():
+        return HTTPException(status_code=504, detail="Timeout error: OpenAI API request timed out. Please try again.")
+    else:
+        return HTTPException(status_code=500, detail=f"OpenAI API error: {error_message}")
 
-            # Use custom HTTP client for better connectivity
-            http_client = httpx.Client(
-                timeout=300.0,
-                follow_redirects=True,
-                verify=True
-            )
-            
-            client = OpenAI(
-                api_key=OPENAI_API_KEY,
-                timeout=300.0,  # 5 minute timeout (increased for production)
-                max_retries=5,   # More retries for production
-                http_client=http_client
-            )
-            logger.info("OpenAI client initialized, making API call...")
-            
-            response = client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an expert legislative analyst. Provide detailed, accurate analysis in JSON format."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=4000
-            )
-            logger.info("OpenAI API call completed successfully")
-            
-        except Exception as openai_error:
-            logger.error(f"OpenAI API call failed: {str(openai_error)}")
-            logger.error(f"OpenAI error type: {type(openai_error).__name__}")
+def parse_analysis_content(content: str) -> dict:
+    """
+    Extract the analysis JSON object from a model response.
+    
+    Args:
+        content: Raw completion text
+        
+    Returns:
+        dict: Parsed analysis results
+    """
+    started = time.perf_counter()
+    try:
+        # Look for JSON in the response
+        start_idx = content.find('{')
+        end_idx = content.rfind('}') + 1
+        if start_idx != -1 and end_idx != 0:
+            json_str = content[start_idx:end_idx]
+            result = json.loads(json_str)
+            JSON_PARSE_SECONDS.observe(time.perf_counter() - started)
+            logger.info("Successfully parsed JSON response from OpenAI")
+            return result
+        else:
+            logger.error(f"No JSON found in OpenAI response: {content[:500]}...")
+            raise ValueError("No JSON found in response")
             
-            # Check for specific OpenAI error types
-            error_message = str(openai_error)
-            if "connection" in error_message.lower():
-                raise HTTPException(status_code=500, detail="Connection error: Unable to connect to OpenAI API. Please check your internet connection.")
-            elif "authentication" in error_message.lower() or "api key" in error_message.lower():
-                raise HTTPException(status_code=500, detail="Authentication error: Invalid OpenAI API key.")
-            elif "rate limit" in error_message.lower():
-                raise HTTPException(status_code=429, detail="Rate limit exceeded: OpenAI API rate limit reached. Please try again later.")
-            elif "timeout" in error_message.lower():
-                raise HTTPException(status_code=504, detail="Timeout error: OpenAI API request timed out. Please try again.")
-            else:
-                raise HTTPException(status_code=500, detail=f"OpenAI API error: {error_message}")
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse JSON response: {e}")
+        logger.error(f"Raw response: {content}")
+        raise HTTPException(status_code=500, detail="Failed to parse AI analysis response")
+
+def build_comparison_response(
+    analysis_results: dict,
+    bill_a_name: str,
+    bill_b_name: str,
+    analysis_key: str,
+    cached: bool,
+    normalization: Optional[dict] = None,
+    coalesced: bool = False,
+    grounding: Optional[dict] = None
+) -> dict:
+    """
+    Shape analysis results into the ComparisonResponse payload.
+    
+    Args:
+        analysis_results: Parsed analysis JSON
+        bill_a_name: Filename of the first document
+        bill_b_name: Filename of the second document
+        analysis_key: Analysis cache key of the pair
+        cached: Whether the analysis came from the cache
+        normalization: Per-document normalization statistics, if any
+        coalesced: Whether the result was shared with an identical in-flight request
+        grounding: Quote verification counts, if quotes were checked
         
-        # Parse the response
-        content = response.choices[0].message.content
-        logger.info(f"Received response from OpenAI: {len(content)} characters")
+    Returns:
+        dict: Response data
+    """
+    response = {
+        "executive_summary": analysis_results.get("executive_summary", {}),
+        "stakeholder_analysis": analysis_results.get("stakeholder_analysis", []),
+        "impact_forecast": analysis_results.get("impact_forecast", {}),
+        "metadata": {
+            "bill_a_name": bill_a_name,
+            "bill_b_name": bill_b_name,
+            "processed_at": datetime.now().isoformat(),
+            "analysis_key": analysis_key,
+            "cached": cached,
+            "coalesced": coalesced
+        }
+    }
+    if normalization:
+        response["metadata"]["normalization"] = normalization
+    if grounding:
+        response["metadata"]["grounding"] = grounding
+    return response
+
+async def stream_completion(prompt: str) -> AsyncIterator[str]:
+    """
+    Stream an analysis completion through the LLM scheduler.
+    
+    Records time to first token, total LLM time and the reported token usage.
+    Use it inside contextlib.aclosing so the scheduler slot is released
+    promptly if the consumer stops early.
+    
+    Args:
+        prompt: Prompt built by build_analysis_prompt
         
-        # Try to extract JSON from the response
-        try:
-            # Look for JSON in the response
-            start_idx = content.find('{')
-            end_idx = content.rfind('}') + 1
-            if start_idx != -1 and end_idx != 0:
-                json_str = content[start_idx:end_idx]
-                result = json.loads(json_str)
-                logger.info("Successfully parsed JSON response from OpenAI")
-            else:
-                logger.error(f"No JSON found in OpenAI response: {content[:500]}...")
-                raise ValueError("No JSON found in response")
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON response: {e}")
-            logger.error(f"Raw response: {content}")
-            raise HTTPException(status_code=500, detail="Failed to parse AI analysis response")
+    Yields:
+        str: Content deltas of the completion
+    """
+    client = llm_pool.client
+    estimated_tokens = analysis_token_estimate(prompt)
+    started = time.perf_counter()
+    sent = started
+    
+    async def call():
+        nonlocal sent
+        sent = time.perf_counter()
+        return await client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=analysis_messages(prompt),
+            temperature=ANALYSIS_TEMPERATURE,
+            max_tokens=ANALYSIS_MAX_TOKENS,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+    
+    usage = None
+    first_token = True
+    try:
+        # The scheduler slot is held until the stream is consumed
+        async with llm_scheduler.session(call, estimated_tokens) as completion:
+            async for chunk in completion:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if first_token:
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - sent)
+                    first_token = False
+                yield delta
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - started)
+    llm_scheduler.record_usage(estimated_tokens, record_usage(usage))
+
+async def request_analysis(prompt: str) -> dict:
+    """
+    Send one analysis prompt to OpenAI and parse the JSON result.
+    
+    The completion is streamed only to measure time to first token; the
+    text is collected and parsed as a whole.
+    
+    Args:
+        prompt: Prompt built by build_analysis_prompt
+        
+    Returns:
+        dict: Parsed analysis results
+    """
+    logger.info(f"Prompt length: {len(prompt)} characters")
+    logger.info(f"Using OpenAI model: {OPENAI_MODEL}")
+    
+    # Call OpenAI API with better error handling
+    try:
+        logger.info("Making OpenAI API call...")
+        async with aclosing(stream_completion(prompt)) as deltas:
+            content = "".join([delta async for delta in deltas])
+        logger.info("OpenAI API call completed successfully")
+        
+    except Exception as openai_error:
+        raise openai_error_to_http(openai_error)
+    
+    logger.info(f"Received response from OpenAI: {len(content)} characters")
+    
+    # Try to extract JSON from the response
+    return parse_analysis_content(content)
+
+async def summarize_analyses(partials: List[dict]) -> dict:
+    """
+    Merge chunk analyses, then condense their merged assessment and forecasts with one more call.
+    
+    When the summary call fails, the merged (deduplicated and capped) texts are kept.
+    
+    Args:
+        partials: Parsed analysis JSON of each chunk, in chunk order
+        
+    Returns:
+        dict: Analysis in the same shape as a single-call result
+    """
+    merged = merge_analyses(partials)
+    if len(partials) == 1 or not ANALYSIS_SUMMARY:
+        return merged
+    logger.info(f"Summarizing the analyses of {len(partials)} chunks")
+    try:
+        summary = await request_analysis(build_summary_prompt(merged, len(partials)))
+    except HTTPException as e:
+        logger.warning(f"Summary of chunk analyses failed, keeping the merged text: {e.detail}")
+        return merged
+    return apply_summary(merged, summary)
+
+async def analyze_documents_with_ai(bill_a_text: str, bill_b_text: str) -> dict:
+    """
+    Analyze two documents using OpenAI for comparison.
+    
+    Both bills are split along their sections into chunks under
+    CHUNK_TOKEN_BUDGET; the chunks are analysed concurrently (at most
+    ANALYSIS_CONCURRENCY at a time), the partial results merged and their
+    free text summarized.
+    
+    Args:
+        bill_a_text: Text from the first document
+        bill_b_text: Text from the second document
+        
+    Returns:
+        dict: Analysis results
+    """
+    try:
+        logger.info("Starting AI analysis of documents")
+        
+        # Check if API key is available
+        if not OPENAI_API_KEY:
+            logger.error("OpenAI API key is not configured")
+            raise HTTPException(status_code=500, detail="OpenAI API key is not configured")
+        
+        prompts = build_chunk_prompts(bill_a_text, bill_b_text)
+        logger.info(f"Analyzing {len(prompts)} chunk(s) with concurrency {ANALYSIS_CONCURRENCY}")
+        semaphore = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+        
+        async def analyze_chunk(prompt: str) -> dict:
+            async with semaphore:
+                return await request_analysis(prompt)
+        
+        partials = await asyncio.gather(*(analyze_chunk(prompt) for _, prompt in prompts))
+        result = await summarize_analyses(list(partials))
         
         logger.info("AI analysis completed successfully")
         return result
@@ -250,6 +885,187 @@ def analyze_documents_with_ai(bill_a_text: str, bill_b_text: str) -> dict:
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"AI analysis failed: {str(e)}")
 
+def normalization_report(bill_a: ExtractionResult, bill_b: ExtractionResult) -> Optional[dict]:
+    """Normalization statistics of both documents, or None when normalization is off."""
+    if bill_a.normalization is None and bill_b.normalization is None:
+        return None
+    return {"bill_a": bill_a.normalization, "bill_b": bill_b.normalization}
+
+def check_quotes(analysis_results: dict, bill_a: ExtractionResult, bill_b: ExtractionResult) -> dict:
+    """Annotate the quotes of an analysis with their verification and citation; returns the counts."""
+    started = time.perf_counter()
+    counts = ground_analysis(analysis_results, quote_indexes.get(bill_a), quote_indexes.get(bill_b))
+    elapsed = time.perf_counter() - started
+    QUOTE_GROUNDING_SECONDS.observe(elapsed)
+    for match in ("exact", "fuzzy", "unverified"):
+        QUOTES_CHECKED.inc(counts[match], match=match)
+    logger.info(f"Grounded quotes: {counts['verified']}/{counts['quotes']} verified in {elapsed * 1000:.1f}ms")
+    return {**counts, "elapsed_ms": round(elapsed * 1000, 2)}
+
+async def ground_quotes(analysis_results: dict, bill_a: ExtractionResult, bill_b: ExtractionResult) -> Optional[dict]:
+    """check_quotes off the event loop (index builds take a while on large bills); None when disabled."""
+    if not QUOTE_GROUNDING:
+        return None
+    return await run_in_pdf_executor(check_quotes, analysis_results, bill_a, bill_b)
+
+def upload_hash(pdf_file: UploadFile) -> str:
+    """SHA-256 of an upload, read in place."""
+    started = time.perf_counter()
+    with upload_buffer(pdf_file.file) as (content, _):
+        digest = content_hash(content)
+    UPLOAD_READ_SECONDS.observe(time.perf_counter() - started)
+    return digest
+
+async def upload_source(pdf_file: UploadFile) -> DocumentSource:
+    """
+    Comparison input backed by an admitted upload, hashed once on the extraction executor.
+    
+    The source takes ownership of the spooled upload: a coalesced comparison
+    keeps extracting it after the request that uploaded it has ended.
+    """
+    sha256 = await run_in_pdf_executor(upload_hash, pdf_file)
+    upload = detach_upload(pdf_file)
+    return DocumentSource(
+        name=upload.filename,
+        sha256=sha256,
+        load=lambda: extract_pdf_async(upload, digest=sha256),
+        close=upload.close
+    )
+
+def registered_source(doc_id: str) -> DocumentSource:
+    """Comparison input backed by a registered document; 404 if there is none."""
+    info = document_store.get(doc_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Unknown document: {doc_id}")
+    
+    async def load() -> ExtractionResult:
+        result = await run_in_pdf_executor(document_store.load, doc_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"Unknown document: {doc_id}")
+        return result
+    
+    return DocumentSource(name=info.filename, sha256=info.sha256, load=load)
+
+async def close_sources(*sources: DocumentSource):
+    """Release the uploads owned by comparison inputs."""
+    for source in sources:
+        if source.close is not None:
+            await source.close()
+
+async def gather_sources(*pending: Awaitable[DocumentSource]) -> List[DocumentSource]:
+    """Resolve the sides of a comparison concurrently; if one fails, close the others before re-raising."""
+    sources = await asyncio.gather(*pending, return_exceptions=True)
+    error = next((source for source in sources if isinstance(source, BaseException)), None)
+    if error is not None:
+        await close_sources(*(source for source in sources if isinstance(source, DocumentSource)))
+        raise error
+    return sources
+
+async def analyze_pair(bill_a_source: DocumentSource, bill_b_source: DocumentSource) -> dict:
+    """
+    Extract (or load) both documents and analyze them, reusing cached analyses.
+    
+    The outcome does not depend on the file names, so it can be shared by
+    coalesced requests.
+    
+    Args:
+        bill_a_source: First document
+        bill_b_source: Second document
+        
+    Returns:
+        dict: `analysis`, `analysis_key`, `cached`, `normalization` and `grounding`
+    """
+    # Extract text from both PDFs
+    logger.info("=== EXTRACTING TEXT FROM FILES ===")
+    started = time.perf_counter()
+    
+    # Both bills are parsed concurrently on the extraction executor;
+    # registered documents are read from the document store instead
+    bill_a, bill_b = await asyncio.gather(bill_a_source.load(), bill_b_source.load())
+    bill_a_text, bill_b_text = bill_a.text, bill_b.text
+    
+    extraction_time = (time.perf_counter() - started) * 1000
+    logger.info(f"=== TEXT EXTRACTION COMPLETED ===")
+    logger.info(f"Extraction time: {extraction_time:.0f}ms")
+    logger.info(f"Text extracted: Bill A ({len(bill_a_text)} chars), Bill B ({len(bill_b_text)} chars)")
+    
+    # Reuse a previous analysis of the same pair when available
+    analysis_key = analysis_cache_key(bill_a_text, bill_b_text)
+    cached_analysis = analysis_cache.get(analysis_key)
+    
+    if cached_analysis is not None:
+        logger.info(f"Analysis cache hit ({analysis_key[:12]}), skipping AI analysis")
+        analysis_results = json.loads(cached_analysis)
+    else:
+        # Check OpenAI configuration
+        if not os.getenv("OPENAI_API_KEY"):
+            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+        
+        # Perform AI analysis
+        logger.info("Running AI analysis...")
+        analysis_results = await analyze_documents_with_ai(bill_a_text, bill_b_text)
+        analysis_cache.set(analysis_key, json.dumps(analysis_results))
+    
+    # Quotes are checked on every response, so cached analyses get citations too
+    grounding = await ground_quotes(analysis_results, bill_a, bill_b)
+    
+    return {
+        "analysis": analysis_results,
+        "analysis_key": analysis_key,
+        "cached": cached_analysis is not None,
+        "normalization": normalization_report(bill_a, bill_b),
+        "grounding": grounding
+    }
+
+async def run_comparison(bill_a_source: DocumentSource, bill_b_source: DocumentSource) -> dict:
+    """
+    Compare two documents, joining an identical comparison already in flight.
+    
+    Concurrent requests for the same pair of documents (by content hash,
+    whether uploaded or registered) and model share one extraction and one
+    analysis.
+    
+    Args:
+        bill_a_source: First document
+        bill_b_source: Second document
+        
+    Returns:
+        dict: ComparisonResponse payload
+    """
+    flight_key = f"{bill_a_source.sha256}:{bill_b_source.sha256}:{OPENAI_MODEL}"
+    handed_over = False
+    
+    async def analyze_owned_pair() -> dict:
+        try:
+            return await analyze_pair(bill_a_source, bill_b_source)
+        finally:
+            await close_sources(bill_a_source, bill_b_source)
+    
+    def lead() -> Awaitable[dict]:
+        nonlocal handed_over
+        handed_over = True
+        return analyze_owned_pair()
+    
+    try:
+        outcome, coalesced = await comparison_flights.run(flight_key, lead)
+    finally:
+        # The shared run closes the inputs it was given, even if this request
+        # is cancelled first; a follower's inputs were never used
+        if not handed_over:
+            await close_sources(bill_a_source, bill_b_source)
+    
+    # Prepare response
+    return build_comparison_response(
+        outcome["analysis"],
+        bill_a_source.name,
+        bill_b_source.name,
+        outcome["analysis_key"],
+        cached=outcome["cached"],
+        normalization=outcome["normalization"],
+        coalesced=coalesced,
+        grounding=outcome["grounding"]
+    )
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
@@ -263,9 +1079,24 @@ async def health_check():
         "ok": True,
         "openai": openai_configured,
         "model": OPENAI_MODEL,
+        "pool": llm_pool.get_stats(),
+        "cache": {name: cache.stats() for name, cache in caches.items()},
+        "jobs": job_queue.metrics(),
+        "coalescing": comparison_flights.stats(),
+        "documents": document_store.stats(),
+        "grounding": {"enabled": QUOTE_GROUNDING, "indexes": quote_indexes.stats()},
+        "extraction": engine_selector.stats(),
+        "scheduler": llm_scheduler.stats(),
+        "profiling": request_profiler.stats(),
+        "startup": startup_timer.stats(),
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics in the text exposition format."""
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/test-openai")
 async def test_openai():
     """Test OpenAI API connectivity."""
@@ -274,32 +1105,25 @@ async def test_openai():
             return {"error": "OpenAI API key not configured", "status": "failed"}
         
         logger.info("Testing OpenAI API connectivity...")
-        import httpx
-
-        # Use custom HTTP client for better connectivity
-        http_client = httpx.Client(
-            timeout=120.0,
-            follow_redirects=True,
-            verify=True
-        )
-        
-        client = OpenAI(
-            api_key=OPENAI_API_KEY,
-            timeout=120.0,  # 2 minute timeout for test
-            max_retries=3,
-            http_client=http_client
+        # Reuse the pooled client with a shorter timeout for the test
+        client = llm_pool.client.with_options(
+            timeout=120.0  # 2 minute timeout for test
         )
         
-        # Simple test request
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "user", "content": "Say 'Hello' in JSON format like {\"message\": \"Hello\"}"}
-            ],
-            temperature=0,
-            max_tokens=50
+        # Simple test request; retries are handled by the scheduler
+        response = await llm_scheduler.run(
+            lambda: client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=[
+                    {"role": "user", "content": "Say 'Hello' in JSON format like {\"message\": \"Hello\"}"}
+                ],
+                temperature=0,
+                max_tokens=50
+            ),
+            estimated_tokens=70
         )
         
+        record_usage(response.usage)
         content = response.choices[0].message.content
         logger.info(f"OpenAI test successful: {content}")
         
@@ -319,10 +1143,80 @@ async def test_openai():
             "timestamp": datetime.now().isoformat()
         }
 
+@app.delete("/admin/cache/{cache_name}")
+async def invalidate_cache(
+    cache_name: str,
+    key: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Invalidate cache entries. Removes a single entry when `key` is given
+    (e.g. the `analysis_key` from a comparison's metadata), otherwise clears the cache.
+    """
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    
+    cache = caches.get(cache_name)
+    if cache is None:
+        raise HTTPException(status_code=404, detail=f"Unknown cache: {cache_name}")
+    
+    if key:
+        removed = 1 if cache.invalidate(key) else 0
+    else:
+        removed = cache.clear()
+    
+    logger.info(f"Invalidated {removed} entries from cache '{cache_name}'")
+    return {"cache": cache_name, "removed": removed, "timestamp": datetime.now().isoformat()}
+
+@app.delete("/admin/documents/{doc_id}")
+async def delete_document(doc_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Remove a registered document and its stored pages."""
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    if not await run_in_pdf_executor(document_store.delete, doc_id):
+        raise HTTPException(status_code=404, detail=f"Unknown document: {doc_id}")
+    logger.info(f"Deleted document {doc_id}")
+    return {"id": doc_id, "deleted": True, "timestamp": datetime.now().isoformat()}
+
+@app.get("/admin/profiles")
+async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    """List retained request profiles, newest first."""
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    return {"profiles": request_profiler.list()}
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """
+    Download a profile as folded stacks, e.g. for
+    `flamegraph.pl profile.folded > profile.svg` or speedscope.
+    """
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    path = request_profiler.path_for(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile: {profile_id}")
+    with open(path, "rb") as f:
+        return Response(content=f.read(), media_type="text/plain; charset=utf-8")
+
 @app.post("/api/test-pdf")
-async def test_pdf_extraction(file: UploadFile = File(...)):
+async def test_pdf_extraction(
+    file: UploadFile = File(...),
+    metadata_only: bool = False,
+    full_text: bool = False,
+    pages: Optional[str] = None,
+    start: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+):
     """
     Test endpoint for PDF text extraction.
+    
+    Returns extraction metadata and a short preview. Text is returned in
+    windows: `pages=3-7`, or `limit` characters from `start`, continued with
+    the `nextCursor` of the previous window (the re-uploaded file is served
+    from the text cache). `full_text=true` adds the whole text as `fullText`;
+    `metadata_only=true` also drops the preview.
     """
     try:
         logger.info(f"=== PDF TEST ENDPOINT STARTED ===")
@@ -330,88 +1224,466 @@ async def test_pdf_extraction(file: UploadFile = File(...)):
         
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="File must be a PDF")
+        window = text_window_params(pages, start, limit, cursor)
         
-        start_time = datetime.now()
-        extracted_text = pdf_to_text(file)
-        end_time = datetime.now()
+        started = time.perf_counter()
+        [admission] = await admit_uploads(file)
+        extraction = await extract_pdf_async(file)
+        extracted_text = extraction.text
         
-        processing_time = (end_time - start_time).total_seconds() * 1000  # Convert to milliseconds
+        processing_time = (time.perf_counter() - started) * 1000  # Convert to milliseconds
         
         logger.info(f"PDF extraction completed in {processing_time:.0f}ms")
         
-        return {
+        response_data = {
             "success": True,
             "filename": file.filename,
             "fileSize": file.size,
             "textLength": len(extracted_text),
             "processingTimeMs": int(processing_time),
-            "preview": extracted_text[:500] + ("..." if len(extracted_text) > 500 else ""),
-            "fullText": extracted_text
+            "pageCount": extraction.page_count,
+            "pagesPerSecond": round(extraction.pages_per_second, 1),
+            "extractionWorkers": extraction.workers,
+            "peakMemoryMb": round(extraction.peak_memory_bytes / (1024 * 1024), 1),
+            "normalization": extraction.normalization,
+            "engine": extraction.engine,
+            "quality": extraction.quality,
+            "admission": admission.to_dict()
         }
+        if not metadata_only:
+            response_data["preview"] = extracted_text[:500] + ("..." if len(extracted_text) > 500 else "")
+        if window is not None:
+            try:
+                response_data["text"] = extraction_window(extraction, window)
+            except TextRangeError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        if full_text:
+            response_data["fullText"] = extracted_text
+        
+        return json_response(response_data, route="/api/test-pdf")
         
+    except HTTPException:
+        # Admission and extraction errors already carry the right status (400, 413, 422)
+        raise
     except Exception as e:
         logger.error(f"=== PDF TEST ENDPOINT ERROR === {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def comparison_upload(pdf_file: Optional[UploadFile], doc_id: Optional[str], side: str) -> Optional[UploadFile]:
+    """Check one side of a comparison; returns its upload, or None when it is a registered document."""
+    if doc_id:
+        return None
+    if pdf_file is None:
+        raise HTTPException(status_code=400, detail=f"Provide {side}_file or {side}_id")
+    if not pdf_file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Both files must be PDFs")
+    logger.info(f"File received: {pdf_file.filename} ({pdf_file.size} bytes)")
+    return pdf_file
+
+async def comparison_source(pdf_file: Optional[UploadFile], doc_id: Optional[str]) -> DocumentSource:
+    """Resolve one side of a comparison from a registered document ID or an admitted upload."""
+    if doc_id:
+        return registered_source(doc_id)
+    return await upload_source(pdf_file)
+
 @app.post("/api/compare")
 async def compare_documents(
-    bill_a_file: UploadFile = File(...),
-    bill_b_file: UploadFile = File(...)
+    bill_a_file: Optional[UploadFile] = File(None),
+    bill_b_file: Optional[UploadFile] = File(None),
+    bill_a_id: Optional[str] = Form(None),
+    bill_b_id: Optional[str] = Form(None)
 ):
     """
     Compare two PDF documents and provide AI analysis.
+    
+    Each side is either an uploaded file or the ID of a document registered
+    through /api/documents.
     """
     try:
         logger.info("=== STARTING DOCUMENT COMPARISON ===")
         
-        # Validate files
+        # Uploads are admitted before they are hashed or extracted
+        await admit_uploads(
+            comparison_upload(bill_a_file, bill_a_id, "bill_a"),
+            comparison_upload(bill_b_file, bill_b_id, "bill_b")
+        )
+        bill_a_source, bill_b_source = await gather_sources(
+            comparison_source(bill_a_file, bill_a_id),
+            comparison_source(bill_b_file, bill_b_id)
+        )
+        
+        response_data = await run_comparison(bill_a_source, bill_b_source)
+        
+        logger.info("=== DOCUMENT COMPARISON COMPLETED ===")
+        return json_response(response_data, route="/api/compare")
+        
+    except HTTPException:
+        # Re-raise HTTP exceptions as-is
+        raise
+    except Exception as e:
+        logger.error(f"=== API ERROR === {str(e)}")
+        logger.error(f"Error type: {type(e).__name__}")
+        logger.error(f"Error details: {e}")
+        import traceback
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+
+def store_document(pdf_file: UploadFile, sha256: str, extraction: ExtractionResult) -> DocumentInfo:
+    """Save an extracted upload, with its PDF bytes, to the document store."""
+    with upload_buffer(pdf_file.file) as (content, _):
+        return document_store.put(
+            sha256,
+            pdf_file.filename,
+            content,
+            extraction,
+            tokens=estimate_tokens(extraction.text),
+            normalized=TEXT_NORMALIZATION
+        )
+
+@app.post("/api/documents")
+async def register_document(file: UploadFile = File(...)):
+    """
+    Store a PDF, extracting and normalizing it once.
+    
+    Returns the document's content-derived `id` (201 when it was new, 200
+    when the same PDF was registered before) with its page count and text
+    statistics. Pass the ID as `bill_a_id`/`bill_b_id` to /api/compare
+    instead of uploading the file again.
+    """
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    
+    await admit_uploads(file)
+    sha256 = await run_in_pdf_executor(upload_hash, file)
+    info = document_store.get(document_id(sha256))
+    if info is not None:
+        return JSONResponse(content={**info.to_dict(), "created": False})
+    
+    extraction = await extract_pdf_async(file, digest=sha256)
+    info = await run_in_pdf_executor(store_document, file, sha256, extraction)
+    return JSONResponse(status_code=201, content={**info.to_dict(), "created": True})
+
+@app.get("/api/documents/{doc_id}")
+async def get_document(doc_id: str):
+    """Metadata of a registered document."""
+    info = document_store.get(doc_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Unknown document: {doc_id}")
+    return info.to_dict()
+
+@app.get("/api/documents/{doc_id}/pages/{page_number}")
+async def get_document_page(doc_id: str, page_number: int):
+    """Text of a single page (1-based) of a registered document."""
+    info = document_store.get(doc_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Unknown document: {doc_id}")
+    text = await run_in_pdf_executor(document_store.page, doc_id, page_number)
+    if text is None:
+        raise HTTPException(status_code=404, detail=f"Page {page_number} not found; the document has {info.page_count} pages")
+    return {"id": doc_id, "page": page_number, "pageCount": info.page_count, "text": text}
+
+@app.get("/api/documents/{doc_id}/text")
+async def get_document_text(
+    doc_id: str,
+    pages: Optional[str] = None,
+    start: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    """
+    A window of a registered document's text: `pages=3-7`, or `limit`
+    characters from `start` (the first window by default). Follow
+    `nextCursor` until it is null to read the rest. Only the pages that
+    overlap the window are read from the store.
+    """
+    info = document_store.get(doc_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Unknown document: {doc_id}")
+    window = text_window_params(pages, start, limit, cursor) or TextWindow()
+    
+    try:
+        if window.pages:
+            covering = await run_in_pdf_executor(document_store.pages_between, doc_id, *window.pages)
+            text = page_window(covering, window, info.page_count)
+        else:
+            covering = await run_in_pdf_executor(document_store.pages_covering, doc_id, window.start, window.start + window.limit)
+            text = char_window(covering, window, info.chars)
+    except TextRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return json_response({"id": doc_id, **text}, route="/api/documents/{doc_id}/text")
+
+# Largest page of hunks returned by /api/diff
+MAX_DIFF_PAGE_SIZE = 500
+
+@app.post("/api/diff")
+async def diff_documents(
+    bill_a_file: UploadFile = File(...),
+    bill_b_file: UploadFile = File(...),
+    offset: int = 0,
+    limit: int = 100,
+    context: int = DIFF_CONTEXT_LINES
+):
+    """
+    Line diff of two PDF documents, aligned section by section.
+    
+    Returns `limit` hunks starting at hunk `offset`; request the next page
+    with `offset=next_offset` until it is null. Extracted text is cached, so
+    later pages do not re-parse the PDFs.
+    """
+    try:
         if not bill_a_file.filename.lower().endswith('.pdf') or not bill_b_file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Both files must be PDFs")
+        if offset < 0 or not 1 <= limit <= MAX_DIFF_PAGE_SIZE or context < 0:
+            raise HTTPException(status_code=400, detail=f"offset and context must be >= 0 and limit between 1 and {MAX_DIFF_PAGE_SIZE}")
+        await admit_uploads(bill_a_file, bill_b_file)
         
-        logger.info(f"Files received: {bill_a_file.filename} ({bill_a_file.size} bytes), {bill_b_file.filename} ({bill_b_file.size} bytes)")
+        bill_a_text, bill_b_text = await asyncio.gather(
+            pdf_to_text_async(bill_a_file),
+            pdf_to_text_async(bill_b_file)
+        )
         
-        # Extract text from both PDFs
-        logger.info("=== EXTRACTING TEXT FROM FILES ===")
-        start_time = datetime.now()
+        # The diff is CPU-bound; keep it off the event loop
+        diff = await run_in_pdf_executor(diff_texts, bill_a_text, bill_b_text, context)
+        logger.info(f"Diffed {bill_a_file.filename} and {bill_b_file.filename}: {len(diff.hunks)} hunks in {diff.elapsed_seconds * 1000:.0f}ms")
         
-        bill_a_text = pdf_to_text(bill_a_file)
-        bill_b_text = pdf_to_text(bill_b_file)
+        return json_response({
+            "bill_a_name": bill_a_file.filename,
+            "bill_b_name": bill_b_file.filename,
+            **diff.page(offset, limit)
+        }, route="/api/diff")
         
-        extraction_time = (datetime.now() - start_time).total_seconds() * 1000
-        logger.info(f"=== TEXT EXTRACTION COMPLETED ===")
-        logger.info(f"Extraction time: {extraction_time:.0f}ms")
-        logger.info(f"Text extracted: Bill A ({len(bill_a_text)} chars), Bill B ({len(bill_b_text)} chars)")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"=== DIFF ERROR === {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Diff failed: {str(e)}")
+
+async def comparison_events(bill_a_file: UploadFile, bill_b_file: UploadFile) -> AsyncIterator[bytes]:
+    """
+    Run a comparison and yield NDJSON progress events.
+    
+    Events, in order: `started`, `extraction_progress` (per page and document),
+    `extraction_complete`, `llm_start`, `token` (streamed completion text),
+    `section` (each top-level result section as soon as it parses) and finally
+    `result` with the full ComparisonResponse. Failures end the stream with an
+    `error` event carrying the HTTP status and detail.
+    
+    Args:
+        bill_a_file: First uploaded PDF, owned by this generator
+        bill_b_file: Second uploaded PDF, owned by this generator
+    """
+    loop = asyncio.get_running_loop()
+    progress: asyncio.Queue = asyncio.Queue()
+    
+    def page_progress(document: str) -> Callable[[int, int], None]:
+        def on_page(page_number: int, page_count: int):
+            loop.call_soon_threadsafe(
+                progress.put_nowait,
+                stream_event("extraction_progress", document=document, page=page_number, pages=page_count)
+            )
+        return on_page
+    
+    try:
+        yield stream_event("started", bill_a_name=bill_a_file.filename, bill_b_name=bill_b_file.filename)
         
-        # Check OpenAI configuration
-        if not os.getenv("OPENAI_API_KEY"):
-            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+        # Both bills are parsed concurrently; forward page progress while they run
+        extraction = asyncio.ensure_future(asyncio.gather(
+            extract_pdf_async(bill_a_file, on_page=page_progress("bill_a")),
+            extract_pdf_async(bill_b_file, on_page=page_progress("bill_b"))
+        ))
+        while not extraction.done():
+            next_event = asyncio.ensure_future(progress.get())
+            await asyncio.wait({next_event, extraction}, return_when=asyncio.FIRST_COMPLETED)
+            if next_event.done():
+                yield next_event.result()
+            else:
+                next_event.cancel()
+        while not progress.empty():
+            yield progress.get_nowait()
+        bill_a, bill_b = extraction.result()
+        bill_a_text, bill_b_text = bill_a.text, bill_b.text
         
-        # Perform AI analysis
-        logger.info("Running AI analysis...")
-        analysis_results = analyze_documents_with_ai(bill_a_text, bill_b_text)
+        yield stream_event(
+            "extraction_complete",
+            bill_a_chars=len(bill_a_text),
+            bill_b_chars=len(bill_b_text),
+            bill_a_pages=bill_a.page_count,
+            bill_b_pages=bill_b.page_count,
+            normalization=normalization_report(bill_a, bill_b)
+        )
         
-        # Prepare response
-        response_data = {
-            "executive_summary": analysis_results.get("executive_summary", {}),
-            "stakeholder_analysis": analysis_results.get("stakeholder_analysis", []),
-            "impact_forecast": analysis_results.get("impact_forecast", {}),
-            "metadata": {
-                "bill_a_name": bill_a_file.filename,
-                "bill_b_name": bill_b_file.filename,
-                "processed_at": datetime.now().isoformat()
-            }
-        }
+        analysis_key = analysis_cache_key(bill_a_text, bill_b_text)
+        cached_analysis = analysis_cache.get(analysis_key)
         
-        logger.info("=== DOCUMENT COMPARISON COMPLETED ===")
-        return response_data
+        if cached_analysis is not None:
+            logger.info(f"Analysis cache hit ({analysis_key[:12]}), skipping AI analysis")
+            analysis_results = json.loads(cached_analysis)
+            for section in ANALYSIS_SECTIONS:
+                yield stream_event("section", name=section, data=analysis_results.get(section))
+        else:
+            if not OPENAI_API_KEY:
+                raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+            
+            prompts = build_chunk_prompts(bill_a_text, bill_b_text)
+            
+            if len(prompts) == 1:
+                # Single call: stream the completion token by token
+                prompt = prompts[0][1]
+                yield stream_event("llm_start", model=OPENAI_MODEL, prompt_chars=len(prompt), chunks=1, unchanged_sections=prompts[0][0].unchanged_sections)
+                
+                parser = SectionStreamParser()
+                try:
+                    async with aclosing(stream_completion(prompt)) as deltas:
+                        async for delta in deltas:
+                            yield stream_event("token", text=delta)
+                            for name, value in parser.feed(delta):
+                                if name in ANALYSIS_SECTIONS:
+                                    yield stream_event("section", name=name, data=value)
+                except Exception as openai_error:
+                    raise openai_error_to_http(openai_error)
+                
+                analysis_results = parse_analysis_content(parser.text)
+            else:
+                # Map-reduce: report each chunk as it finishes, then the merged sections
+                prompt_chars = sum(len(prompt) for _, prompt in prompts)
+                yield stream_event("llm_start", model=OPENAI_MODEL, prompt_chars=prompt_chars, chunks=len(prompts), unchanged_sections=prompts[0][0].unchanged_sections)
+                semaphore = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+                
+                async def analyze_chunk(index: int, prompt: str) -> Tuple[int, dict]:
+                    async with semaphore:
+                        return index, await request_analysis(prompt)
+                
+                partials: List[Optional[dict]] = [None] * len(prompts)
+                pending = [asyncio.ensure_future(analyze_chunk(index, prompt)) for index, (_, prompt) in enumerate(prompts)]
+                try:
+                    for finished in asyncio.as_completed(pending):
+                        index, partial = await finished
+                        partials[index] = partial
+                        yield stream_event("chunk_complete", index=index, completed=sum(p is not None for p in partials), chunks=len(prompts), sections=prompts[index][0].sections)
+                finally:
+                    for task in pending:
+                        task.cancel()
+                
+                analysis_results = await summarize_analyses(partials)
+                for section in ANALYSIS_SECTIONS:
+                    yield stream_event("section", name=section, data=analysis_results.get(section))
+            
+            analysis_cache.set(analysis_key, json.dumps(analysis_results))
         
+        grounding = await ground_quotes(analysis_results, bill_a, bill_b)
+        
+        response_data = build_comparison_response(
+            analysis_results,
+            bill_a_file.filename,
+            bill_b_file.filename,
+            analysis_key,
+            cached=cached_analysis is not None,
+            normalization=normalization_report(bill_a, bill_b),
+            grounding=grounding
+        )
+        yield stream_event("result", data=response_data)
+        
+    except HTTPException as e:
+        logger.error(f"=== STREAMING COMPARISON ERROR === {e.detail}")
+        yield stream_event("error", status=e.status_code, detail=e.detail)
     except Exception as e:
-        logger.error(f"=== API ERROR === {str(e)}")
-        logger.error(f"Error type: {type(e).__name__}")
-        logger.error(f"Error details: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+        logger.error(f"=== STREAMING COMPARISON ERROR === {str(e)}")
+        yield stream_event("error", status=500, detail=f"Processing failed: {str(e)}")
+    finally:
+        await bill_a_file.close()
+        await bill_b_file.close()
+
+@app.post("/api/compare/stream")
+async def compare_documents_stream(
+    bill_a_file: UploadFile = File(...),
+    bill_b_file: UploadFile = File(...)
+):
+    """
+    Streaming variant of /api/compare that emits NDJSON progress events.
+    """
+    if not bill_a_file.filename.lower().endswith('.pdf') or not bill_b_file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Both files must be PDFs")
+    # Rejected before the stream starts, so the caller gets a plain error response
+    await admit_uploads(bill_a_file, bill_b_file)
+    
+    logger.info(f"=== STARTING STREAMING COMPARISON === {bill_a_file.filename}, {bill_b_file.filename}")
+    
+    # The request's form is closed once this handler returns, so the
+    # generator takes ownership of the spooled uploads
+    return StreamingResponse(
+        comparison_events(detach_upload(bill_a_file), detach_upload(bill_b_file)),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def run_batch_comparison(bill_a_file: UploadFile, bill_b_file: UploadFile) -> dict:
+    """run_comparison with its OpenAI calls in the scheduler's batch lane."""
+    priority = LLM_PRIORITY.set("batch")
+    try:
+        bill_a_source, bill_b_source = await gather_sources(upload_source(bill_a_file), upload_source(bill_b_file))
+        return await run_comparison(bill_a_source, bill_b_source)
+    finally:
+        LLM_PRIORITY.reset(priority)
+
+@app.post("/api/jobs", status_code=202)
+async def create_comparison_job(
+    request: Request,
+    bill_a_file: UploadFile = File(...),
+    bill_b_file: UploadFile = File(...)
+):
+    """
+    Queue a comparison and return its job ID immediately.
+    
+    Returns 429 with a Retry-After header when the queue is full.
+    """
+    if not bill_a_file.filename.lower().endswith('.pdf') or not bill_b_file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Both files must be PDFs")
+    await admit_uploads(bill_a_file, bill_b_file)
+    
+    # The job outlives this request, so it takes ownership of the spooled uploads
+    bill_a = detach_upload(bill_a_file)
+    bill_b = detach_upload(bill_b_file)
+    
+    async def cleanup():
+        await bill_a.close()
+        await bill_b.close()
+    
+    job = Job(
+        run=lambda: run_batch_comparison(bill_a, bill_b),
+        cleanup=cleanup,
+        bill_a_name=bill_a.filename,
+        bill_b_name=bill_b.filename
+    )
+    
+    try:
+        job_queue.submit(job)
+    except QueueFull as e:
+        await cleanup()
+        logger.warning(f"Job queue full, rejecting comparison (retry after {e.retry_after}s)")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many comparisons in progress. Please retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": str(request.url_for("get_comparison_job", job_id=job.id))
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_comparison_job(job_id: str):
+    """
+    Status of a queued comparison; includes `result` once it has succeeded
+    or `error` if it failed.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+startup_timer.mark("imported")
 
 if __name__ == "__main__":
     import uvicorn
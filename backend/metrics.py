@@ -0,0 +1,310 @@
+"""
+Request IDs and Prometheus metrics.
+
+A small, dependency-free implementation of Prometheus counters, gauges and
+histograms, rendered in the text exposition format served by /metrics.
+Observations may come from the event loop and from executor threads alike.
+
+Every request gets an ID (the caller's X-Request-ID, or a new one) that is
+kept in a context variable and added to log records by RequestIdFilter.
+"""
+import logging
+import math
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans cache hits (sub-millisecond) to multi-minute LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REQUEST_ID: ContextVar[str] = ContextVar("request_id", default="-")
+
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Reuse a well-formed incoming X-Request-ID, otherwise generate one."""
+    if incoming and _VALID_REQUEST_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds `request_id` to every log record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = REQUEST_ID.get()
+        return True
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(_Metric):
+    """Current value that can go up and down."""
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets."""
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # bucket counts..., sum, count
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the monotonic duration of the block, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = []
+        for key, values in series:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {_format_value(values[-1])}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = Histogram(
+    "legiscompare_request_seconds",
+    "Time from receiving a request to sending its response headers.",
+    labelnames=("method", "route", "status")
+)
+UPLOAD_READ_SECONDS = Histogram(
+    "legiscompare_upload_read_seconds",
+    "Time to map an uploaded PDF and hash its content."
+)
+UPLOAD_ADMISSION_SECONDS = Histogram(
+    "legiscompare_upload_admission_seconds",
+    "Time to run the admission checks on one uploaded PDF.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+)
+UPLOADS_REJECTED = Counter(
+    "legiscompare_uploads_rejected_total",
+    "Uploads rejected before extraction, by reason.",
+    labelnames=("reason",)
+)
+PAGE_EXTRACTION_SECONDS = Histogram(
+    "legiscompare_page_extraction_seconds",
+    "Text extraction time of a single PDF page.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+EXTRACTION_SECONDS = Histogram(
+    "legiscompare_extraction_seconds",
+    "Time to extract and normalize one document, by cache outcome.",
+    labelnames=("cache",)
+)
+EXTRACTION_ENGINE_RUNS = Counter(
+    "legiscompare_extraction_engine_runs_total",
+    "Document extractions by engine and outcome (accepted, rejected, failed, remembered).",
+    labelnames=("engine", "outcome")
+)
+PROMPT_BUILD_SECONDS = Histogram(
+    "legiscompare_prompt_build_seconds",
+    "Time to plan chunks and build the analysis prompts of a comparison.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+)
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    "legiscompare_llm_first_token_seconds",
+    "Time from sending a chat completion to receiving its first content token."
+)
+LLM_SECONDS = Histogram(
+    "legiscompare_llm_seconds",
+    "Total time of a chat completion, including scheduler queueing and retries."
+)
+LLM_TOKENS = Counter(
+    "legiscompare_llm_tokens_total",
+    "Tokens reported by the OpenAI usage field.",
+    labelnames=("type",)
+)
+JSON_PARSE_SECONDS = Histogram(
+    "legiscompare_json_parse_seconds",
+    "Time to parse a model response into analysis JSON.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5)
+)
+SERIALIZATION_SECONDS = Histogram(
+    "legiscompare_response_serialization_seconds",
+    "Time to serialize a JSON response body.",
+    labelnames=("route",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+)
+JOB_QUEUE_DEPTH = Gauge(
+    "legiscompare_job_queue_depth",
+    "Jobs waiting for a worker."
+)
+JOBS_RUNNING = Gauge(
+    "legiscompare_jobs_running",
+    "Jobs currently being processed."
+)
+JOB_WAIT_SECONDS = Histogram(
+    "legiscompare_job_wait_seconds",
+    "Time a job spent queued before a worker started it."
+)
+JOBS = Counter(
+    "legiscompare_jobs_total",
+    "Submitted jobs by outcome (rejected, succeeded, failed).",
+    labelnames=("outcome",)
+)
+FLIGHT_RUNS = Counter(
+    "legiscompare_flight_runs_total",
+    "Coalesced work by role: leader runs the work, coalesced joins a run in flight (a saved call).",
+    labelnames=("flight", "role")
+)
+FLIGHTS_IN_PROGRESS = Gauge(
+    "legiscompare_flights_in_progress",
+    "Distinct runs currently in flight.",
+    labelnames=("flight",)
+)
+QUOTE_GROUNDING_SECONDS = Histogram(
+    "legiscompare_quote_grounding_seconds",
+    "Time to check the quotes of an analysis against both documents, including index builds.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+)
+QUOTES_CHECKED = Counter(
+    "legiscompare_quotes_checked_total",
+    "Model quotes checked against the source documents, by outcome.",
+    labelnames=("match",)
+)
+
+
+def record_usage(usage) -> Optional[int]:
+    """Count the tokens of an OpenAI `usage` object; returns the total, if reported."""
+    if usage is None:
+        return None
+    LLM_TOKENS.inc(usage.prompt_tokens or 0, type="prompt")
+    LLM_TOKENS.inc(usage.completion_tokens or 0, type="completion")
+    return usage.total_tokens
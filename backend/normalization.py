@@ -0,0 +1,248 @@
+"""
+Boilerplate stripping for extracted bill text.
+
+Congressional PDFs repeat a running header and footer on every page, carry
+GPO "VerDate" production stamps, number the lines of introduced bills in the
+margin and hyphenate words across line breaks. None of that helps the model
+or the diff, so it is removed between extraction and analysis:
+
+- lines that recur at the top or bottom of most pages (compared with digits
+  masked, so "H. R. 748—6" and "H. R. 748—7" count as the same header),
+- VerDate stamps and leading bill-version stamps such as "•HR 1 EH1S",
+- bare page numbers, and margin line numbers on pages that have them:
+  introduced bills print them at the start of each line ("3 the Secretary"),
+  engrossed and enrolled ones at the end ("by the 1", or "de- 2" and "au-5"
+  after a hyphen); a page counts as numbered when most of its lines count
+  up in one of the two positions,
+- hyphens at the end of a line when the next line continues the word (the
+  margin number is removed first, so "em-" + "ployment" is still joined),
+- runs of spaces and blank lines.
+
+Pages are normalized independently so per-page offsets stay meaningful.
+normalize_stream() works on a page stream: running headers are found by
+comparing each page's edge lines with those of the NORMALIZE_WINDOW_PAGES
+pages on either side, so only that window is held in memory, and a header
+that changes between parts of a long bill is still recognized.
+"""
+import math
+import os
+import re
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Deque, Iterable, Iterator, List, Optional, Set, Tuple
+
+from chunking import CHARS_PER_TOKEN
+from extraction import PAGE_SEPARATOR, PageStream, PageText, offset_pages
+
+# Fraction of pages a top/bottom line must appear on to count as a running header
+NORMALIZE_REPEAT_FRACTION = float(os.getenv("NORMALIZE_REPEAT_FRACTION", "0.5"))
+
+# Pages on each side of a page whose edge lines are compared with its own
+NORMALIZE_WINDOW_PAGES = int(os.getenv("NORMALIZE_WINDOW_PAGES", "16"))
+
+# Bump whenever the rules change, so text normalized by the old rules is not served from the cache
+NORMALIZATION_VERSION = "2"
+
+# Documents shorter than this keep their edge lines (too few pages to tell)
+NORMALIZE_MIN_PAGES = 4
+
+# Lines at each end of a page that may hold a running header or footer
+EDGE_LINES = 3
+
+DIGITS = re.compile(r"\d+")
+SPACES = re.compile(r"[ \t ]+")
+VERDATE = re.compile(r"^VerDate\b|\bJkt \d+ PO \d+ Frm \d+\b")
+BILL_STAMP = re.compile(r"^•\s*[HS]\.?\s?(?:R\.?|J\.?\s?RES\.?|CON\.?\s?RES\.?|RES\.?)?\s*\d+\s+[A-Z0-9]+\s*")
+PAGE_NUMBER = re.compile(r"^\d{1,4}$")
+MARGIN_NUMBER = re.compile(r"^(\d{1,2})\s+(?=\S)")
+TRAILING_MARGIN_NUMBER = re.compile(r"(?:(?<=\S)\s+|(?<=-))(\d{1,2})$")
+HYPHENATED = re.compile(r"[A-Za-z]-$")
+
+
+@dataclass
+class NormalizationStats:
+    """What normalization removed and how much text it saved."""
+    chars_before: int = 0
+    chars_after: int = 0
+    repeated_lines_removed: int = 0
+    stamps_removed: int = 0
+    line_numbers_removed: int = 0
+    hyphens_joined: int = 0
+
+    @property
+    def tokens_before(self) -> int:
+        return math.ceil(self.chars_before / CHARS_PER_TOKEN)
+
+    @property
+    def tokens_after(self) -> int:
+        return math.ceil(self.chars_after / CHARS_PER_TOKEN)
+
+    def to_dict(self) -> dict:
+        saved = self.chars_before - self.chars_after
+        return {
+            "chars_before": self.chars_before,
+            "chars_after": self.chars_after,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "saved_percent": round(saved / self.chars_before * 100, 1) if self.chars_before else 0.0,
+            "repeated_lines_removed": self.repeated_lines_removed,
+            "stamps_removed": self.stamps_removed,
+            "line_numbers_removed": self.line_numbers_removed,
+            "hyphens_joined": self.hyphens_joined,
+        }
+
+
+def _edge_key(line: str) -> str:
+    return DIGITS.sub("#", SPACES.sub(" ", line).strip())
+
+
+def _edge_keys(lines: List[str]) -> Set[str]:
+    """Digit-masked lines at the top and bottom of a page, where headers and footers sit."""
+    edges = [line for line in lines if line.strip()]
+    return {key for key in map(_edge_key, edges[:EDGE_LINES] + edges[-EDGE_LINES:]) if key}
+
+
+def _repeated_edge_lines(counts: Counter, pages: int) -> Set[str]:
+    """Edge lines found on enough of `pages` pages to be headers/footers."""
+    if pages < NORMALIZE_MIN_PAGES:
+        return set()
+    threshold = max(NORMALIZE_MIN_PAGES, math.ceil(pages * NORMALIZE_REPEAT_FRACTION))
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def _margin_numbers(lines: List[str]) -> Optional[re.Pattern]:
+    """
+    The margin line number pattern of a page, or None when its lines are not numbered.
+
+    A page is numbered when most of its lines start (MARGIN_NUMBER) or end
+    (TRAILING_MARGIN_NUMBER) with a number one higher than the line before.
+    """
+    for pattern in (MARGIN_NUMBER, TRAILING_MARGIN_NUMBER):
+        numbered = 0
+        previous = None
+        for line in lines:
+            match = pattern.search(line.strip())
+            number = int(match.group(1)) if match else None
+            if number is not None and previous is not None and number == previous + 1:
+                numbered += 1
+            previous = number
+        if numbered >= 5 and numbered >= len(lines) // 2:
+            return pattern
+    return None
+
+
+def _normalize_page(lines: List[str], repeated: Set[str], stats: NormalizationStats) -> str:
+    numbering = _margin_numbers(lines)
+    out: List[str] = []
+    for raw in lines:
+        line = SPACES.sub(" ", raw).strip()
+        if not line:
+            if out and out[-1]:
+                out.append("")
+            continue
+        if repeated and _edge_key(line) in repeated:
+            stats.repeated_lines_removed += 1
+            continue
+        if VERDATE.search(line):
+            stats.stamps_removed += 1
+            continue
+        if PAGE_NUMBER.match(line):
+            stats.line_numbers_removed += 1
+            continue
+        stamp = BILL_STAMP.match(line)
+        if stamp:
+            stats.stamps_removed += 1
+            line = line[stamp.end():]
+        if numbering is not None:
+            margin = numbering.search(line)
+            if margin:
+                stats.line_numbers_removed += 1
+                line = line[:margin.start()] + line[margin.end():]
+        if out and HYPHENATED.search(out[-1]) and line[:1].islower():
+            # "com-" + "pensation" -> "compensation"
+            stats.hyphens_joined += 1
+            out[-1] = out[-1][:-1] + line
+            continue
+        out.append(line)
+    while out and not out[-1]:
+        out.pop()
+    return "\n".join(out)
+
+
+def normalize_stream(
+    pages: Iterable[PageText],
+    stats: Optional[NormalizationStats] = None,
+    window: int = NORMALIZE_WINDOW_PAGES
+) -> Iterator[PageText]:
+    """
+    Strip boilerplate from a stream of pages, yielding each page once the
+    `window` pages after it have been read.
+
+    Args:
+        pages: Raw extracted pages, in order
+        stats: Statistics to add to; they count the characters of the joined
+            document before and after
+        window: Pages on each side of a page that decide its running headers
+
+    Yields:
+        PageText: Normalized pages, with offsets in the normalized joined text
+    """
+    if stats is None:
+        stats = NormalizationStats()
+    counts: Counter = Counter()  # Edge lines of the pages in the window
+    ahead: Deque[Tuple[PageText, List[str], Set[str]]] = deque()
+    behind: Deque[Set[str]] = deque()
+
+    def normalize_next() -> Tuple[str, float]:
+        page, lines, keys = ahead.popleft()
+        repeated = _repeated_edge_lines(counts, len(behind) + 1 + len(ahead))
+        text = _normalize_page(lines, repeated, stats)
+        stats.chars_before += len(page.text) + len(PAGE_SEPARATOR)
+        stats.chars_after += len(text) + len(PAGE_SEPARATOR)
+        behind.append(keys)
+        if len(behind) > window:
+            for key in behind.popleft():
+                counts[key] -= 1
+                if not counts[key]:
+                    del counts[key]
+        return text, page.seconds
+
+    def normalized_texts() -> Iterator[Tuple[str, float]]:
+        for page in pages:
+            lines = page.text.splitlines()
+            keys = _edge_keys(lines)
+            counts.update(keys)
+            ahead.append((page, lines, keys))
+            if len(ahead) > window:
+                yield normalize_next()
+        while ahead:
+            yield normalize_next()
+
+    return offset_pages(normalized_texts())
+
+
+def normalize_page_stream(stream: PageStream) -> PageStream:
+    """Add normalization to a page stream; `stream.normalization` is set once it is consumed."""
+
+    def stage(pages: Iterator[PageText]) -> Iterator[PageText]:
+        stats = NormalizationStats()
+        yield from normalize_stream(pages, stats)
+        stream.normalization = stats.to_dict()
+
+    return stream.pipe(stage)
+
+
+def normalize_pages(page_texts: List[str]) -> Tuple[List[str], NormalizationStats]:
+    """
+    Strip boilerplate from every page of a document; collects normalize_stream().
+
+    Args:
+        page_texts: Raw extracted text of each page, in order
+
+    Returns:
+        (normalized page texts, statistics); the statistics count the
+        characters of the joined document before and after
+    """
+    stats = NormalizationStats()
+    pages = normalize_stream(offset_pages((text, 0.0) for text in page_texts), stats)
+    return [page.text for page in pages], stats
@@ -0,0 +1,251 @@
+"""
+Opt-in request profiling with flamegraph-ready output.
+
+A request to a profiled route is profiled when the caller asks for it
+(an `X-Profile: 1` header or `?profile=1`, together with the admin token)
+or when it is picked by 1-in-N sampling (PROFILE_SAMPLE_EVERY).
+
+The profiler is a stack sampler: a background thread snapshots the Python
+stack of every thread at a fixed interval, so its cost depends on the
+interval rather than on how much code the request runs, and it backs off
+further when a snapshot itself gets expensive. Stacks are written in the
+"folded" format (`thread;outer;...;inner count` per line) that
+flamegraph.pl, inferno and speedscope read directly.
+
+Snapshots cover the whole process while the request runs, so the event
+loop and the extraction threads are included, and so is any concurrent
+request. The processes of parallel page extraction are not sampled. Only
+one profile runs at a time.
+"""
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".profiles"))
+
+PROFILE_SUFFIX = ".folded"
+
+# The sampler never spends more than this share of wall time taking snapshots
+MAX_SAMPLER_SHARE = 0.1
+
+_VALID_PROFILE_ID = re.compile(r"^[A-Za-z0-9._-]{1,96}$")
+
+
+def _frame_label(code) -> str:
+    # Function plus its definition site; the last two path parts keep
+    # "fastapi/routing.py" apart from "starlette/routing.py"
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})".replace(";", ":")
+
+
+class StackSampler:
+    """
+    Samples the stacks of all threads into folded-stack counts.
+
+    Args:
+        interval: Seconds between snapshots
+        max_seconds: Sampling stops on its own after this long
+    """
+
+    def __init__(self, interval: float = 0.01, max_seconds: float = 120.0):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sampling_seconds = 0.0
+        self.started = 0.0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """Stop sampling and return the folded stacks with their sample counts."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self.stacks
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = self.started + self.max_seconds
+        while not self._stop.is_set():
+            began = time.perf_counter()
+            if began >= deadline:
+                logger.warning(f"Profile sampling stopped after {self.max_seconds:.0f}s")
+                break
+            self._snapshot(own)
+            cost = time.perf_counter() - began
+            self.sampling_seconds += cost
+            self._stop.wait(max(self.interval, cost / MAX_SAMPLER_SHARE))
+
+    def _snapshot(self, own: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+            labels.reverse()
+            self.stacks[";".join(labels)] += 1
+        self.samples += 1
+
+
+class RequestProfiler:
+    """
+    Decides which requests to profile and keeps the resulting profiles.
+
+    Args:
+        directory: Where profiles are written
+        sample_every: Profile every Nth eligible request (0 disables sampling)
+        interval: Seconds between stack snapshots
+        retain: Number of profiles kept; older ones are deleted
+        max_seconds: Longest a single profile samples for
+    """
+
+    def __init__(
+        self,
+        directory: str = PROFILE_DIR,
+        sample_every: int = 0,
+        interval: float = 0.01,
+        retain: int = 50,
+        max_seconds: float = 120.0,
+    ):
+        self.directory = directory
+        self.sample_every = max(0, sample_every)
+        self.interval = interval
+        self.retain = max(1, retain)
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._active = False
+        self._counter = itertools.count(1)
+        self.profiled: Dict[str, int] = {"requested": 0, "sampled": 0}
+        self.skipped_busy = 0
+
+    @classmethod
+    def from_env(cls) -> "RequestProfiler":
+        """Build a profiler configured from PROFILE_* environment variables."""
+        return cls(
+            directory=PROFILE_DIR,
+            sample_every=int(os.getenv("PROFILE_SAMPLE_EVERY", "0")),
+            interval=float(os.getenv("PROFILE_INTERVAL_MS", "10")) / 1000,
+            retain=int(os.getenv("PROFILE_RETAIN", "50")),
+            max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", "120")),
+        )
+
+    def start(self, requested: bool) -> Optional[StackSampler]:
+        """
+        Start profiling a request if it asked for it or is due for sampling.
+
+        Args:
+            requested: The caller asked for (and is allowed) a profile
+
+        Returns:
+            The running sampler, or None when the request is not profiled
+        """
+        reason = "requested" if requested else None
+        if reason is None and self.sample_every and next(self._counter) % self.sample_every == 0:
+            reason = "sampled"
+        if reason is None:
+            return None
+        with self._lock:
+            if self._active:
+                self.skipped_busy += 1
+                return None
+            self._active = True
+        self.profiled[reason] += 1
+        sampler = StackSampler(self.interval, self.max_seconds)
+        sampler.start()
+        return sampler
+
+    def finish(self, sampler: StackSampler, request_id: str, route: str) -> str:
+        """
+        Stop a sampler and write its profile.
+
+        Returns:
+            The profile ID, usable with path_for()
+        """
+        try:
+            stacks = sampler.stop()
+        finally:
+            with self._lock:
+                self._active = False
+
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        profile_id = f"{stamp}-{route.strip('/').replace('/', '_')}-{request_id.replace(':', '_')}"
+        self._write(profile_id, stacks)
+        overhead = sampler.sampling_seconds / sampler.elapsed * 100 if sampler.elapsed else 0.0
+        logger.info(
+            f"Profiled {route}: {sampler.samples} samples over {sampler.elapsed * 1000:.0f}ms "
+            f"({overhead:.1f}% sampling overhead), saved as {profile_id}"
+        )
+        return profile_id
+
+    def _write(self, profile_id: str, stacks: Counter):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, profile_id + PROFILE_SUFFIX)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        os.replace(temp_path, path)
+
+        for old in self.list()[self.retain:]:
+            try:
+                os.remove(os.path.join(self.directory, old["id"] + PROFILE_SUFFIX))
+            except OSError:
+                pass
+
+    def list(self) -> List[dict]:
+        """Retained profiles, newest first."""
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith(PROFILE_SUFFIX)]
+        except FileNotFoundError:
+            return []
+        profiles = []
+        for name in names:
+            try:
+                info = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            profiles.append({
+                "id": name[:-len(PROFILE_SUFFIX)],
+                "bytes": info.st_size,
+                "created": datetime.fromtimestamp(info.st_mtime, timezone.utc).isoformat(),
+                "_mtime": info.st_mtime,
+            })
+        profiles.sort(key=lambda profile: (profile["_mtime"], profile["id"]), reverse=True)
+        for profile in profiles:
+            del profile["_mtime"]
+        return profiles
+
+    def path_for(self, profile_id: str) -> Optional[str]:
+        """Path of a retained profile, or None for unknown or malformed IDs."""
+        if not _VALID_PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, profile_id + PROFILE_SUFFIX)
+        return path if os.path.isfile(path) else None
+
+    def stats(self) -> dict:
+        return {
+            "sample_every": self.sample_every,
+            "active": self._active,
+            "profiled": dict(self.profiled),
+            "skipped_busy": self.skipped_busy,
+        }
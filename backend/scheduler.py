@@ -0,0 +1,324 @@
+"""
+Rate-limit-aware scheduling of OpenAI chat-completion calls.
+
+Every call goes through LLMScheduler, which:
+
+- admits calls against requests-per-minute and tokens-per-minute token
+  buckets, charging each call its estimated prompt tokens plus max_tokens,
+- caps concurrent calls with an AIMD limit: halved on a 429, grown by one
+  after a full window of successes,
+- pauses all admissions for the Retry-After period a 429 asks for, so a
+  burst of throttled calls does not turn into a retry storm,
+- retries throttled, timed-out and 5xx calls with jittered exponential
+  backoff (the OpenAI client's own retries should be disabled), and
+- serves the interactive lane strictly before the batch lane.
+
+The scheduler is per process; with several server workers, divide the quota
+between them (LLM_RPM and LLM_TPM are per worker).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LANES = ("interactive", "batch")
+
+# Lane used when a call does not name one; background jobs set it to "batch"
+LLM_PRIORITY: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+
+RETRYABLE_STATUS = {408, 409, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Refills continuously at `per_minute` units per minute, up to one minute's worth.
+
+    A non-positive rate disables the bucket.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 when they are now)."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        if not self.unlimited:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        if not self.unlimited and amount > 0:
+            self.level = min(self.capacity, self.level + amount)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Delay requested by a Retry-After (or retry-after-ms) response header, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMScheduler:
+    """
+    Admission control, adaptive concurrency and retries for LLM calls.
+
+    Args:
+        requests_per_minute: RPM quota (0 disables the request bucket)
+        tokens_per_minute: TPM quota (0 disables the token bucket)
+        max_concurrency: Upper bound of the adaptive concurrency limit
+        min_concurrency: Lower bound the limit shrinks to under throttling
+        max_attempts: Attempts per call, including the first
+        base_backoff: Backoff before the first retry, in seconds
+        max_backoff: Ceiling for a single backoff, in seconds
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 200_000,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        max_attempts: int = 6,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.concurrency_limit = self.max_concurrency
+        self.max_attempts = max(1, max_attempts)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._cond = asyncio.Condition()
+        self._waiting: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._successes = 0
+
+        self.queued: Dict[str, int] = {lane: 0 for lane in LANES}
+        self.admitted: Dict[str, int] = {lane: 0 for lane in LANES}
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        """Build a scheduler configured from LLM_* environment variables."""
+        return cls(
+            requests_per_minute=float(os.getenv("LLM_RPM", "500")),
+            tokens_per_minute=float(os.getenv("LLM_TPM", "200000")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+            min_concurrency=int(os.getenv("LLM_MIN_CONCURRENCY", "1")),
+            max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "6")),
+            base_backoff=float(os.getenv("LLM_BACKOFF_BASE", "1.0")),
+            max_backoff=float(os.getenv("LLM_BACKOFF_MAX", "60")),
+        )
+
+    async def run(self, call: Callable[[], Awaitable[T]], estimated_tokens: int, priority: Optional[str] = None) -> T:
+        """
+        Run one LLM call under the scheduler, retrying retryable failures.
+
+        Args:
+            call: Factory for the API call; invoked once per attempt
+            estimated_tokens: Prompt tokens plus max_tokens, charged to the TPM bucket
+            priority: "interactive" or "batch"; defaults to LLM_PRIORITY
+
+        Returns:
+            The call's result
+        """
+        async with self.session(call, estimated_tokens, priority) as result:
+            return result
+
+    @asynccontextmanager
+    async def session(self, call: Callable[[], Awaitable[T]], estimated_tokens: int, priority: Optional[str] = None) -> AsyncIterator[T]:
+        """
+        Like run(), but keeps the concurrency slot until the block exits.
+
+        Use it for streamed completions, where the call returns as soon as
+        the response starts and the slot must be held while it is consumed.
+        """
+        lane = priority or LLM_PRIORITY.get()
+        if lane not in LANES:
+            lane = "interactive"
+        attempt = 0
+        while True:
+            await self._acquire(lane, estimated_tokens)
+            try:
+                result = await call()
+            except Exception as e:
+                await self._release()
+                delay = self._retry_delay(e, attempt)
+                attempt += 1
+                if delay is None or attempt >= self.max_attempts:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                logger.warning(f"LLM call failed ({type(e).__name__}), retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            break
+
+        self._on_success()
+        try:
+            yield result
+        finally:
+            await self._release()
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Return over-estimated tokens to the TPM bucket once real usage is known."""
+        if actual_tokens is not None:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+
+    async def _acquire(self, lane: str, tokens: int):
+        entry = (LANES.index(lane), next(self._sequence))
+        started = time.monotonic()
+        self.queued[lane] += 1
+        async with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = None
+                    if self._waiting[0] == entry and self._in_flight < self.concurrency_limit:
+                        delay = max(
+                            self._paused_until - now,
+                            self.requests.delay(1, now),
+                            self.tokens.delay(tokens, now),
+                        )
+                        if delay <= 0:
+                            self.requests.take(1, now)
+                            self.tokens.take(tokens, now)
+                            heapq.heappop(self._waiting)
+                            self._in_flight += 1
+                            self.admitted[lane] += 1
+                            # The next waiter may be admissible too
+                            self._cond.notify_all()
+                            return
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+            finally:
+                self.queued[lane] -= 1
+                waited = time.monotonic() - started
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+    async def _release(self):
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _on_success(self):
+        # Additive increase: one more slot per window of successful calls
+        self._successes += 1
+        if self._successes >= self.concurrency_limit and self.concurrency_limit < self.max_concurrency:
+            self.concurrency_limit += 1
+            self._successes = 0
+
+    def _on_throttle(self, retry_after: Optional[float]):
+        self.throttled += 1
+        now = time.monotonic()
+        # Multiplicative decrease, at most once per second so a burst of 429s
+        # from the same window counts as one congestion signal
+        if now - self._last_decrease >= 1.0:
+            self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit // 2)
+            self._last_decrease = now
+            self._successes = 0
+            logger.warning(f"LLM rate limited; concurrency limit now {self.concurrency_limit}")
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+    def _backoff(self, attempt: int) -> float:
+        # "Equal jitter": half the exponential step, plus a random share of the other half
+        step = min(self.max_backoff, self.base_backoff * 2 ** attempt)
+        return step / 2 + random.uniform(0, step / 2)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying `error`, or None if it is not retryable."""
+        # Only reached once a call has failed, so openai is already imported by then
+        import openai
+        status = getattr(error, "status_code", None)
+        if isinstance(error, openai.RateLimitError) or status == 429:
+            if getattr(error, "code", None) == "insufficient_quota":
+                return None
+            retry_after = retry_after_seconds(error)
+            self._on_throttle(retry_after)
+            if retry_after is not None:
+                return min(self.max_backoff, retry_after) * random.uniform(1.0, 1.2)
+            return self._backoff(attempt)
+        if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)) or status in RETRYABLE_STATUS:
+            return self._backoff(attempt)
+        return None
+
+    def stats(self) -> dict:
+        admitted = sum(self.admitted.values())
+        return {
+            "concurrency_limit": self.concurrency_limit,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "queued": dict(self.queued),
+            "admitted": dict(self.admitted),
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "failures": self.failures,
+            "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "requests_available": None if self.requests.unlimited else math.floor(self.requests.level),
+            "tokens_available": None if self.tokens.unlimited else math.floor(self.tokens.level),
+            "wait_time_avg_ms": round(self._wait_total / admitted * 1000, 1) if admitted else 0.0,
+            "wait_time_max_ms": round(self._wait_max * 1000, 1),
+        }
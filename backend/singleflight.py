@@ -0,0 +1,78 @@
+"""
+Request coalescing ("single-flight") for identical in-flight work.
+
+When several requests need the same result at the same time, only the first
+one runs the work; the others wait on its outcome instead of repeating the
+extraction and the OpenAI call. The work runs as its own task, so a caller
+that disconnects does not cancel it for everyone else. Finished work is not
+remembered here; the caches take over once the result exists.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
+
+from metrics import FLIGHT_RUNS, FLIGHTS_IN_PROGRESS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls that share a key.
+
+    Args:
+        name: Name used in log lines, stats and the `flight` metric label
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, work: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Run `work` for `key`, or join the run already in flight.
+
+        Args:
+            key: Identity of the work; equal keys must produce equal results
+            work: Coroutine factory, only called by the first caller. The run
+                may outlive that caller's request, so it must own its inputs
+                rather than borrow the request's resources (such as its uploads)
+
+        Returns:
+            (result, coalesced): coalesced is True when another caller's run
+            was reused. Exceptions from the shared run reach every caller.
+        """
+        task = self._flights.get(key)
+        if task is not None:
+            self.coalesced += 1
+            FLIGHT_RUNS.inc(flight=self.name, role="coalesced")
+            logger.info(f"Coalesced {self.name} request onto in-flight run ({key[:12]})")
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(work())
+        self._flights[key] = task
+        self.leaders += 1
+        FLIGHT_RUNS.inc(flight=self.name, role="leader")
+        FLIGHTS_IN_PROGRESS.set(len(self._flights), flight=self.name)
+        task.add_done_callback(lambda finished: self._finish(key, finished))
+        return await asyncio.shield(task), False
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+            FLIGHTS_IN_PROGRESS.set(len(self._flights), flight=self.name)
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "saved_calls": self.coalesced,
+        }
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 """
 Startup script for the FastAPI backend
+
+    python start.py          # development: one process, auto-reload
+    python start.py --prod   # production: preloaded gunicorn workers (gunicorn.conf.py)
 """
 import uvicorn
 import os
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -13,9 +17,14 @@ if __name__ == "__main__":
     # Get port from environment or default to 8000
     port = int(os.getenv("BACKEND_PORT", 8000))
     
+    if "--prod" in sys.argv[1:]:
+        # Worker count, preloading, recycling and graceful shutdown are set in gunicorn.conf.py
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"])
+    
     print(f"Starting Document Comparison API on port {port}")
-    print("API will be available at: http://localhost:8000")
-    print("API documentation at: http://localhost:8000/docs")
+    print(f"API will be available at: http://localhost:{port}")
+    print(f"API documentation at: http://localhost:{port}/docs")
     
     uvicorn.run(
         "main:app",
@@ -23,4 +32,4 @@ if __name__ == "__main__":
         port=port,
         reload=True,  # Enable auto-reload for development
         log_level="info"
-    ) 
\ No newline at end of file
+    )
@@ -0,0 +1,127 @@
+"""
+Helpers for streaming comparison progress as newline-delimited JSON (NDJSON).
+
+Each event is one JSON object per line with an "event" field, so clients can
+act on extraction progress, model tokens and finished result sections while
+the comparison is still running.
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def stream_event(event: str, **data: Any) -> bytes:
+    """Encode one NDJSON event line."""
+    return (json.dumps({"event": event, **data}, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class SectionStreamParser:
+    """
+    Incrementally scans a streamed JSON object and yields each top-level
+    member as soon as its value is complete.
+
+    Text before the first '{' (for example a markdown fence) is ignored. Each
+    delta is scanned once and only the member being read is buffered, so the
+    scanner is linear in the total length of the stream.
+    """
+
+    def __init__(self):
+        self._deltas: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key_parts: Optional[List[str]] = None  # Pieces of the top-level key being read
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+        self._value_parts: Optional[List[str]] = None  # Pieces of the top-level value being read
+        self._done = False
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        if len(self._deltas) > 1:
+            self._deltas = ["".join(self._deltas)]
+        return self._deltas[0] if self._deltas else ""
+
+    def feed(self, delta: str) -> List[Tuple[str, Any]]:
+        """
+        Add streamed text and return any top-level members completed by it.
+
+        Args:
+            delta: Next piece of the completion
+
+        Returns:
+            List of (key, value) pairs, in stream order
+        """
+        self._deltas.append(delta)
+        completed = []
+        # Where the current key or value continues in this delta
+        key_from = value_from = 0
+        pos = 0
+        while pos < len(delta) and not self._done:
+            char = delta[pos]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._key_parts is not None:
+                        # A top-level key; string values are closed at ',' or '}'
+                        self._key_parts.append(delta[key_from:pos])
+                        self._last_string = "".join(self._key_parts)
+                        self._key_parts = None
+                pos += 1
+                continue
+
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                pos += 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_parts is None:
+                    self._key_parts = []
+                    key_from = pos + 1
+            elif char == ":" and self._depth == 1 and self._value_parts is None:
+                self._current_key = json.loads(f'"{self._last_string}"') if self._last_string is not None else None
+                self._value_parts = []
+                value_from = pos + 1
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._value_parts is not None:
+                    # A container value just closed
+                    completed.extend(self._complete(delta[value_from:pos + 1]))
+                elif self._depth == 0:
+                    if self._value_parts is not None:
+                        completed.extend(self._complete(delta[value_from:pos]))
+                    self._done = True
+            elif char == "," and self._depth == 1 and self._value_parts is not None:
+                completed.extend(self._complete(delta[value_from:pos]))
+            pos += 1
+
+        if self._key_parts is not None:
+            self._key_parts.append(delta[key_from:])
+        if self._value_parts is not None and not self._done:
+            self._value_parts.append(delta[value_from:])
+        return completed
+
+    def _complete(self, tail: str) -> List[Tuple[str, Any]]:
+        raw = ("".join(self._value_parts) + tail).strip()
+        key = self._current_key
+        self._value_parts = None
+        self._current_key = None
+        self._last_string = None
+        if key is None or not raw:
+            return []
+        try:
+            return [(key, json.loads(raw))]
+        except json.JSONDecodeError:
+            return []
@@ -0,0 +1,162 @@
+"""
+Windows of extracted text, addressed by page range or character range.
+
+Large documents are read in windows instead of one monolithic string: a
+range of pages (`pages=3-7`) or `limit` characters starting at `start`.
+Every window carries an opaque `nextCursor` that continues where it ended
+with the same window size, until the document is exhausted.
+
+Character offsets refer to the joined document text, where every page is
+followed by PAGE_SEPARATOR, the same text the diff and the analysis see.
+"""
+import base64
+import json
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from extraction import PAGE_SEPARATOR, ExtractionResult, PageText
+
+# Characters returned when a character window does not set `limit`
+TEXT_WINDOW_CHARS = int(os.getenv("TEXT_WINDOW_CHARS", "20000"))
+MAX_TEXT_WINDOW_CHARS = 200_000
+
+# Most pages returned by one page window
+MAX_PAGE_WINDOW = 50
+
+
+class TextRangeError(ValueError):
+    """A malformed range, cursor or window size."""
+
+
+@dataclass
+class TextWindow:
+    """A resolved request: a page range, or a character range when `pages` is None."""
+    pages: Optional[Tuple[int, int]] = None
+    start: int = 0
+    limit: int = TEXT_WINDOW_CHARS
+
+
+def encode_cursor(window: TextWindow) -> str:
+    state = {"p": list(window.pages)} if window.pages else {"s": window.start, "l": window.limit}
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> TextWindow:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if "p" in state:
+            first, last = (int(number) for number in state["p"])
+            return TextWindow(pages=(first, last))
+        return TextWindow(start=int(state["s"]), limit=int(state["l"]))
+    except (ValueError, TypeError, KeyError):
+        raise TextRangeError("Invalid cursor")
+
+
+def parse_page_range(value: str) -> Tuple[int, int]:
+    """'3' -> (3, 3), '3-7' -> (3, 7); pages are 1-based and inclusive."""
+    first, _, last = value.partition("-")
+    try:
+        first_page = int(first)
+        last_page = int(last) if last else first_page
+    except ValueError:
+        raise TextRangeError(f"Invalid page range: {value!r}; use e.g. '3' or '3-7'")
+    if first_page < 1 or last_page < first_page:
+        raise TextRangeError(f"Invalid page range: {value!r}")
+    return first_page, last_page
+
+
+def resolve_window(
+    pages: Optional[str] = None,
+    start: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Optional[TextWindow]:
+    """
+    Turn query parameters into a window; a cursor takes precedence.
+
+    Returns:
+        The window, or None when no text was requested
+    """
+    if cursor:
+        window = decode_cursor(cursor)
+    elif pages:
+        window = TextWindow(pages=parse_page_range(pages))
+    elif start is not None or limit is not None:
+        window = TextWindow(start=start or 0, limit=limit or TEXT_WINDOW_CHARS)
+    else:
+        return None
+
+    if window.pages:
+        first, last = window.pages
+        if last - first + 1 > MAX_PAGE_WINDOW:
+            raise TextRangeError(f"At most {MAX_PAGE_WINDOW} pages per request")
+    elif window.start < 0 or not 1 <= window.limit <= MAX_TEXT_WINDOW_CHARS:
+        raise TextRangeError(f"start must be >= 0 and limit between 1 and {MAX_TEXT_WINDOW_CHARS}")
+    return window
+
+
+def page_window(pages: List[PageText], window: TextWindow, page_count: int) -> dict:
+    """
+    Window over a page range.
+
+    Args:
+        pages: The pages of the range that exist, in order
+        window: Window with `pages` set
+        page_count: Pages in the whole document
+    """
+    first, last = window.pages
+    if first > page_count:
+        raise TextRangeError(f"Page {first} is past the end of the document ({page_count} pages)")
+    last = min(last, page_count)
+    size = window.pages[1] - window.pages[0] + 1
+    next_cursor = None
+    if last < page_count:
+        next_cursor = encode_cursor(TextWindow(pages=(last + 1, min(last + size, page_count))))
+    return {
+        "mode": "pages",
+        "firstPage": first,
+        "lastPage": last,
+        "pageCount": page_count,
+        "pages": [{"page": page.page_number, "start": page.start, "text": page.text} for page in pages],
+        "nextCursor": next_cursor,
+    }
+
+
+def char_window(pages: List[PageText], window: TextWindow, total_chars: int) -> dict:
+    """
+    Window over a character range.
+
+    Args:
+        pages: Consecutive pages that cover the range (they may extend past it)
+        window: Window without `pages`
+        total_chars: Length of the whole joined document text
+    """
+    start = min(window.start, total_chars)
+    text = ""
+    if pages:
+        joined = "".join(part for page in pages for part in (page.text, PAGE_SEPARATOR))
+        offset = start - pages[0].start
+        text = joined[offset:offset + window.limit]
+    end = start + len(text)
+    covered = [page.page_number for page in pages if page.start < max(end, start + 1) and page.end + len(PAGE_SEPARATOR) > start]
+    return {
+        "mode": "chars",
+        "start": start,
+        "end": end,
+        "totalChars": total_chars,
+        "firstPage": covered[0] if covered else None,
+        "lastPage": covered[-1] if covered else None,
+        "text": text,
+        "nextCursor": encode_cursor(TextWindow(start=end, limit=window.limit)) if end < total_chars else None,
+    }
+
+
+def extraction_window(result: ExtractionResult, window: TextWindow) -> dict:
+    """Window over an in-memory extraction result."""
+    if window.pages:
+        first, last = window.pages
+        return page_window(result.pages[first - 1:last], window, result.page_count)
+    end = window.start + window.limit
+    covering = [page for page in result.pages if page.start < end and page.end + len(PAGE_SEPARATOR) > window.start]
+    return char_window(covering, window, len(result.text))
@@ -0,0 +1,150 @@
+"""
+Zero-copy access to uploaded files and per-request memory accounting.
+
+Starlette spools uploads into a SpooledTemporaryFile: small files stay in an
+in-memory BytesIO, larger ones roll over to a temporary file on disk. Instead
+of reading the upload into a new bytes object, upload_buffer() exposes the
+spool's own BytesIO buffer, or a read-only memory map of the rolled-over file,
+so hashing and parsing work on the upload without copying it.
+"""
+import io
+import logging
+import mmap
+import os
+import tracemalloc
+from contextlib import contextmanager
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+# Per-request memory ceiling in MB; 0 disables the limit
+MAX_REQUEST_MEMORY_MB = int(os.getenv("MAX_REQUEST_MEMORY_MB", "0"))
+
+# Trace Python allocations for precise per-request peaks (adds overhead);
+# otherwise resident set size is sampled instead
+TRACK_REQUEST_MEMORY = os.getenv("TRACK_REQUEST_MEMORY", "false").lower() in ("1", "true", "yes")
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class MemoryLimitExceeded(Exception):
+    """Raised when a request grows past its memory ceiling."""
+
+
+@contextmanager
+def upload_buffer(spool: BinaryIO) -> Iterator[Tuple[memoryview, BinaryIO]]:
+    """
+    Expose an uploaded file as a read-only buffer plus a seekable stream, without copying.
+
+    Args:
+        spool: The upload's file object (UploadFile.file)
+
+    Yields:
+        (view, stream): A read-only memoryview of the content and a binary
+        stream over the same memory, positioned at the start
+    """
+    spool.seek(0)
+    inner = spool._file if isinstance(spool, SpooledTemporaryFile) else spool
+    mapped: Optional[mmap.mmap] = None
+    exported = []
+
+    if isinstance(inner, io.BytesIO):
+        # Still in memory: share the BytesIO's own buffer
+        stream = inner
+        exported.append(inner.getbuffer())
+        view = exported[0].toreadonly()
+    else:
+        try:
+            spool.flush()
+            mapped = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ)
+            stream = mapped
+            view = memoryview(mapped)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            # No usable file descriptor (or an empty file): fall back to a single read
+            data = spool.read()
+            stream = io.BytesIO(data)
+            view = memoryview(data)
+
+    try:
+        stream.seek(0)
+        yield view, stream
+    finally:
+        view.release()
+        for buffer in exported:
+            buffer.release()
+        if mapped is not None:
+            mapped.close()
+        spool.seek(0)  # Reset file pointer for potential reuse
+
+
+def detach_upload(upload: UploadFile) -> UploadFile:
+    """
+    Take ownership of an upload's spooled file so it outlives the request handler.
+
+    FastAPI closes form files as soon as the endpoint returns, which is too
+    early for streaming responses and background jobs. The returned UploadFile
+    shares the original spool (no copy) and must be closed by the new owner.
+    """
+    detached = UploadFile(
+        file=upload.file,
+        size=upload.size,
+        filename=upload.filename,
+        headers=upload.headers,
+    )
+    upload.file = io.BytesIO()
+    return detached
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process, or 0 where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+class RequestMemoryMeter:
+    """
+    Tracks memory growth while a request is processed and enforces a ceiling.
+
+    Uses tracemalloc when it is tracing (see TRACK_REQUEST_MEMORY), otherwise
+    samples RSS. Both are process-wide, so concurrent requests are counted
+    together; the figure is exact only when requests do not overlap.
+
+    Args:
+        label: Name used in log lines
+        limit_mb: Ceiling in MB; 0 disables enforcement
+    """
+
+    def __init__(self, label: str, limit_mb: int = MAX_REQUEST_MEMORY_MB):
+        self.label = label
+        self.limit_bytes = limit_mb * 1024 * 1024
+        self.peak_bytes = 0
+        self._traced = tracemalloc.is_tracing()
+        self._baseline = self._sample()
+
+    def _sample(self) -> int:
+        if self._traced:
+            return tracemalloc.get_traced_memory()[0]
+        return current_rss_bytes()
+
+    def check(self):
+        """Record current usage; raise MemoryLimitExceeded if over the ceiling."""
+        used = max(0, self._sample() - self._baseline)
+        self.peak_bytes = max(self.peak_bytes, used)
+        if self.limit_bytes and used > self.limit_bytes:
+            raise MemoryLimitExceeded(
+                f"{self.label} exceeded the per-request memory limit of {self.limit_bytes // (1024 * 1024)} MB"
+            )
+
+    def finish(self) -> int:
+        """Take a final sample, log the peak and return it in bytes."""
+        used = max(0, self._sample() - self._baseline)
+        self.peak_bytes = max(self.peak_bytes, used)
+        source = "traced" if self._traced else "rss"
+        logger.info(f"Peak memory for {self.label}: {self.peak_bytes / (1024 * 1024):.1f} MB ({source})")
+        return self.peak_bytes
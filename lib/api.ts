@@ -13,6 +13,10 @@ export interface ComparisonResponse {
       impact: string;
       original_quote: string;
       proposed_quote: string;
+      grounding?: {
+        original_quote?: QuoteGrounding;
+        proposed_quote?: QuoteGrounding;
+      };
     }>;
     overall_impact_assessment: string;
   };
@@ -22,6 +26,9 @@ export interface ComparisonResponse {
     effect: string;
     description: string;
     evidence_quote: string;
+    grounding?: {
+      evidence_quote?: QuoteGrounding;
+    };
   }>;
   impact_forecast: {
     assumptions: string[];
@@ -45,17 +52,121 @@ export interface ComparisonResponse {
     bill_a_name: string;
     bill_b_name: string;
     processed_at: string;
+    analysis_key?: string;
+    cached?: boolean;
+    coalesced?: boolean;
+    normalization?: {
+      bill_a: NormalizationStats | null;
+      bill_b: NormalizationStats | null;
+    };
+    grounding?: {
+      quotes: number;
+      verified: number;
+      exact: number;
+      fuzzy: number;
+      unverified: number;
+      elapsed_ms: number;
+    };
   };
 }
 
+export interface QuoteGrounding {
+  verified: boolean;
+  match: 'exact' | 'fuzzy' | 'none';
+  score: number;
+  // Character span in the document text and the page it starts on; set when verified
+  start?: number;
+  end?: number;
+  page?: number;
+  end_page?: number;
+  // Evidence quotes only: the document the quote was found in
+  document?: 'bill_a' | 'bill_b';
+}
+
+export interface NormalizationStats {
+  chars_before: number;
+  chars_after: number;
+  tokens_before: number;
+  tokens_after: number;
+  saved_percent: number;
+  repeated_lines_removed: number;
+  stamps_removed: number;
+  line_numbers_removed: number;
+  hyphens_joined: number;
+}
+
 export interface TestPDFResponse {
   success: boolean;
   filename: string;
   fileSize: number;
   textLength: number;
   processingTimeMs: number;
-  preview: string;
-  fullText: string;
+  pageCount?: number;
+  preview?: string;
+  // Only present when requested with fullText: true
+  fullText?: string;
+  text?: TextWindow;
+  normalization?: NormalizationStats | null;
+  // Extraction engine chosen for the document, and the quality of its raw text
+  engine?: string | null;
+  quality?: ExtractionQuality | null;
+  admission?: PdfAdmission;
+}
+
+export interface ExtractionQuality {
+  chars_per_page: number;
+  garbage_ratio: number;
+  whitespace_ratio: number;
+  empty_pages: number;
+  acceptable: boolean;
+}
+
+// What the upload admission checks learned before extraction
+export interface PdfAdmission {
+  version: string;
+  size: number;
+  pageCount: number;
+  encrypted: boolean;
+  admissionMs: number;
+}
+
+export type TextWindow =
+  | {
+      mode: 'pages';
+      firstPage: number;
+      lastPage: number;
+      pageCount: number;
+      pages: { page: number; start: number; text: string }[];
+      nextCursor: string | null;
+    }
+  | {
+      mode: 'chars';
+      start: number;
+      end: number;
+      totalChars: number;
+      firstPage: number | null;
+      lastPage: number | null;
+      text: string;
+      nextCursor: string | null;
+    };
+
+export interface TextWindowOptions {
+  pages?: string; // e.g. "3-7"
+  start?: number;
+  limit?: number;
+  cursor?: string;
+}
+
+function textWindowQuery(options: TextWindowOptions & { metadataOnly?: boolean; fullText?: boolean }): string {
+  const params = new URLSearchParams();
+  if (options.pages) params.set('pages', options.pages);
+  if (options.start !== undefined) params.set('start', String(options.start));
+  if (options.limit !== undefined) params.set('limit', String(options.limit));
+  if (options.cursor) params.set('cursor', options.cursor);
+  if (options.metadataOnly) params.set('metadata_only', 'true');
+  if (options.fullText) params.set('full_text', 'true');
+  const query = params.toString();
+  return query ? `?${query}` : '';
 }
 
 export async function compareDocuments(billAFile: File, billBFile: File): Promise<ComparisonResponse> {
@@ -76,11 +187,187 @@ export async function compareDocuments(billAFile: File, billBFile: File): Promis
   return response.json();
 }
 
-export async function testPDFExtraction(file: File): Promise<TestPDFResponse> {
+export interface DocumentInfo {
+  id: string;
+  sha256: string;
+  filename: string;
+  pageCount: number;
+  chars: number;
+  tokens: number;
+  normalized: boolean;
+  normalization?: NormalizationStats | null;
+  createdAt: number;
+  created?: boolean;
+}
+
+// Uploads a PDF once; the returned id can be compared without re-uploading the file.
+export async function registerDocument(file: File): Promise<DocumentInfo> {
+  const formData = new FormData();
+  formData.append('file', file);
+
+  const response = await fetch(`${API_BASE_URL}/api/documents`, {
+    method: 'POST',
+    body: formData,
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+  }
+
+  return response.json();
+}
+
+// Reads a registered document's text window by window; follow nextCursor until it is null.
+export async function getDocumentText(documentId: string, options: TextWindowOptions = {}): Promise<TextWindow & { id: string }> {
+  const response = await fetch(`${API_BASE_URL}/api/documents/${encodeURIComponent(documentId)}/text${textWindowQuery(options)}`);
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+  }
+
+  return response.json();
+}
+
+export async function compareDocumentIds(billAId: string, billBId: string): Promise<ComparisonResponse> {
+  const formData = new FormData();
+  formData.append('bill_a_id', billAId);
+  formData.append('bill_b_id', billBId);
+
+  const response = await fetch(`${API_BASE_URL}/api/compare`, {
+    method: 'POST',
+    body: formData,
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+  }
+
+  return response.json();
+}
+
+export type ComparisonStreamEvent =
+  | { event: 'started'; bill_a_name: string; bill_b_name: string }
+  | { event: 'extraction_progress'; document: 'bill_a' | 'bill_b'; page: number; pages: number }
+  | { event: 'extraction_complete'; bill_a_chars: number; bill_b_chars: number; bill_a_pages: number; bill_b_pages: number; normalization?: { bill_a: NormalizationStats | null; bill_b: NormalizationStats | null } | null }
+  | { event: 'llm_start'; model: string; prompt_chars: number; chunks: number; unchanged_sections: number }
+  | { event: 'token'; text: string }
+  | { event: 'chunk_complete'; index: number; completed: number; chunks: number; sections: string[] }
+  | { event: 'section'; name: 'executive_summary' | 'stakeholder_analysis' | 'impact_forecast'; data: unknown }
+  | { event: 'result'; data: ComparisonResponse }
+  | { event: 'error'; status: number; detail: string };
+
+// Streams NDJSON progress events from /api/compare/stream and resolves with the final result.
+export async function compareDocumentsStream(
+  billAFile: File,
+  billBFile: File,
+  onEvent: (event: ComparisonStreamEvent) => void
+): Promise<ComparisonResponse> {
+  const formData = new FormData();
+  formData.append('bill_a_file', billAFile);
+  formData.append('bill_b_file', billBFile);
+
+  const response = await fetch(`${API_BASE_URL}/api/compare/stream`, {
+    method: 'POST',
+    body: formData,
+  });
+
+  if (!response.ok || !response.body) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result: ComparisonResponse | null = null;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let newline = buffer.indexOf('\n');
+    while (newline !== -1) {
+      const line = buffer.slice(0, newline).trim();
+      buffer = buffer.slice(newline + 1);
+      newline = buffer.indexOf('\n');
+      if (!line) continue;
+
+      const event = JSON.parse(line) as ComparisonStreamEvent;
+      onEvent(event);
+      if (event.event === 'result') {
+        result = event.data;
+      } else if (event.event === 'error') {
+        throw new Error(event.detail);
+      }
+    }
+  }
+
+  if (!result) {
+    throw new Error('Comparison stream ended without a result');
+  }
+  return result;
+}
+
+export interface DiffHunk {
+  a_start: number;
+  a_lines: number;
+  b_start: number;
+  b_lines: number;
+  section: string | null;
+  lines: string[]; // each prefixed with ' ', '-' or '+'
+}
+
+export interface DiffResponse {
+  bill_a_name: string;
+  bill_b_name: string;
+  stats: {
+    bill_a_lines: number;
+    bill_b_lines: number;
+    lines_added: number;
+    lines_removed: number;
+    sections: number;
+    sections_changed: number;
+    diff_ms: number;
+    timed_out: boolean;
+  };
+  total_hunks: number;
+  offset: number;
+  limit: number;
+  next_offset: number | null;
+  hunks: DiffHunk[];
+}
+
+// Fetches one page of the server-side diff; pass next_offset to get the following page.
+export async function diffDocuments(billAFile: File, billBFile: File, offset = 0, limit = 100): Promise<DiffResponse> {
+  const formData = new FormData();
+  formData.append('bill_a_file', billAFile);
+  formData.append('bill_b_file', billBFile);
+
+  const response = await fetch(`${API_BASE_URL}/api/diff?offset=${offset}&limit=${limit}`, {
+    method: 'POST',
+    body: formData,
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+  }
+
+  return response.json();
+}
+
+export async function testPDFExtraction(
+  file: File,
+  options: TextWindowOptions & { metadataOnly?: boolean; fullText?: boolean } = {}
+): Promise<TestPDFResponse> {
   const formData = new FormData();
   formData.append('file', file);
 
-  const response = await fetch(`${API_BASE_URL}/api/test-pdf`, {
+  const response = await fetch(`${API_BASE_URL}/api/test-pdf${textWindowQuery(options)}`, {
     method: 'POST',
     body: formData,
   });